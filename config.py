@@ -7,5 +7,22 @@ load_dotenv()
 
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
 
-if not DASHSCOPE_API_KEY:
-    raise ValueError("DASHSCOPE_API_KEY 未在环境变量中设置")
+# 管理接口（调度器统计等）的访问令牌，未设置时管理接口不可用
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# LLM 后端: "dashscope" 调用真实模型, "offline" 使用本地模拟决策（不需要 API Key）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "dashscope").lower()
+
+# 已结束对局导出为列式分析数据集的目录，未设置时不导出
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR")
+
+# 批量推理模式使用的 OpenAI 兼容接口，默认为 DashScope 兼容模式；本地测试时指向 scripts/batch_server.py
+BATCH_BASE_URL = os.getenv("BATCH_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+BATCH_API_KEY = os.getenv("BATCH_API_KEY") or DASHSCOPE_API_KEY
+
+
+def require_dashscope_api_key() -> str:
+    """仅在真正使用 DashScope 后端时校验 API Key"""
+    if not DASHSCOPE_API_KEY:
+        raise ValueError("DASHSCOPE_API_KEY 未在环境变量中设置")
+    return DASHSCOPE_API_KEY
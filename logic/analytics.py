@@ -0,0 +1,266 @@
+# analytics.py
+"""
+已结束对局的列式分析数据集。
+
+每局结束后把事件日志展开为四张表并批量追加为分片文件（只追加、不修改）：
+- actions:  夜间行动与白天投票，每个行动者一行
+- speeches: 白天发言与狼人夜聊
+- deaths:   死亡记录
+- outcomes: 每局每名玩家一行的胜负结果
+
+安装 pyarrow 时分片为 Parquet，否则为 gzip 压缩的列式 JSON。查询逐个分片读取所需列，
+不需要把完整日志读入内存：
+
+    python -m logic.analytics analytics/ --by role
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from logic.events import EventLog
+from logic.game_utils import Role
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow 是可选依赖，缺失时写列式 JSON
+    pyarrow = None
+
+TABLES = ("actions", "speeches", "deaths", "outcomes")
+
+# 各表的列，写入时缺失的列补 None，保证同一张表所有分片的列一致
+COLUMNS = {
+    "actions": ["game_id", "round", "phase", "player_id", "role", "config", "action",
+                "target_id", "target_role", "hit"],
+    "speeches": ["game_id", "round", "phase", "player_id", "role", "config", "channel", "length", "content"],
+    "deaths": ["game_id", "round", "phase", "player_id", "role", "config", "cause"],
+    "outcomes": ["game_id", "player_id", "role", "team", "config", "won", "survived",
+                 "winner", "rounds", "duration_s", "finished_at"],
+}
+
+
+def flatten_game(game_id: str, events: EventLog, seat_labels: Optional[Sequence[str]] = None) -> Dict[str, List[dict]]:
+    """
+    把一局的事件日志展开为各表的行。seat_labels 为每个座位的配置名（如锦标赛中的后端配置）。
+    actions 表的 hit 列含义随行动而定：刀杀目标当晚死亡、守卫守中了狼人目标且无人死亡、
+    预言家查到狼人、白天投票投给了狼人。
+    """
+    all_events = events.read(0, limit=len(events))[0]
+    roles: Dict[int, str] = {}
+    for event in all_events:
+        if event["kind"] in ("roles", "game_over"):
+            roles = {int(pid): role for pid, role in event["data"]["roles"].items()}
+    holders = {role: pid for pid, role in roles.items()}
+
+    def config_of(player_id: int) -> Optional[str]:
+        if seat_labels is None or not 0 <= player_id < len(seat_labels):
+            return None
+        return seat_labels[player_id]
+
+    # 先扫一遍，得到每晚狼人结算后的刀人目标和夜间死亡，用于判定守卫是否守中
+    wolf_targets: Dict[int, int] = {}
+    night_deaths: Dict[int, set] = {}
+    phase, round_num = "NIGHT", 0
+    for event in all_events:
+        data = event["data"]
+        if event["kind"] == "phase":
+            phase, round_num = data["phase"], data["round"]
+        elif event["kind"] == "wolf_target":
+            wolf_targets[round_num] = data["target_id"]
+        elif event["kind"] == "death" and data.get("cause") == "night":
+            night_deaths.setdefault(round_num, set()).add(data["player_id"])
+
+    tables: Dict[str, List[dict]] = {table: [] for table in TABLES}
+    phase, round_num = "NIGHT", 0
+    winner = None
+
+    def action(player_id: int, kind: str, target_id: int, hit: bool):
+        tables["actions"].append({
+            "game_id": game_id, "round": round_num, "phase": phase, "player_id": player_id,
+            "role": roles.get(player_id), "config": config_of(player_id), "action": kind,
+            "target_id": target_id, "target_role": roles.get(target_id), "hit": hit,
+        })
+
+    for event in all_events:
+        kind, data = event["kind"], event["data"]
+        if kind == "phase":
+            phase, round_num = data["phase"], data["round"]
+        elif kind == "wolf_vote":
+            target = data["target_id"]
+            for voter in data.get("voters", []):
+                action(voter, "wolf_vote", target, target in night_deaths.get(round_num, ()))
+        elif kind == "seer_check":
+            action(holders.get(Role.SEER.name, -1), "seer_check", data["target_id"],
+                   roles.get(data["target_id"]) == Role.WOLF.name)
+        elif kind == "guard_protect":
+            target = data["target_id"]
+            saved = target == wolf_targets.get(round_num) and not night_deaths.get(round_num)
+            action(holders.get(Role.GUARD.name, -1), "guard_protect", target, saved)
+        elif kind == "vote":
+            action(data["player_id"], "vote", data["target_id"], roles.get(data["target_id"]) == Role.WOLF.name)
+        elif kind in ("speech", "wolf_saying"):
+            content = data.get("content") or ""
+            tables["speeches"].append({
+                "game_id": game_id, "round": round_num, "phase": phase, "player_id": data["player_id"],
+                "role": roles.get(data["player_id"]), "config": config_of(data["player_id"]),
+                "channel": "day" if kind == "speech" else "wolf", "length": len(content), "content": content,
+            })
+        elif kind == "death":
+            tables["deaths"].append({
+                "game_id": game_id, "round": round_num, "phase": phase, "player_id": data["player_id"],
+                "role": roles.get(data["player_id"]), "config": config_of(data["player_id"]),
+                "cause": data.get("cause"),
+            })
+        elif kind == "game_over":
+            winner = data["winner"]
+
+    dead = {row["player_id"] for row in tables["deaths"]}
+    finished_at = all_events[-1]["ts"] if all_events else events.started_at
+    for player_id, role in sorted(roles.items()):
+        team = Role.WOLF.name if role == Role.WOLF.name else Role.VILLAGER.name
+        tables["outcomes"].append({
+            "game_id": game_id, "player_id": player_id, "role": role, "team": team,
+            "config": config_of(player_id), "won": winner == team, "survived": player_id not in dead,
+            "winner": winner, "rounds": round_num, "duration_s": round(finished_at - events.started_at, 3),
+            "finished_at": finished_at,
+        })
+    return tables
+
+
+class AnalyticsWriter:
+    """
+    缓冲各表的行，某张表累计到 batch_rows 行或距上次写盘超过 flush_interval 秒时写出一个分片。
+    分片先写临时文件再改名，读取方不会看到写了一半的文件。
+    """
+
+    def __init__(self, root: str, batch_rows: int = 5000, flush_interval: float = 30.0):
+        self.root = root
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._buffers: Dict[str, List[dict]] = {table: [] for table in TABLES}
+        self._last_flush = time.monotonic()
+        self._shard_seq = 0
+        self._lock = threading.Lock()
+        for table in TABLES:
+            os.makedirs(os.path.join(root, table), exist_ok=True)
+
+    def add(self, tables: Dict[str, List[dict]]):
+        with self._lock:
+            for table, rows in tables.items():
+                self._buffers[table].extend(rows)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            for table in TABLES:
+                if len(self._buffers[table]) >= self.batch_rows or (due and self._buffers[table]):
+                    self._write_shard(table)
+            if due:
+                self._last_flush = time.monotonic()
+
+    def export_game(self, game_id: str, events: EventLog, seat_labels: Optional[Sequence[str]] = None):
+        self.add(flatten_game(game_id, events, seat_labels))
+
+    def flush(self):
+        with self._lock:
+            for table in TABLES:
+                if self._buffers[table]:
+                    self._write_shard(table)
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def _write_shard(self, table: str):
+        rows, self._buffers[table] = self._buffers[table], []
+        columns = {name: [row.get(name) for row in rows] for name in COLUMNS[table]}
+        self._shard_seq += 1
+        name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._shard_seq:06d}"
+        path = os.path.join(self.root, table, name + (".parquet" if pyarrow is not None else ".json.gz"))
+        tmp_path = path + ".tmp"
+        if pyarrow is not None:
+            pyarrow.parquet.write_table(pyarrow.table(columns), tmp_path)
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump({"rows": len(rows), "columns": columns}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class AnalyticsDataset:
+    """按分片流式读取分析数据集，只加载查询用到的列"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def shards(self, table: str) -> List[str]:
+        pattern = os.path.join(self.root, table, "part-*")
+        return sorted(p for p in glob.glob(pattern) if not p.endswith(".tmp"))
+
+    def _read_columns(self, path: str, columns: Sequence[str]) -> Dict[str, list]:
+        if path.endswith(".parquet"):
+            if pyarrow is None:
+                raise RuntimeError(f"读取 {path} 需要安装 pyarrow")
+            return pyarrow.parquet.read_table(path, columns=list(columns)).to_pydict()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)["columns"]
+        return {name: data[name] for name in columns}
+
+    def scan(self, table: str, columns: Optional[Sequence[str]] = None,
+             where: Optional[Callable[[dict], bool]] = None) -> Iterator[dict]:
+        """逐行产出 columns 指定的列；where 中用到的列也必须包含在 columns 里"""
+        columns = list(columns or COLUMNS[table])
+        for path in self.shards(table):
+            data = self._read_columns(path, columns)
+            for values in zip(*(data[name] for name in columns)):
+                row = dict(zip(columns, values))
+                if where is None or where(row):
+                    yield row
+
+    def aggregate(self, table: str, by: Sequence[str], value: Optional[str] = None,
+                  where: Optional[Callable[[dict], bool]] = None,
+                  where_columns: Sequence[str] = ()) -> Dict[Tuple, Dict[str, float]]:
+        """按 by 分组统计行数，给出 value 时同时统计总和与均值（布尔列的均值即比率）"""
+        columns = list(dict.fromkeys([*by, *([value] if value else []), *where_columns]))
+        groups: Dict[Tuple, Dict[str, float]] = {}
+        for row in self.scan(table, columns, where):
+            entry = groups.setdefault(tuple(row[name] for name in by), {"n": 0, "sum": 0.0})
+            entry["n"] += 1
+            if value is not None and row[value] is not None:
+                entry["sum"] += float(row[value])
+        for entry in groups.values():
+            entry["mean"] = entry["sum"] / entry["n"] if entry["n"] else 0.0
+        return dict(sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])))
+
+    def win_rates(self, by: Sequence[str] = ("role",)) -> Dict[Tuple, Dict[str, float]]:
+        return self.aggregate("outcomes", by, "won")
+
+    def action_stats(self, by: Sequence[str] = ("role", "action")) -> Dict[Tuple, Dict[str, float]]:
+        """各类行动的次数和命中率（hit 的含义见 flatten_game）"""
+        return self.aggregate("actions", by, "hit")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="分析数据集的胜率与行为统计")
+    parser.add_argument("root", help="数据集目录")
+    parser.add_argument("--by", default="role", help="胜率分组列，逗号分隔，如 role,config")
+    args = parser.parse_args(argv)
+
+    dataset = AnalyticsDataset(args.root)
+    by = [name.strip() for name in args.by.split(",") if name.strip()]
+
+    print("胜率:")
+    for key, entry in dataset.win_rates(by).items():
+        print(f"  {'/'.join(map(str, key)):<24} 样本 {entry['n']:>7}  胜率 {entry['mean']:.4f}")
+    print("行动:")
+    for key, entry in dataset.action_stats().items():
+        print(f"  {'/'.join(map(str, key)):<24} 次数 {entry['n']:>7}  命中率 {entry['mean']:.4f}")
+    deaths = dataset.aggregate("deaths", ["cause", "role"])
+    print("死亡:")
+    for key, entry in deaths.items():
+        print(f"  {'/'.join(map(str, key)):<24} 次数 {entry['n']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# batch_inference.py
+"""
+离线批量推理模式，用于大规模模拟和锦标赛。
+
+同步模式下每个决策都是一次实时请求，受每秒请求数和并发上限约束，也是最贵的调用方式。
+批量模式下 call_dashscope 不再直接请求模型，而是把请求交给 BatchCollector：
+- 多个并发对局（各自一个线程）在同一阶段发出的独立决策被收集到同一个批量推理任务中
+- 满 max_batch 条或最早一条等待超过 linger 秒时提交任务（OpenAI 兼容的 /v1/files + /v1/batches 接口）
+- 后台线程轮询任务状态，结果到达后唤醒对应的对局线程继续执行
+批量任务走供应商单独的批量配额，不经过实时请求的全局调度器。
+
+本地测试时用 scripts/batch_server.py 启动一个模拟的批量推理服务，把 BATCH_BASE_URL 指向它即可。
+"""
+import contextvars
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from logic.model_config import JSON_MODE_MODELS, model_config
+
+# 单个批量任务最多包含的请求数
+MAX_BATCH = 500
+
+# 最早一条待提交请求最多等待的秒数
+LINGER = 2.0
+
+# 轮询任务状态的间隔（秒）
+POLL_INTERVAL = 5.0
+
+# 单条请求失败（或所在任务失败、过期）后重新提交的次数
+MAX_RETRIES = 2
+
+# 当前线程/协程使用的收集器，为 None 时 call_dashscope 发送实时请求
+_collector: contextvars.ContextVar[Optional["BatchCollector"]] = contextvars.ContextVar(
+    "batch_collector", default=None
+)
+
+
+def current_collector() -> Optional["BatchCollector"]:
+    return _collector.get()
+
+
+@contextmanager
+def batch_mode(collector: "BatchCollector"):
+    """在此上下文中发出的模型请求交给 collector 批量提交"""
+    token = _collector.set(collector)
+    try:
+        yield
+    finally:
+        _collector.reset(token)
+
+
+class BatchRequestFailed(Exception):
+    """批量任务中的单条请求最终失败"""
+
+
+class OpenAIBatchClient:
+    """OpenAI 兼容的批量推理接口：上传 JSONL 请求文件、创建任务、轮询并下载结果文件"""
+    TERMINAL = frozenset({"completed", "failed", "expired", "cancelled"})
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 completion_window: str = "24h"):
+        # openai SDK 只在批量模式下需要，按需导入
+        from openai import OpenAI
+        self.client = OpenAI(base_url=base_url or config.BATCH_BASE_URL,
+                             api_key=api_key or config.BATCH_API_KEY or "local")
+        self.completion_window = completion_window
+
+    def submit(self, lines: List[Dict[str, Any]]) -> str:
+        """提交一个批量任务，返回任务 ID"""
+        data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+        uploaded = self.client.files.create(file=("requests.jsonl", data), purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint="/v1/chat/completions",
+                                           completion_window=self.completion_window)
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """任务未结束时返回 None；结束后返回 custom_id -> 结果行（成功与失败的都包含）"""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in self.TERMINAL:
+            return None
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    row = json.loads(line)
+                    results[row["custom_id"]] = row
+        return results
+
+
+def _parse_result(row: Optional[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+    """从结果行中取出 (回复内容, 推理内容)，失败时抛出 BatchRequestFailed"""
+    if row is None:
+        raise BatchRequestFailed("批量任务结束但没有返回该请求的结果")
+    response = row.get("response") or {}
+    if row.get("error") or response.get("status_code") != 200:
+        raise BatchRequestFailed(str(row.get("error") or response.get("body")))
+    message = response["body"]["choices"][0]["message"]
+    return (message.get("content") or "").strip(), message.get("reasoning_content")
+
+
+class _Request:
+    __slots__ = ("custom_id", "body", "future", "attempts")
+
+    def __init__(self, custom_id: str, body: Dict[str, Any]):
+        self.custom_id = custom_id
+        self.body = body
+        self.future: Future = Future()
+        self.attempts = 0
+
+
+class BatchCollector:
+    """
+    收集请求并按批提交。chat 的签名与 game_utils._chat 相同，可在任意线程中调用，阻塞到结果返回；
+    提交与轮询由一个后台线程完成。
+    """
+
+    def __init__(self, client, max_batch: int = MAX_BATCH, linger: float = LINGER,
+                 poll_interval: float = POLL_INTERVAL, max_retries: int = MAX_RETRIES):
+        self.client = client
+        self.max_batch = max_batch
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._pending: List[_Request] = []
+        self._pending_since = 0.0
+        self._jobs: Dict[str, List[_Request]] = {}
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # 统计
+        self.requests = 0
+        self.batches = 0
+        self.retried = 0
+        self.failed = 0
+
+    def chat(self, messages: List[Dict[str, str]], model: str, parser=None,
+             cancel_event: Optional[threading.Event] = None) -> Tuple[str, Optional[str]]:
+        """
+        提交一次对话并等待结果。批量任务不支持流式输出和中途取消，cancel_event 被忽略；
+        需要 JSON 输出时对支持的模型加上 JSON 模式约束，结果整体交给 parser
+        """
+        params = model_config[model]
+        body = {"model": params["model"], "messages": messages}
+        for key in ("temperature", "top_p"):
+            if key in params:
+                body[key] = params[key]
+        if parser is not None and model in JSON_MODE_MODELS:
+            body["response_format"] = {"type": "json_object"}
+
+        raw_response, reasoning_content = self.submit(body).result()
+        if parser is not None:
+            parser.feed(raw_response)
+        return raw_response, reasoning_content
+
+    def submit(self, body: Dict[str, Any]) -> Future:
+        """加入待提交队列，返回在结果到达时完成的 Future"""
+        request = _Request(f"req-{next(self._ids)}", body)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchCollector 已关闭")
+            self._ensure_running()
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append(request)
+            self.requests += 1
+            self._cond.notify_all()
+        return request.future
+
+    def _ensure_running(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="batch-collector", daemon=True)
+            self._thread.start()
+
+    def _flush_due(self, now: float) -> bool:
+        if not self._pending:
+            return False
+        return self._closed or len(self._pending) >= self.max_batch or now >= self._pending_since + self.linger
+
+    def _run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._closed and not self._pending and not self._jobs:
+                        return
+                    due = self._flush_due(now)
+                    if due or (self._jobs and now >= next_poll):
+                        break
+                    deadline = min(self._pending_since + self.linger if self._pending else float("inf"),
+                                   next_poll if self._jobs else float("inf"))
+                    self._cond.wait(timeout=None if deadline == float("inf") else deadline - now)
+                batch = []
+                if due:
+                    batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                    self._pending_since = now
+            # 网络请求在锁外进行，期间新请求可以继续加入队列
+            if batch:
+                self._submit_batch(batch)
+            if self._jobs and time.monotonic() >= next_poll:
+                self._poll_jobs()
+                next_poll = time.monotonic() + self.poll_interval
+
+    def _submit_batch(self, batch: List[_Request]):
+        lines = [{"custom_id": r.custom_id, "method": "POST", "url": "/v1/chat/completions", "body": r.body}
+                 for r in batch]
+        try:
+            batch_id = self.client.submit(lines)
+        except Exception as e:
+            print(f"提交批量任务失败: {e}")
+            self._retry_or_fail(batch, e)
+            return
+        with self._cond:
+            self._jobs[batch_id] = batch
+            self.batches += 1
+
+    def _poll_jobs(self):
+        for batch_id in list(self._jobs):
+            try:
+                results = self.client.poll(batch_id)
+            except Exception as e:
+                print(f"查询批量任务 {batch_id} 失败: {e}")
+                continue
+            if results is None:
+                continue
+            with self._cond:
+                batch = self._jobs.pop(batch_id)
+            failed = []
+            for request in batch:
+                try:
+                    request.future.set_result(_parse_result(results.get(request.custom_id)))
+                except BatchRequestFailed as e:
+                    failed.append((request, e))
+            for request, error in failed:
+                self._retry_or_fail([request], error)
+
+    def _retry_or_fail(self, requests: List[_Request], error: Exception):
+        with self._cond:
+            for request in requests:
+                request.attempts += 1
+                if request.attempts <= self.max_retries and not self._closed:
+                    self.retried += 1
+                    if not self._pending:
+                        self._pending_since = time.monotonic()
+                    self._pending.append(request)
+                else:
+                    self.failed += 1
+                    request.future.set_exception(BatchRequestFailed(str(error)))
+            self._cond.notify_all()
+
+    def close(self):
+        """立即提交剩余请求，等待所有任务结束后停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "retried": self.retried,
+                "failed": self.failed,
+                "pending": len(self._pending),
+                "running_jobs": len(self._jobs),
+            }
@@ -0,0 +1,120 @@
+# events.py
+import time
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+# 事件可见性：公开事件观战者随时可见；其余事件仅对对应角色可见，游戏结束后全部公开
+PUBLIC = "public"
+
+# 对局中任何玩家都不可见的事件（例如角色分配），只在结束后的回放中出现
+HIDDEN = "hidden"
+
+# 紧凑回放格式版本
+REPLAY_VERSION = 1
+
+
+class EventLog:
+    """
+    追加式游戏事件日志。seq 从 1 开始递增，游标即最后读到的 seq，
+    因此分页读取和断点续读都不需要重新发送已读过的事件。
+    分叉出的日志与父日志共享前 offset 条事件（父日志只追加，共享部分不会再变），只保存分叉后的新事件。
+    """
+
+    def __init__(self, parent: Optional["EventLog"] = None, offset: int = 0):
+        self._parent = parent
+        self._offset = offset if parent is not None else 0
+        self._events: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.started_at = parent.started_at if parent is not None else time.time()
+
+    def __len__(self) -> int:
+        return self._offset + len(self._events)
+
+    @property
+    def last_seq(self) -> int:
+        return self._offset + len(self._events)
+
+    def fork(self, upto_seq: int) -> "EventLog":
+        """以前 upto_seq 条事件为共同历史分叉出新日志，O(1)"""
+        if not 0 <= upto_seq <= self.last_seq:
+            raise ValueError(f"无效的分叉位置: {upto_seq}")
+        return EventLog(parent=self, offset=upto_seq)
+
+    def _event_at(self, position: int) -> Dict[str, Any]:
+        if position < self._offset:
+            return self._parent._event_at(position)
+        return self._events[position - self._offset]
+
+    def append(self, kind: str, visibility: str = PUBLIC, **data) -> Dict[str, Any]:
+        """追加一条事件并通知订阅者"""
+        event = {
+            "seq": self.last_seq + 1,
+            "ts": time.time(),
+            "kind": kind,
+            "visibility": visibility,
+            "data": data,
+        }
+        self._events.append(event)
+        for listener in list(self._listeners):
+            listener(event)
+        return event
+
+    def read(self, cursor: int = 0, limit: int = 100,
+             visible: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """从游标之后读取最多 limit 条可见事件，返回 (事件列表, 新游标)"""
+        result = []
+        position = max(cursor, 0)
+        while position < self.last_seq and len(result) < limit:
+            event = self._event_at(position)
+            position += 1
+            if visible is None or visible(event):
+                result.append(event)
+        return result, position
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
+def spectator_visible(finished: bool) -> Callable[[Dict[str, Any]], bool]:
+    """观战者可见性：对局进行中只看公开事件，结束后全部可见"""
+    if finished:
+        return lambda event: True
+    return lambda event: event["visibility"] == PUBLIC
+
+
+def compact_replay(game_id: str, events: EventLog) -> Dict[str, Any]:
+    """
+    把完整事件日志压缩为回放格式：事件类型和可见性用编号表示，
+    时间戳改为相对开局的毫秒数，每个事件是 [seq, 毫秒, 类型编号, 可见性编号, 数据]。
+    """
+    kinds: List[str] = []
+    visibilities: List[str] = []
+    kind_index: Dict[str, int] = {}
+    visibility_index: Dict[str, int] = {}
+    rows = []
+    for event in events.read(0, limit=len(events))[0]:
+        kind, visibility = event["kind"], event["visibility"]
+        if kind not in kind_index:
+            kind_index[kind] = len(kinds)
+            kinds.append(kind)
+        if visibility not in visibility_index:
+            visibility_index[visibility] = len(visibilities)
+            visibilities.append(visibility)
+        rows.append([
+            event["seq"],
+            int((event["ts"] - events.started_at) * 1000),
+            kind_index[kind],
+            visibility_index[visibility],
+            event["data"],
+        ])
+    return {
+        "v": REPLAY_VERSION,
+        "game_id": game_id,
+        "started_at": events.started_at,
+        "kinds": kinds,
+        "visibilities": visibilities,
+        "events": rows,
+    }
@@ -1,16 +1,33 @@
 # game_utils.py
 from enum import Enum
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import random
-import json
-import dashscope
-import os
+import threading
 
-from config import DASH_SCOPE_API_KEY
-from logic.model_config import model_config
+import config
+from logic.batch_inference import current_collector
+from logic.llm_scheduler import get_scheduler
+from logic.model_config import model_config, JSON_MODE_MODELS
+from logic.structured_output import ACTION_VALIDATORS, IncrementalJSONParser, StructuredOutputError
 
-# 设置DashScope API密钥
-dashscope.api_key = DASH_SCOPE_API_KEY
+# 输出格式错误时最多追问的次数
+MAX_FORMAT_RETRIES = 2
+
+# 排队时为模型输出预留的 token 数，请求结束后按实际用量修正
+ESTIMATED_OUTPUT_TOKENS = 800
+
+# DashScope SDK 在首次真实调用时才导入，离线模式和冷启动不承担其导入开销
+_dashscope = None
+
+
+def _get_dashscope():
+    """懒加载 DashScope SDK，并在此时才校验 API Key"""
+    global _dashscope
+    if _dashscope is None:
+        import dashscope
+        dashscope.api_key = config.require_dashscope_api_key()
+        _dashscope = dashscope
+    return _dashscope
 
 class Role(str, Enum):
     WOLF = "WOLF"
@@ -79,10 +96,28 @@ def format_memory(memory: Dict[str, Any]) -> str:
 
     return "\n".join(description)
 
-def call_dashscope(content: Dict[str, Any], model, test=False) -> Dict[str, Any]:
-    """
-    调用DashScope API，将content解析为自然语言输入，并解析JSON响应
-    """
+def get_alive_player_ids(game_log: Dict[str, Any]) -> List[int]:
+    """从最近一次结果记录中获取存活玩家ID"""
+    for key in reversed(list(game_log.keys())):
+        if key.startswith("result-"):
+            return sorted(game_log[key]["alive"].keys())
+    return sorted(game_log.get("player_roles", {}).keys())
+
+
+def get_current_round(game_log: Dict[str, Any]) -> int:
+    """根据最近的夜晚/白天记录推断当前轮次"""
+    for key in reversed(list(game_log.keys())):
+        if key.startswith("night-") or key.startswith("day-"):
+            return int(key.split("-")[-1])
+    return 0
+
+
+class RequestCancelled(Exception):
+    """请求已被调用方取消（例如推测执行中用不到的那一路）"""
+
+
+def build_messages(content: Dict[str, Any]) -> Tuple[List[Dict[str, str]], List[int]]:
+    """把 content 转换为发给模型的消息，返回 (messages, 合法目标)"""
     # 角色映射为中文
     role_map = {
         Role.WOLF.name: "狼人",
@@ -115,7 +150,8 @@ def call_dashscope(content: Dict[str, Any], model, test=False) -> Dict[str, Any]
     # 添加记忆信息
     if "memory" in content:
         user_prompt += "游戏历史记录：\n"
-        user_prompt += format_memory(content["memory"])
+        # 开启检索记忆时只包含最近阶段的完整记录和检索出的相关旧记录
+        user_prompt += content["memory_text"] if "memory_text" in content else format_memory(content["memory"])
         # 思考记录
         if reasoning_contents:
             user_prompt += "\n\n 思考记录，以 阶段-天数的形式:\n"
@@ -136,6 +172,9 @@ def call_dashscope(content: Dict[str, Any], model, test=False) -> Dict[str, Any]
     # 根据操作类型添加指令
     operation_type = content.get("type", "")
     question_guide = content.get("question_guide", "")
+    legal_targets = content.get("legal_targets")
+    if legal_targets is None:
+        legal_targets = [-1] + list(range(6))
 
     # 添加角色行为指南
     role_behavior = {
@@ -172,8 +211,10 @@ def call_dashscope(content: Dict[str, Any], model, test=False) -> Dict[str, Any]
         user_prompt += (
             f"\n现在需要你投票决定放逐一名玩家。{question_guide}"
             "请分析场上情况，选择你认为最可疑的玩家进行投票。"
-            "在思考后，输出一个数字表示你要投票的玩家ID（0-5）。"
-            "弃权选择-1。"
+            f"可选目标: {_format_targets(legal_targets)}，弃权写-1。"
+            "在思考后，输出一个JSON格式的响应："
+            '{"thinking": "你的思考过程", "target": 投票的玩家ID}'
+            "请确保只输出有效的JSON格式，不要包含其他内容。"
         )
     elif operation_type == "thinking and target":
         user_prompt += (
@@ -182,92 +223,187 @@ def call_dashscope(content: Dict[str, Any], model, test=False) -> Dict[str, Any]
             "请分析场上情况，做出符合你角色能力的决策。"
             "在思考后，输出一个JSON格式的响应："
             '{"thinking": "你的思考过程", "target": 目标玩家ID}'
-            "目标玩家ID应为0-5之间的整数，如果没有目标则写-1。"
+            f"目标玩家ID只能从这些玩家中选择: {_format_targets(legal_targets)}。"
+            "请确保只输出有效的JSON格式，不要包含其他内容。"
+        )
+    elif operation_type == "faction plan":
+        wolf_ids = content.get("wolf_ids", [])
+        statement_example = ", ".join(f'"{wid}": "玩家{wid}的发言"' for wid in wolf_ids)
+        user_prompt += (
+            f"\n现在是夜间行动阶段。{question_guide}"
+            f"你需要代表全体狼人（{', '.join(f'玩家{wid}' for wid in wolf_ids)}）统一商议，"
+            "为每名狼人写一段夜间讨论发言，并给出大家一致同意的刀杀目标。"
+            "在思考后，输出一个JSON格式的响应："
+            f'{{"statements": {{{statement_example}}}, "target": 目标玩家ID}}'
+            f"目标玩家ID只能从这些玩家中选择: {_format_targets(legal_targets)}。"
             "请确保只输出有效的JSON格式，不要包含其他内容。"
         )
     else:
         user_prompt += f"\n{question_guide}"
 
-    if test:
-        # 测试模式逻辑
-        alive_players = [i for i in range(6)]
-        target = -1
-        if role == Role.WOLF.name:
-            candidates = [p for p in alive_players if p != player_id]
-            target = random.choice(candidates) if candidates else -1
-        elif role == Role.SEER.name:
-            checked_players = content.get("checked_players", {})
-            candidates = [p for p in alive_players if p not in checked_players]
-            target = random.choice(candidates) if candidates else -1
-        elif role == Role.GUARD.name:
-            last_guarded = content.get("last_guarded", -1)
-            candidates = [p for p in alive_players if p != last_guarded]
-            target = random.choice(candidates) if candidates else -1
-
-        thinking = f"[测试模式] {role}选择了玩家 {target}"
-        return {"response": {"thinking": thinking, "target": target}}
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return messages, legal_targets
 
-    try:
-        # 调用DashScope API
-        def _get_response(retry_times=3):
-            for i in range(retry_times):
-                response = dashscope.Generation.call(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    **model_config[model]
-                )
-                # 检查响应状态
-                if response.status_code != 200:
-                    print(f"DashScope API调用失败: {response.code} - {response.message}")
-                else:
-                    return response
-            else:
-                raise Exception(f"DashScope API调用失败: 重试次数达到上限")
 
-        response = _get_response()
+def call_dashscope(content: Dict[str, Any], model, test: Optional[bool] = None,
+                   cancel_event: Optional[threading.Event] = None,
+                   rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """
+    调用DashScope API，将content解析为自然语言输入，并解析JSON响应
+    test 为 None 时由 LLM_BACKEND 决定是否走离线模拟；cancel_event 被设置后停止接收输出；
+    rng 为离线模拟使用的随机数生成器（每局各自一个，多局并发时互不干扰），未提供时使用全局随机数
+    """
+    if test is None:
+        test = config.LLM_BACKEND == "offline"
+
+    messages, legal_targets = build_messages(content)
+    if test:
+        return _offline_response(content, legal_targets, rng or random)
 
-        # 获取模型响应内容
-        raw_response = response.output.choices[0]['message']['content'].strip()
-        reasoning_content = response.output.choices[0]['message'].get('reasoning_content', None)
+    # 批量模式下请求交给收集器，与其他对局的请求一起提交批量推理任务
+    collector = current_collector()
+    if collector is not None:
+        chat = collector.chat
+    else:
+        # 配置错误（如缺少 API Key）直接抛出，而不是被下面的兜底吞掉
+        _get_dashscope()
+        chat = _chat
 
-        # 根据操作类型解析响应
-        if operation_type == "thinking and target":
-            # 尝试解析JSON格式
-            try:
-                # 提取JSON部分（可能包含在代码块中）
-                json_start = raw_response.find('{')
-                json_end = raw_response.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_str = raw_response[json_start:json_end]
-                    parsed = json.loads(json_str)
-                    return {"response": parsed, "reasoning_content":reasoning_content}
-                else:
-                    # 如果没有显式JSON，尝试直接解析整个响应
-                    parsed = json.loads(raw_response)
-                    return {"response": parsed}
-            except json.JSONDecodeError as e:
-                # 如果JSON解析失败，返回错误信息
-                return {
-                    "response": {
-                        "thinking": f"JSON解析失败: {str(e)}. 原始响应: {raw_response}",
-                        "target": -1
-                    }
-                }
-
-        elif operation_type == "decision":
-            # 尝试提取投票目标数字
-            for char in raw_response:
-                if char.isdigit() and 0 <= int(char) <= 5:
-                    return {"response": {"thinking": raw_response, "target": int(char)}}
-            # 如果没有找到有效数字
-            return {"response": {"thinking": raw_response, "target": -1}}
-
-        else:  # 发言或其他
-            return {"response": {"thinking": raw_response, "target": -1}}
+    player_id = content.get("player_id", -1)
+    operation_type = content.get("type", "")
+    validator = ACTION_VALIDATORS.get(operation_type)
 
+    try:
+        if validator is None:  # 发言或其他自由文本
+            raw_response, reasoning_content = chat(messages, model, cancel_event=cancel_event)
+            return {"response": {"thinking": raw_response, "target": -1}, "reasoning_content": reasoning_content}
+
+        # 只有输出确实无法解析或目标不合法时才追问，网络错误由 _chat 自己重试
+        for attempt in range(MAX_FORMAT_RETRIES + 1):
+            parser = IncrementalJSONParser()
+            raw_response, reasoning_content = chat(messages, model, parser=parser, cancel_event=cancel_event)
+            try:
+                parsed = validator(parser.close(), legal_targets, content)
+                return {"response": parsed, "reasoning_content": reasoning_content}
+            except StructuredOutputError as e:
+                print(f"玩家{player_id}输出格式错误（第{attempt + 1}次）: {e}")
+                messages = messages + [
+                    {"role": "assistant", "content": raw_response},
+                    {"role": "user", "content": (
+                        f"你的上一次输出不符合要求：{e}。"
+                        f"请只输出一个JSON对象，target 必须是以下之一: {_format_targets(legal_targets)}。"
+                    )},
+                ]
+
+        return {
+            "response": {"thinking": raw_response, "target": -1},
+            "reasoning_content": reasoning_content,
+            "valid": False
+        }
+
+    except RequestCancelled:
+        return {"response": {"thinking": "请求已取消", "target": -1}, "valid": False}
     except Exception as e:
         print(f"调用DashScope API失败: {str(e)}")
         # 失败时返回默认值
-        return {"response": {"thinking": "思考过程生成失败", "target": -1}}
+        return {"response": {"thinking": "思考过程生成失败", "target": -1}, "valid": False}
+
+
+def _format_targets(legal_targets: List[int]) -> str:
+    return ", ".join(str(t) for t in sorted(legal_targets)) or "无"
+
+
+def _offline_response(content: Dict[str, Any], legal_targets: List[int], rng=random) -> Dict[str, Any]:
+    """离线/测试模式：不调用模型，从合法目标中随机选择"""
+    role = content["role"]
+    operation_type = content.get("type", "")
+
+    if operation_type == "speech":
+        return {"response": {"thinking": f"[测试模式] 玩家{content.get('player_id', -1)}的发言", "target": -1}}
+
+    candidates = [t for t in legal_targets if t != -1]
+    target = -1
+    if role != Role.VILLAGER.name or operation_type == "decision":
+        target = rng.choice(candidates) if candidates else -1
+
+    thinking = f"[测试模式] {role}选择了玩家 {target}"
+    if operation_type == "faction plan":
+        statements = {wid: f"[测试模式] 狼人{wid}同意刀杀玩家 {target}" for wid in content.get("wolf_ids", [])}
+        return {"response": {"thinking": thinking, "target": target, "statements": statements}}
+    return {"response": {"thinking": thinking, "target": target}}
+
+
+def _chat(messages: List[Dict[str, str]], model: str,
+          parser: Optional[IncrementalJSONParser] = None,
+          cancel_event: Optional[threading.Event] = None,
+          retry_times: int = 3) -> Tuple[str, Optional[str]]:
+    """
+    调用模型，返回 (回复内容, 推理内容)。
+    提供 parser 时：支持 JSON 模式的模型直接约束输出格式；其他模型流式读取，
+    一旦解析出完整 JSON 对象就停止接收剩余输出。
+    """
+    dashscope = _get_dashscope()
+    params = dict(model_config[model])
+    stream = parser is not None and model not in JSON_MODE_MODELS
+    if parser is not None and not stream:
+        params["response_format"] = {"type": "json_object"}
+
+    # 按字符数粗略估计输入 token，用于全局调度器的 TPM 限流
+    estimated_tokens = sum(len(m["content"]) for m in messages) + ESTIMATED_OUTPUT_TOKENS
+    scheduler = get_scheduler()
+
+    for i in range(retry_times):
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled()
+        with scheduler.slot(model, estimated_tokens) as usage:
+            if not stream:
+                response = dashscope.Generation.call(messages=messages, **params)
+                usage["tokens"] = _total_tokens(response)
+                # 检查响应状态
+                if response.status_code != 200:
+                    print(f"DashScope API调用失败: {response.code} - {response.message}")
+                    continue
+                message = response.output.choices[0]['message']
+                raw_response = message['content'].strip()
+                if parser is not None:
+                    parser.feed(raw_response)
+                return raw_response, message.get('reasoning_content', None)
+
+            content_parts, reasoning_parts = [], []
+            failed = False
+            for chunk in dashscope.Generation.call(messages=messages, stream=True, incremental_output=True, **params):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled()
+                if chunk.status_code != 200:
+                    print(f"DashScope API调用失败: {chunk.code} - {chunk.message}")
+                    failed = True
+                    break
+                usage["tokens"] = _total_tokens(chunk) or usage["tokens"]
+                message = chunk.output.choices[0]['message']
+                if message.get('reasoning_content'):
+                    reasoning_parts.append(message['reasoning_content'])
+                if message.get('content'):
+                    content_parts.append(message['content'])
+                    if parser.feed(message['content']) is not None:
+                        break
+            if failed:
+                # 流中途失败时已收到的内容是截断的，丢弃后整体重试
+                parser.reset()
+                continue
+            return "".join(content_parts).strip(), "".join(reasoning_parts) or None
+
+    raise Exception(f"DashScope API调用失败: 重试次数达到上限")
+
+
+def _total_tokens(response) -> Optional[int]:
+    """从响应中读取实际 token 用量，没有时返回 None"""
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return None
+    try:
+        return int(usage["input_tokens"]) + int(usage["output_tokens"])
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -1,54 +1,136 @@
 # gamemanager.py
+import copy
+import functools
 import random
 import time
-from typing import Dict, Any, List
+import uuid
+from typing import Dict, Any, List, Optional
 
+from logic.events import EventLog, HIDDEN
 from logic.game_utils import Role
-from logic.player import Player
-
-
-def _resolve_votes(votes: Dict[int, List[int]]) -> int:
-    """解决投票冲突，返回得票最多的玩家ID"""
-    if not votes:
-        return -1  # 没有投票
-
-    # 统计有效票数
-    vote_counts = {}
-    for target, voters in votes.items():
-        if target >= 0:  # 只统计有效目标
-            vote_counts[target] = vote_counts.get(target, 0) + len(voters)
-
-    if not vote_counts:
-        return -1  # 所有投票都无效
-
-    max_votes = max(vote_counts.values())
-    candidates = [pid for pid, count in vote_counts.items() if count == max_votes]
-
-    # 处理平票情况
-    return random.choice(candidates) if candidates else -1
-
-
-def _record_vote(vote_dict: Dict[int, List[int]], target_id: int, voter_id: int):
-    """记录投票信息"""
-    if target_id != -1:
-        if target_id not in vote_dict:
-            vote_dict[target_id] = []
-        vote_dict[target_id].append(voter_id)
+from logic.model_config import model_config
+from logic.llm_scheduler import Priority, request_context
+from logic.model_router import ModelRouter
+from logic.pipeline import DecisionPipeline
+from logic.player import Player, faction_content, plan_wolf_faction
+from logic.rules import IllegalAction, Rules, bit, mask_of, tally
+from logic.strategies import HeuristicStrategy, LLMStrategy
+
+
+def _night_section() -> Dict[str, Any]:
+    return {
+        "wolf_sayings": {},
+        # 每名狼人各自的刀人目标（狼人可见）；wolf_vote 与最初的日志格式一致，夜晚结算后只记录最终目标及其得票
+        "wolf_ballots": {},
+        "wolf_vote": {},
+        "seer_analysis": "",
+        "seer_predict": {},
+        "guard_analysis": "",
+        "guard_protect": -1,
+    }
+
+
+def _day_section() -> Dict[str, Any]:
+    return {
+        "heard_sayings": {},
+        "final_vote": {}
+    }
+
+
+def _llm_phase(method):
+    """阶段处理期间发出的模型请求按本局游戏和优先级在全局调度器中排队"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with request_context(self.game_id, self.priority):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# 座位后端：离线模拟、不调用模型的规则策略，或交给路由器按局面选择模型；其余取值为 model_config 中的模型名
+OFFLINE_BACKEND = "offline"
+HEURISTIC_BACKEND = "heuristic"
+ROUTER_BACKEND = "router"
+SEAT_BACKENDS = (OFFLINE_BACKEND, HEURISTIC_BACKEND, ROUTER_BACKEND)
+
+
+class GameSnapshot:
+    """
+    阶段边界上的对局快照。以前轮次的日志段在轮次结束后不再被修改，快照直接引用它们；
+    只有当前轮次仍会被写入的夜晚/白天段才复制一份，因此快照和分叉的开销与对局长度无关。
+    """
+    __slots__ = ("phase", "round", "log", "players", "event_seq", "rng_state", "finished")
+
+    def __init__(self, game: "GameManager"):
+        self.phase = game.current_phase
+        self.round = game.current_round
+        self.log = _share_log(game.game_log, game.current_round)
+        self.players = [
+            (p.alive, dict(p.checked_players), p.last_guarded, dict(p.reasoning_contents)) for p in game.players
+        ]
+        self.event_seq = game.events.last_seq
+        self.rng_state = game.rng.getstate()
+        self.finished = game.finished
+
+    def describe(self) -> Dict[str, Any]:
+        return {"phase": self.phase, "round": self.round, "event_seq": self.event_seq, "finished": self.finished}
+
+
+def _share_log(game_log: Dict[str, Any], current_round: int) -> Dict[str, Any]:
+    """复制日志的目录：当前轮次的夜晚/白天段深拷贝，其余段共享引用"""
+    suffix = f"-{current_round}"
+    return {
+        key: copy.deepcopy(section) if key.endswith(suffix) and key.startswith(("night-", "day-")) else section
+        for key, section in game_log.items()
+    }
 
 
 class GameManager:
-    def __init__(self, verbose: bool = True):
+    def __init__(self, verbose: bool = True, router: Optional[ModelRouter] = None, wolf_batch: bool = False,
+                 game_id: Optional[str] = None, priority: Priority = Priority.AI_ONLY,
+                 seed: Optional[int] = None, seat_backends: Optional[List[str]] = None,
+                 snapshot: Optional[GameSnapshot] = None, events: Optional[EventLog] = None,
+                 retrieval_memory: bool = False, speculative: bool = False):
+        self.game_id = game_id or uuid.uuid4().hex
+        self.priority = priority
         self.players: List[Player] = []
         self.current_phase = "NIGHT"
         self.current_round = 0
         self.game_log: Dict[str, Any] = {}
+        # 追加式事件日志，供观战分页、实时推送和回放使用
+        self.events = events if events is not None else EventLog()
+        self.finished = False
         self.verbose = verbose
-        self.setup_game()
+        # 简单决策交给快速模型或规则，有争议的决策才使用推理模型
+        self.router = router if router is not None else ModelRouter()
+        # 狼人团队批量模式：一次请求产出所有狼人的发言和统一目标
+        self.wolf_batch = wolf_batch
+        # 指定 seed 时角色分配和平票裁决可复现
+        self.rng = random.Random(seed)
+        # 每个座位使用的后端，为 None 时所有座位都走路由器
+        if seat_backends is not None:
+            if len(seat_backends) != 6:
+                raise ValueError("seat_backends 必须为 6 个座位各指定一个后端")
+            for backend in seat_backends:
+                if backend not in SEAT_BACKENDS and backend not in model_config:
+                    raise ValueError(f"未知座位后端: {backend}")
+        self.seat_backends = seat_backends
+        # 玩家提示使用检索记忆，而不是每次发送完整历史
+        self.retrieval_memory = retrieval_memory
+        # 推测执行：输入已确定的模型决策提前并行执行（未命中的推测会多消耗该座位的随机数，离线模拟结果与不开启时不同，默认关闭）
+        self.pipeline = DecisionPipeline() if speculative else None
+        # 每个阶段边界的快照，可从任一快照分叉重跑
+        self.snapshots: List[GameSnapshot] = []
+        if snapshot is None:
+            self.setup_game()
+        else:
+            self._restore(snapshot, reseed=seed is not None)
+        self.snapshots.append(GameSnapshot(self))
 
     def setup_game(self):
         """初始化游戏，分配角色并创建玩家"""
         roles = [Role.WOLF, Role.WOLF, Role.VILLAGER, Role.VILLAGER, Role.SEER, Role.GUARD]
-        random.shuffle(roles)
+        self.rng.shuffle(roles)
+        self.rules = Rules(roles)
 
         # 创建玩家角色字典
         self.game_log["player_roles"] = {
@@ -60,51 +142,141 @@ class GameManager:
 
         # 初始化玩家对象
         for i in range(6):
-            self.players.append(Player(i, roles[i]))
+            self.players.append(self._create_player(i, roles[i]))
+
+        self.events.append("game_created", players=[player.player_id for player in self.players])
+        self.events.append("roles", visibility=HIDDEN, roles={p.player_id: p.role.name for p in self.players})
 
         if self.verbose:
             print("=== 游戏开始 ===")
             print("初始角色分配: ", [player.role.name for player in self.players])
         self._log_round_result()
 
+    def _restore(self, snapshot: GameSnapshot, reseed: bool):
+        """从快照恢复状态（由 fork 调用，事件日志已在外部分叉好）"""
+        self.current_phase = snapshot.phase
+        self.current_round = snapshot.round
+        self.game_log = _share_log(snapshot.log, snapshot.round)
+        self.finished = snapshot.finished
+        if not reseed:
+            self.rng.setstate(snapshot.rng_state)
+        roles = self.game_log["player_roles"]
+        self.rules = Rules.from_log(self.game_log)
+        for i, (alive, checked_players, last_guarded, reasoning_contents) in enumerate(snapshot.players):
+            player = self._create_player(i, roles[i]["role"])
+            player.alive = alive
+            player.checked_players = dict(checked_players)
+            player.last_guarded = last_guarded
+            player.reasoning_contents = dict(reasoning_contents)
+            self.players.append(player)
+
+    def fork(self, snapshot_index: int = -1, game_id: Optional[str] = None, seed: Optional[int] = None,
+             seat_backends: Optional[List[str]] = None, router: Optional[ModelRouter] = None,
+             verbose: Optional[bool] = None) -> "GameManager":
+        """
+        从某个阶段边界分叉出一局新游戏，可换种子、换座位后端或路由器重跑之后的阶段。
+        不指定 seed 时沿用快照时的随机数状态；分叉后的两局互不影响。
+        """
+        snapshot = self.snapshots[snapshot_index]
+        return GameManager(
+            verbose=self.verbose if verbose is None else verbose,
+            router=router if router is not None else self.router,
+            wolf_batch=self.wolf_batch,
+            game_id=game_id,
+            priority=self.priority,
+            seed=seed,
+            seat_backends=seat_backends if seat_backends is not None else self.seat_backends,
+            snapshot=snapshot,
+            events=self.events.fork(snapshot.event_seq),
+            retrieval_memory=self.retrieval_memory,
+            speculative=self.pipeline is not None,
+        )
+
+    def _create_player(self, player_id: int, role: Role) -> Player:
+        backend = self.seat_backends[player_id] if self.seat_backends is not None else ROUTER_BACKEND
+        memory = self.retrieval_memory
+        # 每个座位一个由对局种子派生的随机数：离线模拟和规则策略的随机选择可复现，且不受同时运行的其他对局影响
+        rng = random.Random(self.rng.getrandbits(32))
+        if backend == ROUTER_BACKEND:
+            player = Player(player_id, role, router=self.router, retrieval_memory=memory, rng=rng)
+        elif backend == OFFLINE_BACKEND:
+            player = Player(player_id, role, offline=True, retrieval_memory=memory, rng=rng)
+        elif backend == HEURISTIC_BACKEND:
+            player = Player(player_id, role, strategy=HeuristicStrategy(rng), rng=rng)
+        else:
+            player = Player(player_id, role, model=backend, retrieval_memory=memory, rng=rng)
+        player.rules = self.rules
+        # 规则策略本身只需微秒级时间，且依赖对局种子的随机数顺序，不参与推测
+        if self.pipeline is not None and isinstance(player.strategy, LLMStrategy):
+            player.pipeline = self.pipeline
+        return player
+
+    def _prefetch_night(self, game_log: Dict[str, Any]):
+        """推测夜间行动：狼人、预言家、守卫互相看不到对方的夜间记录，输入在入夜前就已确定"""
+        alive = [p for p in self.players if p.alive]
+        werewolves = [p for p in alive if p.role == Role.WOLF]
+        if werewolves and self.wolf_batch and len(werewolves) > 1:
+            if werewolves[0].pipeline is not None:
+                self.pipeline.prefetch(werewolves[0], faction_content(werewolves, game_log), game_log)
+            actors = []
+        else:
+            # 后面的狼人能看到前面狼人的发言，只有第一名狼人的输入是确定的
+            actors = werewolves[:1]
+        for role in (Role.SEER, Role.GUARD):
+            actors += [p for p in alive if p.role == role][:1]
+        for player in actors:
+            if player.pipeline is not None:
+                self.pipeline.prefetch(player, player.action_content(game_log), game_log)
+
+    def _prefetch_speech(self, game_log: Dict[str, Any]):
+        """推测白天第一位发言者的发言，后面的发言者依赖前面的发言"""
+        speakers = [p for p in self.players if p.alive]
+        if speakers and speakers[0].pipeline is not None:
+            self.pipeline.prefetch(speakers[0], speakers[0].speech_content(game_log), game_log)
+
+    def _prefetch_votes(self, game_log: Dict[str, Any]):
+        """
+        推测投票：投票阶段中日志不变，所有人的投票输入在发言结束时就已确定。
+        路由器座位按已投票数选择模型，决策依赖投票顺序，不做推测
+        """
+        for player in self.players:
+            if player.alive and player.pipeline is not None and (player.router is None or player.offline):
+                self.pipeline.prefetch(player, player.vote_content(game_log), game_log)
+
+    @_llm_phase
     def handle_night_phase(self):
         """处理夜间阶段的行动"""
         night_key = f"night-{self.current_round}"
-        self.game_log[night_key] = {
-            "wolf_sayings": {},
-            "wolf_vote": {},
-            "seer_analysis": "",
-            "seer_predict": {},
-            "guard_analysis": "",
-            "guard_protect": -1,
-        }
+        self.game_log[night_key] = _night_section()
+        if self.pipeline is not None:
+            # 预言家、守卫与狼人并行决策（已在上一轮投票后推测过的不会重复提交）
+            self._prefetch_night(self.game_log)
 
-        # 处理狼人投票
+        # 处理狼人投票：每名狼人的发言和刀人目标与 HTTP 接口一样逐条写入，最后统一结算
         werewolves = [p for p in self.players if p.role == Role.WOLF and p.alive]
-        if werewolves:
-            wolf_votes = {}
+        if werewolves and self.wolf_batch and len(werewolves) > 1:
+            statements, final_target = plan_wolf_faction(werewolves, self.game_log)
+            for wolf in werewolves:
+                self._wolf_decision(wolf.player_id, final_target, statements.get(wolf.player_id))
+            if self.verbose:
+                print(f"狼人团队发言: {statements}, 统一目标: {final_target}")
+        else:
             for wolf in werewolves:
                 thinking, target_id = wolf.action_thinking_result(self.game_log)
-                self.game_log[night_key]["wolf_sayings"][wolf.player_id] = thinking
-                _record_vote(wolf_votes, target_id, wolf.player_id)
+                self._wolf_decision(wolf.player_id, target_id, thinking)
                 if self.verbose:
                     print(f"狼人 {wolf.player_id} 表达：{thinking}, 投票给: {target_id}")
-            candidate = _resolve_votes(wolf_votes)
-            final_target = candidate if candidate else -1
-            if self.verbose:
-                print(f"狼人最终目标: {final_target}，获得的票来自: ", wolf_votes.get(final_target, []))
-            self.game_log[night_key]["wolf_vote"][final_target] = wolf_votes.get(final_target, [])
 
         # 处理预言家行动
         seers = [p for p in self.players if p.role == Role.SEER and p.alive]
         if seers:
             seer = seers[0]
-            analysis, prediction = seer.action_thinking_result(self.game_log)
+            analysis, target_id = seer.action_thinking_result(self.game_log)
             self.game_log[night_key]["seer_analysis"] = analysis
-            target_id = list(prediction.keys())[0]
-            self.game_log[night_key]["seer_predict"][target_id] = prediction[target_id]
+            if target_id != -1:
+                self.apply_action(seer.player_id, "seer", target_id)
             if self.verbose:
-                print(f"预言家{seer.player_id}分析: {analysis}, 预言: {prediction}")
+                print(f"预言家{seer.player_id}分析: {analysis}, 预言: {self.game_log[night_key]['seer_predict']}")
 
         # 处理守卫行动
         guards = [p for p in self.players if p.role == Role.GUARD and p.alive]
@@ -112,73 +284,182 @@ class GameManager:
             guard = guards[0]
             analysis, protect_target = guard.action_thinking_result(self.game_log)
             self.game_log[night_key]["guard_analysis"] = analysis
-            self.game_log[night_key]["guard_protect"] = protect_target
+            if protect_target != -1:
+                self.apply_action(guard.player_id, "guard", protect_target)
             if self.verbose:
                 print(f"守卫{guard.player_id}分析: {analysis}, 保护: {protect_target}")
 
-        # 处理夜间死亡结果
-        death_log = []
-        wolf_target = next(iter(self.game_log[night_key]["wolf_vote"]), -1)
-        guard_target = self.game_log[night_key]["guard_protect"]
-
-        if wolf_target != -1 and wolf_target != guard_target:
-            # 狼人目标没有被守护，死亡
-            if self.players[wolf_target].alive:
-                self.players[wolf_target].alive = False
-                death_log.append(wolf_target)
-                if self.verbose:
-                    print(f"玩家 {wolf_target} 在夜晚被狼人杀害。")
+        self.resolve_night()
 
-        self.game_log[night_key]["death_log"] = death_log
-        self._log_round_result()
+        if self.pipeline is not None and self.winner() is None:
+            self._prefetch_speech({**self.game_log, f"day-{self.current_round}": _day_section()})
 
+    @_llm_phase
     def handle_day_phase(self):
         """处理白天阶段的发言"""
         day_key = f"day-{self.current_round}"
-        self.game_log[day_key] = {
-            "heard_sayings": {},
-            "final_vote": {}
-        }
+        self.game_log[day_key] = _day_section()
+        if self.pipeline is not None:
+            self._prefetch_speech(self.game_log)
 
         # 随机顺序发言
         alive_players = [p for p in self.players if p.alive]
 
         for player in alive_players:
             speech = player.generate_speech(self.game_log)
-            self.game_log[day_key]["heard_sayings"][player.player_id] = speech
+            if speech:
+                self.apply_action(player.player_id, "speech", content=speech)
             if self.verbose:
                 print(f"玩家{player.role.name} {player.player_id} 发言: {speech}")
 
+        if self.pipeline is not None:
+            self._prefetch_votes(self.game_log)
+
+    @_llm_phase
     def handle_voting_phase(self):
         """处理投票阶段"""
-        day_key = f"day-{self.current_round}"
         votes = {}
+        decisions = []
+        if self.pipeline is not None:
+            # 没有经过白天阶段（例如从快照恢复）时在这里并行提交
+            self._prefetch_votes(self.game_log)
+
+        voters = [p for p in self.players if p.alive]
+        for index, player in enumerate(voters):
+            # 剩余票数（含当前玩家）供路由器判断投票是否已成定局
+            situation = {"votes_so_far": votes, "remaining_voters": len(voters) - index}
+            vote_thinking, vote_result = player.decide_vote(self.game_log, situation)
+            if self.verbose:
+                print(f"玩家 {player.player_id} 思考: {vote_thinking}, 投票给: {vote_result}")
+            if vote_result != -1:
+                votes.setdefault(vote_result, []).append(player.player_id)
+            decisions.append((player.player_id, vote_result))
 
-        for player in self.players:
-            if player.alive:
-                vote_thinking, vote_result = player.decide_vote(self.game_log)
-                if self.verbose:
-                    print(f"玩家 {player.player_id} 思考: {vote_thinking}, 投票给: {vote_result}")
-                _record_vote(votes, vote_result, player.player_id)
+        # 所有人决定之后再写入日志：投票是同时进行的，决策时看不到别人的票
+        for player_id, target_id in decisions:
+            self.apply_action(player_id, "vote", target_id)
+        self.resolve_voting()
 
-        candidates = _resolve_votes(votes)
-        exiled_player = -1
+        if self.pipeline is not None and self.winner() is None:
+            self._prefetch_night({**self.game_log, f"night-{self.current_round + 1}": _night_section()})
 
-        if candidates:
-            exiled_player = candidates
+    def alive_mask(self) -> int:
+        return mask_of(p.player_id for p in self.players if p.alive)
 
-        if exiled_player != -1:
-            if self.players[exiled_player].alive:
-                self.players[exiled_player].alive = False
-                self.game_log[day_key]["death_log"] = [exiled_player]
-                if self.verbose:
-                    print(f"玩家 {exiled_player} 被投票放逐。")
-        else:
-            self.game_log[day_key]["death_log"] = []
-            if self.verbose:
-                print("本轮投票无人被放逐。")
+    def night_log(self) -> Dict[str, Any]:
+        """当前轮次的夜晚记录，不存在时创建"""
+        night_key = f"night-{self.current_round}"
+        section = self.game_log.get(night_key)
+        if section is None:
+            section = self.game_log[night_key] = _night_section()
+        return section
 
+    def day_log(self) -> Dict[str, Any]:
+        """当前轮次的白天记录，不存在时创建"""
+        day_key = f"day-{self.current_round}"
+        section = self.game_log.get(day_key)
+        if section is None:
+            section = self.game_log[day_key] = _day_section()
+        return section
+
+    def apply_action(self, player_id: int, action_type: str, target_id: int = -1,
+                     content: Optional[str] = None) -> str:
+        """
+        校验并写入一次玩家操作，返回给玩家的提示；非法操作抛出 IllegalAction，且不留下任何记录。
+        HTTP 接口和 AI 对局循环都通过这里行动
+        """
+        player = self.players[player_id]
+        self.rules.check(self.current_phase, player_id, action_type, target_id, self.alive_mask(),
+                         player.last_guarded)
+
+        if action_type == "wolf":
+            night = self.night_log()
+            if any(player_id in voters for voters in night["wolf_ballots"].values()):
+                raise IllegalAction("今晚已经投过刀")
+            if content:
+                self._record_wolf_saying(player_id, content)
+            night["wolf_ballots"].setdefault(target_id, []).append(player_id)
+            self.events.append("wolf_vote", visibility=Role.WOLF.name, target_id=target_id, voters=[player_id])
+            return f"狼人选择了攻击目标: 玩家 {target_id}"
+
+        if action_type == "seer":
+            night = self.night_log()
+            if night["seer_predict"]:
+                raise IllegalAction("今晚已经查验过")
+            identity = "坏人" if self.rules.wolves & bit(target_id) else "好人"
+            night["seer_predict"][target_id] = identity
+            player.checked_players[target_id] = identity
+            self.events.append("seer_check", visibility=Role.SEER.name, target_id=target_id, result=identity)
+            return f"预言家查验结果: 玩家 {target_id} 是 {identity}"
+
+        if action_type == "guard":
+            night = self.night_log()
+            if night["guard_protect"] != -1:
+                raise IllegalAction("今晚已经守护过")
+            night["guard_protect"] = target_id
+            player.last_guarded = target_id
+            self.events.append("guard_protect", visibility=Role.GUARD.name, target_id=target_id)
+            return f"守卫成功保护玩家 {target_id}"
+
+        if action_type == "speech":
+            if not content:
+                raise IllegalAction("发言内容不能为空")
+            self.day_log()["heard_sayings"][player_id] = content
+            self.events.append("speech", player_id=player_id, content=content)
+            return "发言已记录"
+
+        final_vote = self.day_log().setdefault("final_vote", {})
+        if any(player_id in voters for voters in final_vote.values()):
+            raise IllegalAction("本轮已经投过票")
+        final_vote.setdefault(target_id, []).append(player_id)
+        self.events.append("vote", player_id=player_id, target_id=target_id)
+        return f"玩家 {player_id} 投票给了玩家 {target_id}"
+
+    def _record_wolf_saying(self, player_id: int, content: str):
+        self.night_log()["wolf_sayings"][player_id] = content
+        self.events.append("wolf_saying", visibility=Role.WOLF.name, player_id=player_id, content=content)
+
+    def _wolf_decision(self, player_id: int, target_id: int, saying: Optional[str]):
+        """写入 AI 狼人的决策；目标为 -1（不刀人）时只记录发言"""
+        if target_id != -1:
+            self.apply_action(player_id, "wolf", target_id, saying)
+        elif saying:
+            self._record_wolf_saying(player_id, saying)
+
+    def resolve_night(self) -> int:
+        """夜晚结算：写入死亡记录和本阶段结果，返回死亡的玩家（无人死亡时为 -1）"""
+        night = self.night_log()
+        ballots = night["wolf_ballots"]
+        target = tally(ballots, self.rng)
+        night["wolf_vote"] = {target: list(ballots[target])} if target != -1 else {}
+        if target != -1:
+            self.events.append("wolf_target", visibility=Role.WOLF.name, target_id=target)
+        victim, _ = self.rules.night_victim(self.alive_mask(), target, night["guard_protect"])
+        night["death_log"] = []
+        if victim != -1:
+            self.players[victim].alive = False
+            night["death_log"].append(victim)
+            self.events.append("death", player_id=victim, cause="night")
+            if self.verbose:
+                print(f"玩家 {victim} 在夜晚被狼人杀害。")
+        self._log_round_result()
+        return victim
+
+    def resolve_voting(self) -> int:
+        """投票结算：写入放逐记录和本阶段结果，返回被放逐的玩家（无人被放逐时为 -1）"""
+        day = self.day_log()
+        exiled, _ = self.rules.resolve_vote(self.alive_mask(), day.setdefault("final_vote", {}), self.rng)
+        day["death_log"] = []
+        if exiled != -1:
+            self.players[exiled].alive = False
+            day["death_log"].append(exiled)
+            self.events.append("death", player_id=exiled, cause="vote")
+            if self.verbose:
+                print(f"玩家 {exiled} 被投票放逐。")
+        elif self.verbose:
+            print("本轮投票无人被放逐。")
         self._log_round_result()
+        return exiled
 
     def _log_round_result(self):
         """记录当前游戏状态作为结果"""
@@ -187,55 +468,102 @@ class GameManager:
             "alive": {p.player_id: p.role.name for p in self.players if p.alive},
             "dead": {p.player_id: p.role.name for p in self.players if not p.alive}
         }
+        self.events.append("round_result", phase=self.current_phase, round=self.current_round,
+                           alive=[p.player_id for p in self.players if p.alive],
+                           dead=[p.player_id for p in self.players if not p.alive])
         if self.verbose:
             print(f"轮次结束后的存亡状态: 存活玩家: {self.game_log[result_key]['alive']}, 已故玩家: {self.game_log[result_key]['dead']}")
 
+    def pending_players(self) -> List[int]:
+        """当前阶段还未完成必需行动的存活玩家：夜晚为狼人/预言家/守卫，白天为发言，投票阶段为投票"""
+        pending = []
+        if self.current_phase == "NIGHT":
+            night = self.game_log.get(f"night-{self.current_round}", {})
+            wolf_voters = {v for voters in night.get("wolf_ballots", {}).values() for v in voters}
+            for p in self.players:
+                if not p.alive:
+                    continue
+                if p.role == Role.WOLF and p.player_id not in wolf_voters:
+                    pending.append(p.player_id)
+                elif p.role == Role.SEER and not night.get("seer_predict"):
+                    pending.append(p.player_id)
+                elif p.role == Role.GUARD and night.get("guard_protect", -1) == -1:
+                    pending.append(p.player_id)
+        elif self.current_phase == "DAY":
+            sayings = self.game_log.get(f"day-{self.current_round}", {}).get("heard_sayings", {})
+            pending = [p.player_id for p in self.players if p.alive and p.player_id not in sayings]
+        elif self.current_phase == "VOTING":
+            votes = self.game_log.get(f"day-{self.current_round}", {}).get("final_vote", {})
+            voted = {v for voters in votes.values() for v in voters}
+            pending = [p.player_id for p in self.players if p.alive and p.player_id not in voted]
+        return pending
+
+    def next_phase(self):
+        """进入下一阶段：夜晚 -> 白天 -> 投票 -> 下一轮夜晚"""
+        previous_phase = self.current_phase
+        if self.current_phase == "NIGHT":
+            self.current_phase = "DAY"
+        elif self.current_phase == "DAY":
+            self.current_phase = "VOTING"
+        elif self.current_phase == "VOTING":
+            self.current_phase = "NIGHT"
+            self.current_round += 1
+        self.events.append("phase", previous_phase=previous_phase,
+                           phase=self.current_phase, round=self.current_round)
+        self.snapshots.append(GameSnapshot(self))
+
+    def winner(self) -> Optional[str]:
+        """返回获胜阵营（"VILLAGER" 或 "WOLF"），游戏未结束时返回 None"""
+        return self.rules.winner(self.alive_mask())
+
     def check_game_end(self) -> bool:
         """检查游戏是否结束及胜负条件"""
-        werewolf_count = sum(1 for p in self.players if p.role == Role.WOLF and p.alive)
-        villager_count = sum(1 for p in self.players if p.role != Role.WOLF and p.alive)
-        god_count = sum(1 for p in self.players if p.role == Role.SEER and p.alive) + sum(1 for p in self.players if p.role == Role.GUARD and p.alive)
-
-        if werewolf_count == 0:
-            if self.verbose:
-                print("好人阵营胜利！")
-            return True
-
-        if villager_count == 0 or god_count == 0:
-            if self.verbose:
-                print("狼人阵营胜利！")
-            return True
-
-        return False
-
-    def run(self):
-        """运行游戏主循环"""
+        winner = self.winner()
+        if winner is None:
+            return False
+
+        if not self.finished:
+            self.finished = True
+            self.events.append("game_over", winner=winner,
+                               roles={p.player_id: p.role.name for p in self.players})
+        if self.verbose:
+            print("好人阵营胜利！" if winner == Role.VILLAGER.name else "狼人阵营胜利！")
+        return True
+
+    def run(self, phase_delay: float = 5.0, max_rounds: Optional[int] = None) -> Optional[str]:
+        """
+        运行游戏主循环，返回获胜阵营；phase_delay 为阶段之间的停顿秒数（批量模拟时设为 0），
+        达到 max_rounds 轮仍未分出胜负时按平局结束并返回 None
+        """
         # 初始化后记录结果
         self._log_round_result()
 
         while not self.check_game_end():
+            if max_rounds is not None and self.current_round >= max_rounds:
+                if self.verbose:
+                    print(f"\n达到最大轮数 {max_rounds}，按平局结束。")
+                break
             if self.verbose:
                 print(f"\n=== 第 {self.current_round + 1} 轮开始 ===")
                 print(f"当前阶段: {self.current_phase}")
 
             if self.current_phase == "NIGHT":
                 self.handle_night_phase()
-                self.current_phase = "DAY"
-                time.sleep(5)
             elif self.current_phase == "DAY":
                 self.handle_day_phase()
-                self.current_phase = "VOTING"
-                time.sleep(5)
             elif self.current_phase == "VOTING":
                 self.handle_voting_phase()
-                self.current_phase = "NIGHT"
-                self.current_round += 1
-                time.sleep(5)
+            self.next_phase()
+            if phase_delay > 0:
+                time.sleep(phase_delay)
 
             # 检查游戏是否结束
             if self.check_game_end():
                 break
 
+        if self.pipeline is not None:
+            self.pipeline.close()
+
         # 游戏结束，打印最终结果
         if self.verbose:
             print("\n=== 游戏结束 ===")
@@ -249,6 +577,8 @@ class GameManager:
                 if not player.alive:
                     print(f"玩家 {player.player_id} ({player.role.name})")
 
+        return self.winner()
+
 
 if __name__ == "__main__":
     game = GameManager(verbose=True)
@@ -0,0 +1,245 @@
+# llm_scheduler.py
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Any, List, Optional, Tuple
+
+from logic.model_config import model_rate_limits
+
+
+class Priority(IntEnum):
+    """数值越小越优先"""
+    AI_ONLY = 0       # 纯 AI 对局
+    SIMULATION = 1    # 批量模拟、锦标赛
+
+
+# 当前线程/协程发出的请求属于哪局游戏、什么优先级
+_request_context: contextvars.ContextVar[Tuple[str, Priority]] = contextvars.ContextVar(
+    "llm_request_context", default=("default", Priority.AI_ONLY)
+)
+
+
+@contextmanager
+def request_context(game_id: str, priority: Priority):
+    """在此上下文中发出的模型请求按该游戏和优先级排队"""
+    token = _request_context.set((game_id, priority))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充量，capacity 为最大突发量；余额允许为负（用于事后按实际用量补扣）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """还需等待多少秒才能取出 amount；超过容量的请求只要求桶满"""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self.level -= amount
+
+
+class _Ticket:
+    __slots__ = ("seq", "model", "game_id", "priority", "tokens", "enqueued_at", "granted_at")
+
+    def __init__(self, seq: int, model: str, game_id: str, priority: Priority, tokens: int):
+        self.seq = seq
+        self.model = model
+        self.game_id = game_id
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted_at = 0.0
+
+
+class LLMScheduler:
+    """
+    进程级模型请求调度器：
+    - 每个模型独立的 QPS 与每分钟 token 令牌桶，以及并发上限
+    - 严格优先级：同一模型上，高优先级请求总是先于低优先级请求放行
+    - 同一优先级内在游戏之间轮转（已放行次数最少的游戏优先），同一游戏内先来先服务
+    acquire / slot 在 threading.Condition 上阻塞等待，只能在工作线程中调用（对局线程、线程池、
+    asyncio.to_thread），在事件循环中调用会卡住整个服务，因此会直接抛出 RuntimeError。
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], wait_samples: int = 1000):
+        self._limits = limits
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: List[_Ticket] = []
+        self._served: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._qps: Dict[str, TokenBucket] = {}
+        self._tpm: Dict[str, TokenBucket] = {}
+        # 统计
+        self._wait_times: Dict[int, deque] = {p: deque(maxlen=wait_samples) for p in Priority}
+        self._granted: Dict[int, int] = {p: 0 for p in Priority}
+        self._tokens_used: Dict[str, int] = {}
+
+    def _buckets(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        if model not in self._qps:
+            limit = self._limits.get(model, self._limits.get("default", {}))
+            qps = limit.get("qps", 5)
+            tpm = limit.get("tpm", 100000)
+            self._qps[model] = TokenBucket(qps, limit.get("burst", qps))
+            self._tpm[model] = TokenBucket(tpm / 60.0, tpm)
+        return self._qps[model], self._tpm[model]
+
+    def _max_concurrency(self, model: str) -> int:
+        limit = self._limits.get(model, self._limits.get("default", {}))
+        return int(limit.get("max_concurrency", 16))
+
+    def _pick(self, now: float) -> Tuple[Optional[_Ticket], float]:
+        """选出下一个可以放行的请求；没有时返回最短需要等待的时间"""
+        ordered = sorted(self._waiting, key=lambda t: (t.priority, self._served.get(t.game_id, 0), t.seq))
+        blocked_models = set()
+        min_delay = 1.0
+        for ticket in ordered:
+            if ticket.model in blocked_models:
+                continue
+            qps, tpm = self._buckets(ticket.model)
+            if self._in_flight.get(ticket.model, 0) >= self._max_concurrency(ticket.model):
+                delay = 1.0  # 等待有请求完成时被唤醒
+            else:
+                delay = max(qps.delay_for(1, now), tpm.delay_for(ticket.tokens, now))
+            if delay == 0.0:
+                return ticket, 0.0
+            # 该模型被更高优先级的请求占住，后面的同模型请求不能插队
+            blocked_models.add(ticket.model)
+            min_delay = min(min_delay, delay)
+        return None, min_delay
+
+    def acquire(self, model: str, estimated_tokens: int) -> _Ticket:
+        """阻塞直到该请求被放行；不能在事件循环中调用"""
+        _ensure_not_in_event_loop()
+        game_id, priority = _request_context.get()
+        with self._cond:
+            ticket = _Ticket(next(self._seq), model, game_id, priority, estimated_tokens)
+            if game_id not in self._served:
+                # 新加入的游戏从当前最小放行次数开始，既不插队也不被饿死
+                active = [self._served[t.game_id] for t in self._waiting if t.game_id in self._served]
+                self._served[game_id] = min(active) if active else 0
+            self._waiting.append(ticket)
+            while True:
+                chosen, delay = self._pick(time.monotonic())
+                if chosen is ticket:
+                    break
+                if chosen is not None:
+                    # 轮到别人，唤醒它后等它放行完成再重新挑选
+                    self._cond.notify_all()
+                    self._cond.wait(timeout=1.0)
+                else:
+                    self._cond.wait(timeout=delay)
+
+            self._waiting.remove(ticket)
+            qps, tpm = self._buckets(model)
+            qps.consume(1)
+            tpm.consume(estimated_tokens)
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            self._served[game_id] += 1
+            ticket.granted_at = time.monotonic()
+            self._wait_times[priority].append(ticket.granted_at - ticket.enqueued_at)
+            self._granted[priority] += 1
+            self._cond.notify_all()
+        return ticket
+
+    def release(self, ticket: _Ticket, actual_tokens: Optional[int] = None):
+        """请求结束；提供实际 token 用量时按差额补扣或返还"""
+        with self._cond:
+            self._in_flight[ticket.model] -= 1
+            used = actual_tokens if actual_tokens is not None else ticket.tokens
+            if actual_tokens is not None:
+                self._tpm[ticket.model].consume(actual_tokens - ticket.tokens)
+            self._tokens_used[ticket.model] = self._tokens_used.get(ticket.model, 0) + used
+            if not any(t.game_id == ticket.game_id for t in self._waiting):
+                self._served.pop(ticket.game_id, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, model: str, estimated_tokens: int):
+        """with scheduler.slot(...) as usage: 在块内把实际用量写入 usage["tokens"]"""
+        ticket = self.acquire(model, estimated_tokens)
+        usage: Dict[str, Any] = {"tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, usage["tokens"])
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度、等待时间和用量统计"""
+        with self._cond:
+            now = time.monotonic()
+            by_priority = {}
+            for priority in Priority:
+                samples = sorted(self._wait_times[priority])
+                waiting = [t for t in self._waiting if t.priority == priority]
+                by_priority[priority.name] = {
+                    "queue_depth": len(waiting),
+                    "oldest_wait_s": max((now - t.enqueued_at for t in waiting), default=0.0),
+                    "granted": self._granted[priority],
+                    "wait_p50_s": _percentile(samples, 50),
+                    "wait_p95_s": _percentile(samples, 95),
+                    "wait_max_s": samples[-1] if samples else 0.0,
+                }
+            by_model = {}
+            for model in set(self._qps) | {t.model for t in self._waiting}:
+                by_model[model] = {
+                    "queue_depth": sum(1 for t in self._waiting if t.model == model),
+                    "in_flight": self._in_flight.get(model, 0),
+                    "tokens_used": self._tokens_used.get(model, 0),
+                    "tpm_available": round(self._tpm[model].level) if model in self._tpm else None,
+                }
+            return {
+                "queue_depth": len(self._waiting),
+                "waiting_games": len({t.game_id for t in self._waiting}),
+                "by_priority": by_priority,
+                "by_model": by_model,
+            }
+
+
+def _ensure_not_in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError("LLMScheduler.acquire 会阻塞当前线程，不能在事件循环中调用，请放到工作线程中执行")
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """进程内共享的调度器"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(model_rate_limits)
+    return _scheduler
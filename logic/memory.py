@@ -0,0 +1,253 @@
+# memory.py
+"""
+长对局的检索式记忆：最近几轮的记录原样放入提示，更早的发言、投票、查验等逐条建立 BM25 索引
+（中文按字二元组切分，纯 CPU、无外部依赖），每次决策只附带与当前问题最相关的 top-k 条旧记录。
+
+    python -m logic.memory --games 200 --top-k 8
+在离线后端上评估提示长度的缩减比例和关键信息召回率。
+"""
+import argparse
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from logic.game_utils import build_messages, format_memory, get_alive_player_ids
+
+# 原样保留的最近轮数
+RECENT_ROUNDS = 1
+
+# 每次附带的旧记录条数
+TOP_K = 8
+
+
+def section_round(key: str) -> Optional[int]:
+    """night-1 / day-1 / result-DAY-1 这类日志段所属的轮次，其他段返回 None"""
+    if key.startswith(("night-", "day-", "result-")):
+        try:
+            return int(key.split("-")[-1])
+        except ValueError:
+            return None
+    return None
+
+
+def memory_items(key: str, section: Dict[str, Any]) -> List[str]:
+    """把一个日志段拆成可独立检索的条目，措辞与 format_memory 保持一致"""
+    round_num = section_round(key)
+    items = []
+    if key.startswith("night-"):
+        prefix = f"第{round_num}夜"
+        for pid, text in section.get("wolf_sayings", {}).items():
+            items.append(f"{prefix} 狼人讨论 玩家{pid}: {text}")
+        for target, voters in section.get("wolf_vote", {}).items():
+            if target != -1:
+                items.append(f"{prefix} 狼人投票: 目标玩家{target} (投票者: {', '.join(f'玩家{v}' for v in voters)})")
+        for target, identity in section.get("seer_predict", {}).items():
+            items.append(f"{prefix} 预言家查验: 玩家{target}是{identity}")
+        if section.get("guard_protect", -1) != -1:
+            items.append(f"{prefix} 守卫守护: 玩家{section['guard_protect']}")
+        for pid in section.get("death_log", []):
+            items.append(f"{prefix} 死亡: 玩家{pid}")
+    elif key.startswith("day-"):
+        prefix = f"第{round_num}天"
+        for pid, text in section.get("heard_sayings", {}).items():
+            items.append(f"{prefix} 玩家{pid}发言: {text}")
+        for target, voters in section.get("final_vote", {}).items():
+            if target != -1:
+                items.append(f"{prefix} 投票: 玩家{target}得票 (投票者: {', '.join(f'玩家{v}' for v in voters)})")
+        for pid in section.get("death_log", []):
+            items.append(f"{prefix} 放逐: 玩家{pid}")
+    return items
+
+
+def tokenize(text: str) -> List[str]:
+    """字二元组切分，中文无需分词；"玩家3" 这类编号会落在 "家3" 上，便于按玩家检索"""
+    text = "".join(text.split())
+    return [text[i:i + 2] for i in range(len(text) - 1)] or ([text] if text else [])
+
+
+class BM25Index:
+    """增量构建的 BM25 索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[str] = []
+        self._term_freqs: List[Counter] = []
+        self._doc_freq: Counter = Counter()
+        self._total_length = 0
+
+    def add(self, text: str):
+        terms = Counter(tokenize(text))
+        self.docs.append(text)
+        self._term_freqs.append(terms)
+        self._doc_freq.update(terms.keys())
+        self._total_length += sum(terms.values())
+
+    def top(self, query: str, k: int) -> List[int]:
+        """得分最高的 k 条文档下标，按原始顺序返回"""
+        if not self.docs or k <= 0:
+            return []
+        n = len(self.docs)
+        avg_length = self._total_length / n
+        query_terms = set(tokenize(query))
+        idf = {t: math.log(1 + (n - self._doc_freq[t] + 0.5) / (self._doc_freq[t] + 0.5))
+               for t in query_terms if t in self._doc_freq}
+        scores = []
+        for index, terms in enumerate(self._term_freqs):
+            length = sum(terms.values())
+            score = 0.0
+            for term, weight in idf.items():
+                tf = terms.get(term, 0)
+                if tf:
+                    score += weight * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+            if score > 0:
+                scores.append((score, index))
+        best = sorted(scores, reverse=True)[:k]
+        return sorted(index for _, index in best)
+
+
+class RetrievalMemory:
+    """
+    单个玩家的检索记忆。轮次结束后的日志段不再变化，因此每段只在移出"最近"窗口时索引一次。
+    """
+
+    def __init__(self, recent_rounds: int = RECENT_ROUNDS, top_k: int = TOP_K):
+        self.recent_rounds = recent_rounds
+        self.top_k = top_k
+        self.index = BM25Index()
+        self._indexed_keys = set()
+
+    def render(self, memory: Dict[str, Any], current_round: int, query: str) -> str:
+        """生成提示中的历史记录：检索出的旧记录 + 最近几轮的完整记录"""
+        oldest_recent = current_round - self.recent_rounds + 1
+        recent = {}
+        for key, section in memory.items():
+            round_num = section_round(key)
+            if round_num is None or round_num >= oldest_recent:
+                recent[key] = section
+            elif key not in self._indexed_keys:
+                self._indexed_keys.add(key)
+                for item in memory_items(key, section):
+                    self.index.add(item)
+
+        parts = []
+        retrieved = [self.index.docs[i] for i in self.index.top(query, self.top_k)]
+        if retrieved:
+            parts.append("更早的相关记录（按相关度摘选）:\n" + "\n".join(retrieved))
+        parts.append(format_memory(recent))
+        return "\n".join(part for part in parts if part)
+
+
+def memory_query(content: Dict[str, Any], alive_ids: List[int]) -> str:
+    """检索查询：当前问题、自己和候选目标（没有候选时用所有存活玩家）"""
+    targets = [t for t in content.get("legal_targets", []) if t != -1] or alive_ids
+    return " ".join([
+        content.get("question_guide", ""),
+        f"玩家{content.get('player_id', -1)}",
+        *(f"玩家{t}" for t in targets),
+    ])
+
+
+def evaluate(games: int = 100, seed: int = 0, recent_rounds: int = RECENT_ROUNDS, top_k: int = TOP_K,
+             max_rounds: int = 30) -> Dict[str, Any]:
+    """
+    离线评估：对每局每个投票阶段、每名存活玩家构造投票提示，比较完整历史与检索记忆。
+    关键信息 = 更早轮次中提到任一候选目标的条目（发言、投票、查验、死亡），召回率为其出现在
+    检索记忆提示中的比例。离线后端的决策是随机的，因此这里用召回率衡量对决策质量的影响。
+    """
+    from logic.gamemanager import GameManager, OFFLINE_BACKEND
+
+    full_chars = retrieval_chars = 0
+    key_facts = recalled = decisions = 0
+    by_round: Dict[int, List[int]] = {}
+    for game_index in range(games):
+        game = GameManager(verbose=False, seed=seed + game_index, seat_backends=[OFFLINE_BACKEND] * 6)
+        game.run(phase_delay=0, max_rounds=max_rounds)
+        for snapshot in game.snapshots:
+            if snapshot.phase != "VOTING":
+                continue
+            alive_ids = get_alive_player_ids(snapshot.log)
+            for player in game.players:
+                if player.player_id not in alive_ids:
+                    continue
+                filtered = player.filter_receive_info(snapshot.log)
+                content = {
+                    "type": "decision",
+                    "memory": filtered,
+                    "role": player.role.name,
+                    "player_id": player.player_id,
+                    "question_guide": "你要投票放逐谁？请仔细分析发言和游戏历史。",
+                    "legal_targets": [-1] + [pid for pid in alive_ids if pid != player.player_id],
+                }
+                full_prompt = _prompt_length(content)
+                memory = RetrievalMemory(recent_rounds, top_k)
+                memory_text = memory.render(filtered, snapshot.round, memory_query(content, alive_ids))
+                retrieval_prompt = _prompt_length(dict(content, memory_text=memory_text))
+
+                decisions += 1
+                full_chars += full_prompt
+                retrieval_chars += retrieval_prompt
+                totals = by_round.setdefault(snapshot.round, [0, 0, 0])
+                totals[0] += full_prompt
+                totals[1] += retrieval_prompt
+                totals[2] += 1
+
+                candidates = [f"玩家{t}" for t in content["legal_targets"] if t != -1]
+                for key, section in filtered.items():
+                    round_num = section_round(key)
+                    if round_num is None or round_num > snapshot.round - recent_rounds:
+                        continue
+                    for item in memory_items(key, section):
+                        if any(_mentions(item, name) for name in candidates):
+                            key_facts += 1
+                            recalled += item in memory_text
+
+    return {
+        "games": games,
+        "decisions": decisions,
+        "avg_prompt_chars_full": round(full_chars / decisions, 1) if decisions else 0,
+        "avg_prompt_chars_retrieval": round(retrieval_chars / decisions, 1) if decisions else 0,
+        "prompt_reduction": round(1 - retrieval_chars / full_chars, 4) if full_chars else 0,
+        "key_fact_recall": round(recalled / key_facts, 4) if key_facts else None,
+        "by_round": {r: {"decisions": n, "avg_full": round(f / n, 1), "avg_retrieval": round(m / n, 1),
+                         "reduction": round(1 - m / f, 4) if f else 0}
+                     for r, (f, m, n) in sorted(by_round.items())},
+    }
+
+
+def _prompt_length(content: Dict[str, Any]) -> int:
+    messages, _ = build_messages(content)
+    return sum(len(m["content"]) for m in messages)
+
+
+def _mentions(text: str, name: str) -> bool:
+    """"玩家1" 不应匹配 "玩家10" """
+    start = text.find(name)
+    while start != -1:
+        end = start + len(name)
+        if end == len(text) or not text[end].isdigit():
+            return True
+        start = text.find(name, end)
+    return False
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="评估检索记忆的提示缩减与关键信息召回")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recent-rounds", type=int, default=RECENT_ROUNDS)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    args = parser.parse_args(argv)
+
+    result = evaluate(args.games, args.seed, args.recent_rounds, args.top_k)
+    print(f"对局 {result['games']}，投票决策 {result['decisions']} 次")
+    print(f"平均提示长度: 完整历史 {result['avg_prompt_chars_full']} 字符, "
+          f"检索记忆 {result['avg_prompt_chars_retrieval']} 字符, 缩减 {result['prompt_reduction']:.1%}")
+    print(f"关键信息召回率: {result['key_fact_recall']}")
+    for round_num, entry in result["by_round"].items():
+        print(f"  第{round_num}轮: {entry['decisions']} 次, {entry['avg_full']} -> {entry['avg_retrieval']} 字符, "
+              f"缩减 {entry['reduction']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
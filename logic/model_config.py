@@ -11,6 +11,24 @@ model_config = {
         "top_p": 0.8,
         "result_format": "message"
     },
+    "qwen-plus": {
+        "model": "qwen-plus",
+        "temperature": 0.7,
+        "top_p": 0.8,
+        "result_format": "message"
+    },
 
 }
 
+# 支持 response_format={"type": "json_object"} 约束输出的模型
+JSON_MODE_MODELS = {"qwen-plus"}
+
+
+# 各模型的限流配置，供全局调度器使用：qps 为每秒请求数，tpm 为每分钟 token 数，
+# burst 为允许的瞬时突发请求数，max_concurrency 为同时进行中的请求上限
+model_rate_limits = {
+    "deepseek-r1": {"qps": 2, "burst": 4, "tpm": 120000, "max_concurrency": 8},
+    "deepseek-v3": {"qps": 5, "burst": 10, "tpm": 300000, "max_concurrency": 16},
+    "qwen-plus": {"qps": 10, "burst": 20, "tpm": 600000, "max_concurrency": 32},
+    "default": {"qps": 2, "burst": 4, "tpm": 100000, "max_concurrency": 8},
+}
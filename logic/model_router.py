@@ -0,0 +1,108 @@
+# model_router.py
+import contextvars
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional
+
+from logic.game_utils import call_dashscope
+from logic.model_config import model_config
+
+# 不调用模型、直接由规则给出结果
+RULE_BASED = "rule"
+
+# 夜间行动类操作：单个狼人/神职的行动，以及狼人团队的统一计划
+NIGHT_ACTION_TYPES = {"thinking and target", "faction plan"}
+
+# 推测执行共用的线程池
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative")
+
+
+def vote_is_decided(votes_so_far: Dict[int, List[int]], remaining_voters: int) -> bool:
+    """剩余的票（含当前玩家）已无法改变放逐结果"""
+    counts = sorted((len(voters) for target, voters in votes_so_far.items() if target != -1), reverse=True)
+    if not counts:
+        return False
+    runner_up = counts[1] if len(counts) > 1 else 0
+    return counts[0] - runner_up > remaining_voters
+
+
+class ModelRouter:
+    """
+    按操作类型和局面为每次决策选择模型：
+    - 只有一个合法目标：规则直接决定，不调用模型
+    - 首夜（没有任何历史信息）或已成定局的投票：快速模型
+    - 其余有争议的决策和发言：推理模型
+    speculative=True 时有争议的决策会同时启动快慢两个模型，慢模型在 speculative_budget
+    秒内返回则采用慢模型，否则采用快模型，并取消另一个请求。
+    """
+
+    def __init__(self, fast_model: str = "deepseek-v3", slow_model: str = "deepseek-r1",
+                 speculative: bool = False, speculative_budget: float = 8.0):
+        for name in (fast_model, slow_model):
+            if name not in model_config:
+                raise ValueError(f"未知模型: {name}")
+        self.fast_model = fast_model
+        self.slow_model = slow_model
+        self.speculative = speculative
+        self.speculative_budget = speculative_budget
+
+    def route(self, content: Dict[str, Any], situation: Dict[str, Any]) -> str:
+        """返回模型名称或 RULE_BASED"""
+        operation_type = content.get("type", "")
+        if operation_type == "speech":
+            return self.slow_model
+
+        candidates = [t for t in content.get("legal_targets", []) if t != -1]
+        if len(candidates) <= 1 and operation_type in NIGHT_ACTION_TYPES:
+            return RULE_BASED
+        if not candidates:
+            return RULE_BASED
+
+        if operation_type == "decision" and vote_is_decided(
+                situation.get("votes_so_far", {}), situation.get("remaining_voters", 0)):
+            return self.fast_model
+        if operation_type in NIGHT_ACTION_TYPES and situation.get("round", 0) == 0:
+            return self.fast_model
+        return self.slow_model
+
+    def call(self, content: Dict[str, Any], situation: Optional[Dict[str, Any]] = None,
+             rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """按路由结果执行一次决策，返回格式与 call_dashscope 相同；rng 供离线模拟使用"""
+        choice = self.route(content, situation or {})
+        if choice == RULE_BASED:
+            return _rule_based_response(content)
+        if choice == self.slow_model and self.speculative and content.get("type") != "speech":
+            return self._call_speculative(content, rng)
+        return call_dashscope(content, model=choice, rng=rng)
+
+    def _call_speculative(self, content: Dict[str, Any], rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """同时启动快慢模型，用不到的那个请求会被取消"""
+        fast_cancel, slow_cancel = threading.Event(), threading.Event()
+        # 两路请求并行执行，各用一个提交前派生的随机数，离线模拟的结果不取决于线程调度
+        rng = rng or random
+        slow_rng, fast_rng = random.Random(rng.getrandbits(32)), random.Random(rng.getrandbits(32))
+        # 复制当前上下文，让两路请求仍按本局游戏和优先级排队
+        slow = _executor.submit(contextvars.copy_context().run, call_dashscope, content, self.slow_model,
+                                cancel_event=slow_cancel, rng=slow_rng)
+        fast = _executor.submit(contextvars.copy_context().run, call_dashscope, content, self.fast_model,
+                                cancel_event=fast_cancel, rng=fast_rng)
+
+        wait([slow], timeout=self.speculative_budget)
+        if not slow.done():
+            # 慢模型超出预算，谁先给出有效结果就用谁
+            wait([fast, slow], return_when=FIRST_COMPLETED)
+        for winner, loser_cancel in ((slow, fast_cancel), (fast, slow_cancel)):
+            if winner.done() and winner.result().get("valid", True):
+                loser_cancel.set()
+                return winner.result()
+
+        wait([fast, slow])
+        return slow.result() if slow.result().get("valid", True) else fast.result()
+
+
+def _rule_based_response(content: Dict[str, Any]) -> Dict[str, Any]:
+    """只有唯一（或没有）合法目标时直接给出结果"""
+    candidates = [t for t in content.get("legal_targets", []) if t != -1]
+    target = candidates[0] if len(candidates) == 1 else -1
+    return {"response": {"thinking": f"[规则] 唯一可选目标: 玩家{target}", "target": target}}
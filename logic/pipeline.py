@@ -0,0 +1,108 @@
+# pipeline.py
+"""
+决策的推测执行流水线。
+
+一名玩家的决策输入（content）在轮到他之前往往就已经确定：投票结束时下一晚预言家、守卫和第一名狼人
+能看到的内容就不会再变，夜晚结束时白天第一位发言者的输入也已确定，白天发言结束后所有人的投票输入都相同。
+GameManager 在这些时刻调用 prefetch，把决策（包括提示构建与检索记忆渲染）提交到线程池提前执行；
+真正轮到该玩家时 resolve 比较输入指纹，一致则直接使用提前算好的结果，否则丢弃旧结果重新决策。
+
+因为只复用输入完全相同的结果，开启流水线不会改变任何一名玩家看到的信息；
+代价是少量用不到的模型调用（例如推测了下一晚但游戏在投票后已结束）。
+"""
+import contextvars
+import copy
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+# 所有对局共用的推测线程池，每局同一时刻最多有每个座位一个推测任务
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="pipeline")
+
+
+def fingerprint(content: Dict[str, Any]) -> str:
+    """决策输入的指纹：玩家视角的记忆、合法目标、历史推理等任一变化都会使指纹不同"""
+    return hashlib.blake2b(repr(content).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DecisionPipeline:
+    """
+    每局一个。prefetch 与 resolve 都在驱动对局的线程中调用；
+    同一玩家的决策（推测的和同步的）串行执行，因为策略会更新该玩家自己的检索记忆。
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, str], Tuple[str, Future]] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _lock(self, player_id: int) -> threading.Lock:
+        lock = self._locks.get(player_id)
+        if lock is None:
+            lock = self._locks[player_id] = threading.Lock()
+        return lock
+
+    @staticmethod
+    def _decide(lock: threading.Lock, player, content: Dict[str, Any], game_log: Dict[str, Any],
+                situation: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        with lock:
+            return player.strategy.decide(player, content, game_log, situation)
+
+    def prefetch(self, player, content: Dict[str, Any], game_log: Dict[str, Any]):
+        """
+        提前执行一次决策。game_log 为假定的日志（可以带有尚未开始的阶段的空记录），
+        只用于推断轮次等；决策输入以 content 为准。同一输入重复提交时不会重复执行。
+        """
+        key = (player.player_id, content["type"])
+        digest = fingerprint(content)
+        entry = self._pending.get(key)
+        if entry is not None:
+            if entry[0] == digest:
+                return
+            self._discard(entry[1])
+
+        # 策略可能改写 content（例如写入渲染后的记忆），推测任务使用独立的副本；
+        # 复制日志目录，避免对局线程追加新的阶段时与推测任务同时遍历
+        snapshot = copy.deepcopy(content)
+        log_view = dict(game_log)
+        # 复制上下文，推测请求与同步请求一样按本局和优先级排队
+        future = _executor.submit(contextvars.copy_context().run, self._decide,
+                                  self._lock(player.player_id), player, snapshot, log_view, None)
+        self._pending[key] = (digest, future)
+        self.prefetched += 1
+
+    def resolve(self, player, content: Dict[str, Any], game_log: Dict[str, Any],
+                situation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """返回决策结果：输入与推测时一致则等待并复用推测结果，否则同步决策"""
+        entry = self._pending.pop((player.player_id, content["type"]), None)
+        if entry is not None:
+            digest, future = entry
+            if digest == fingerprint(content):
+                self.hits += 1
+                return future.result()
+            self.misses += 1
+            self._discard(future)
+        return self._decide(self._lock(player.player_id), player, content, game_log, situation)
+
+    def _discard(self, future: Future):
+        """取消尚未开始的推测；已在执行的让它跑完，结果丢弃"""
+        future.cancel()
+        self.discarded += 1
+
+    def close(self):
+        """对局结束时丢弃所有未用到的推测"""
+        for _, future in self._pending.values():
+            self._discard(future)
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+        }
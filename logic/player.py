@@ -1,26 +1,38 @@
 # player.py
-from typing import Dict, Any, Union, Tuple
+import random
+from typing import Dict, Any, Union, Tuple, List, Optional
 
-from logic.game_utils import Role, call_dashscope
-
-
-def get_player_role_from_log(player_id: int, player_roles: Dict[int, Dict[str, Any]]) -> str:
-    """获取指定玩家的角色"""
-    if player_id in player_roles:
-        return player_roles[player_id]["role"].name
-    raise ValueError(f"Player {player_id} not found in log")
+from logic.game_utils import Role, get_alive_player_ids, get_current_round
+from logic.memory import RetrievalMemory
+from logic.model_router import ModelRouter
+from logic.rules import NIGHT, Rules, mask_of
+from logic.strategies import LLMStrategy, Strategy
 
 
 class Player:
-    def __init__(self, player_id: int, role: Role):
+    def __init__(self, player_id: int, role: Role, router: Optional[ModelRouter] = None,
+                 model: str = "deepseek-r1", offline: Optional[bool] = None, retrieval_memory: bool = False,
+                 strategy: Optional[Strategy] = None, rng: Optional[random.Random] = None):
         self.player_id = player_id
         self.role = role
         self.alive = True
         self.checked_players = {}  # 预言家查过的玩家 {"A": "好人"}
         self.last_guarded = -1  # 守卫上一轮守护的玩家
 
-        self.model = "deepseek-r1"
+        self.model = model
+        self.router = router  # 为 None 时所有决策都使用 self.model
+        self.offline = offline  # 为 None 时由 LLM_BACKEND 决定，True 时该座位始终使用离线模拟
         self.reasoning_contents = {}
+        # 开启后提示中只包含最近几轮的完整记录和检索出的相关旧记录
+        self.memory = RetrievalMemory() if retrieval_memory else None
+        # 决策策略：默认调用模型，也可以换成不调用模型的规则策略
+        self.strategy = strategy if strategy is not None else LLMStrategy()
+        # 离线模拟决策使用的随机数（由 GameManager 按对局种子生成），未提供时使用全局随机数
+        self.rng = rng if rng is not None else random
+        # 推测执行流水线（由 GameManager 设置），输入未变的决策直接使用提前算好的结果
+        self.pipeline = None
+        # 本局的规则引擎（由 GameManager 设置），未设置时从日志中的角色分配构造
+        self.rules: Optional[Rules] = None
 
 
     def filter_receive_info(self, game_log: Dict[str, Any]) -> Dict[str, Any]:
@@ -65,43 +77,64 @@ class Player:
 
         return filtered_info
 
-    def generate_speech(self, game_log: Dict[str, Any]) -> str:
-        """
-        生成发言内容
-        """
-        filtered_info = self.filter_receive_info(game_log)
-
-        content = {
+    def legal_targets(self, game_log: Dict[str, Any], operation_type: str) -> List[int]:
+        """当前操作的候选目标（规则引擎允许的目标中有意义的部分），投票可以弃权(-1)"""
+        rules = self.rules if self.rules is not None else Rules.from_log(game_log)
+        alive = mask_of(get_alive_player_ids(game_log))
+        if operation_type == "decision":
+            return [-1, *rules.candidates("vote", self.player_id, alive)]
+        action = rules.action_for(NIGHT, self.player_id)
+        if action is None:
+            return []
+        return list(rules.candidates(action, self.player_id, alive, self.last_guarded,
+                                     mask_of(self.checked_players)))
+
+    def _call_model(self, content: Dict[str, Any], game_log: Dict[str, Any],
+                    situation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """由策略做出决策，返回格式与 call_dashscope 相同"""
+        if self.pipeline is not None:
+            return self.pipeline.resolve(self, content, game_log, situation)
+        return self.strategy.decide(self, content, game_log, situation)
+
+    def speech_content(self, game_log: Dict[str, Any]) -> Dict[str, Any]:
+        """发言的决策输入"""
+        return {
             "type": "speech",
-            "memory": filtered_info,
+            "memory": self.filter_receive_info(game_log),
             "role": self.role.name,
             "player_id": self.player_id,
             "checked_players": self.checked_players
         }
 
-        return call_dashscope(content, model=self.model)["response"]["thinking"]
-
-    def decide_vote(self, game_log: Dict[str, Any]) -> tuple[str, int]:
+    def generate_speech(self, game_log: Dict[str, Any]) -> str:
         """
-        决定投票给谁
+        生成发言内容
         """
-        filtered_info = self.filter_receive_info(game_log)
+        content = self.speech_content(game_log)
+        return self._call_model(content, game_log)["response"]["thinking"]
 
-        content = {
+    def vote_content(self, game_log: Dict[str, Any]) -> Dict[str, Any]:
+        """投票的决策输入"""
+        return {
             "type": "decision",
-            "memory": filtered_info,
+            "memory": self.filter_receive_info(game_log),
             "role": self.role.name,
             "player_id": self.player_id,
-            "question_guide": "你要投票放逐谁？请仔细分析发言和游戏历史。"
+            "question_guide": "你要投票放逐谁？请仔细分析发言和游戏历史。",
+            "legal_targets": self.legal_targets(game_log, "decision")
         }
-        res = call_dashscope(content, model=self.model)["response"]
-
-        return res["thinking"], res["target"]
 
-    def action_thinking_result(self, game_log: Dict[str, Any]) -> tuple[Any, dict[Any, str]] | tuple[Any, Any]:
+    def decide_vote(self, game_log: Dict[str, Any], situation: Optional[Dict[str, Any]] = None) -> tuple[str, int]:
         """
-        进行行动思考，返回思考结果和目标
+        决定投票给谁，situation 可提供 votes_so_far / remaining_voters 供路由判断局面
         """
+        content = self.vote_content(game_log)
+        res = self._call_model(content, game_log, situation)["response"]
+
+        return res["thinking"], res["target"]
+
+    def action_content(self, game_log: Dict[str, Any]) -> Dict[str, Any]:
+        """夜间行动的决策输入"""
         question = ""
         role_map = {
             Role.WOLF.name: "狼人",
@@ -118,7 +151,7 @@ class Player:
         elif self.role == Role.WOLF:
             question = f"作为{role_map[self.role.name]}，你今晚要刀杀谁？请与其他狼人讨论后决定。"
 
-        content = {
+        return {
             "type": "thinking and target",
             "memory": self.filter_receive_info(game_log),
             "role": self.role.name,
@@ -126,11 +159,18 @@ class Player:
             "last_guarded": self.last_guarded,
             "checked_players": self.checked_players,
             "question_guide": question,
-            "reasoning_contents": self.reasoning_contents
+            "reasoning_contents": self.reasoning_contents,
+            "legal_targets": self.legal_targets(game_log, "thinking and target")
         }
 
-        res = call_dashscope(content, model=self.model)["response"]
-        reasoning_content = res.get("reasoning_content", None)
+    def action_thinking_result(self, game_log: Dict[str, Any]) -> tuple[str, int]:
+        """
+        进行行动思考，返回思考结果和目标（-1 表示不行动）；查验结果、守护记录由规则引擎写入
+        """
+        content = self.action_content(game_log)
+        result = self._call_model(content, game_log)
+        res = result["response"]
+        reasoning_content = result.get("reasoning_content", None)
 
         if reasoning_content:
             _k = ""
@@ -139,16 +179,42 @@ class Player:
                     _k = key
 
             self.reasoning_contents[_k] = reasoning_content
-        target = res['target']
-
-        if self.role == Role.SEER:
-            # 预言家获得目标的真实身份
-            target_role = get_player_role_from_log(target, game_log["player_roles"])
-            role_set = "好人" if target_role in ["VILLAGER", "GUARD", "SEER"] else "坏人"
-            self.checked_players[target] = role_set
-            return res['thinking'], {target: role_set}
-
-        elif self.role == Role.GUARD:
-            self.last_guarded = target
 
-        return res['thinking'], target
+        return res['thinking'], res['target']
+
+
+def faction_content(wolves: List[Player], game_log: Dict[str, Any]) -> Dict[str, Any]:
+    """狼人之间可见的历史相同，因此只需以第一名狼人的视角构造一次提示"""
+    leader = wolves[0]
+    return {
+        "type": "faction plan",
+        "memory": leader.filter_receive_info(game_log),
+        "role": leader.role.name,
+        "player_id": leader.player_id,
+        "wolf_ids": [wolf.player_id for wolf in wolves],
+        "question_guide": "作为狼人团队，你们今晚要刀杀谁？",
+        "reasoning_contents": leader.reasoning_contents,
+        "legal_targets": leader.legal_targets(game_log, "thinking and target")
+    }
+
+
+def plan_wolf_faction(wolves: List[Player], game_log: Dict[str, Any]) -> Tuple[Dict[int, str], int]:
+    """
+    狼人团队批量决策：一次请求同时给出每名狼人的夜间发言和一致的刀杀目标。
+    """
+    leader = wolves[0]
+    wolf_ids = [wolf.player_id for wolf in wolves]
+    content = faction_content(wolves, game_log)
+
+    result = leader._call_model(content, game_log)
+    res = result["response"]
+    target = res["target"]
+    statements = res.get("statements") or {wid: res["thinking"] for wid in wolf_ids}
+
+    reasoning_content = result.get("reasoning_content", None)
+    if reasoning_content:
+        night_key = f"night-{get_current_round(game_log)}"
+        for wolf in wolves:
+            wolf.reasoning_contents[night_key] = reasoning_content
+
+    return statements, target
@@ -0,0 +1,165 @@
+# rules.py
+"""
+规则引擎：HTTP 接口、AI 对局循环和批量模拟共用同一套合法性校验与结算。
+
+开局后角色分配不再变化，因此每局把阵营编译成位掩码（第 i 位代表玩家 i），存活状态同样是一个整数：
+- (阶段, 角色) -> 允许的操作 查表得到；合法目标由几次位运算得出，校验某个目标只需检查一位
+- 规则允许的目标（target_mask，与原 HTTP 接口的校验一致）和 AI 决策的候选目标（candidate_mask）分开：
+  例如规则允许狼人刀队友、玩家投票给自己，但不会把这些选项提供给 AI
+- 夜晚结算、投票结算和胜负判定是纯函数：输入存活掩码和投票记录，返回新的掩码，不修改任何对象，
+  由 GameManager 把结果写回玩家、日志和事件
+"""
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from logic.game_utils import Role
+
+PLAYER_COUNT = 6
+
+NIGHT, DAY, VOTING = "NIGHT", "DAY", "VOTING"
+
+# (阶段, 角色) -> 该角色在该阶段唯一允许的操作
+ACTIONS: Dict[Tuple[str, Role], str] = {
+    (NIGHT, Role.WOLF): "wolf",
+    (NIGHT, Role.SEER): "seer",
+    (NIGHT, Role.GUARD): "guard",
+    **{(DAY, role): "speech" for role in Role},
+    **{(VOTING, role): "vote" for role in Role},
+}
+
+# 可以以 -1 表示弃权的操作；夜间角色不行动时不提交操作即可
+ABSTAINABLE = frozenset({"vote"})
+
+# 全体玩家（含已死亡）
+ALL = (1 << PLAYER_COUNT) - 1
+
+# 掩码 -> 其中的玩家 ID（升序），所有存活状态预先展开
+_MEMBERS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(pid for pid in range(PLAYER_COUNT) if mask >> pid & 1) for mask in range(1 << PLAYER_COUNT)
+)
+
+
+class IllegalAction(ValueError):
+    """操作不符合规则，消息可以直接展示给玩家"""
+
+
+def bit(player_id: int) -> int:
+    return 1 << player_id if player_id >= 0 else 0
+
+
+def mask_of(player_ids: Iterable[int]) -> int:
+    mask = 0
+    for pid in player_ids:
+        mask |= bit(pid)
+    return mask
+
+
+def members(mask: int) -> Tuple[int, ...]:
+    return _MEMBERS[mask]
+
+
+def tally(votes: Dict[int, List[int]], rng: random.Random = random) -> int:
+    """得票最多的目标，平票时随机选一个；弃权(-1)不计票，没有有效票时返回 -1"""
+    vote_counts = {}
+    for target, voters in votes.items():
+        if target >= 0:
+            vote_counts[target] = vote_counts.get(target, 0) + len(voters)
+
+    if not vote_counts:
+        return -1
+
+    max_votes = max(vote_counts.values())
+    candidates = [pid for pid, count in vote_counts.items() if count == max_votes]
+    return rng.choice(candidates)
+
+
+class Rules:
+    """一局的编译后规则，创建后不可变，可在多个线程间共享"""
+    __slots__ = ("roles", "wolves", "gods")
+
+    def __init__(self, roles: Sequence[Role]):
+        if len(roles) != PLAYER_COUNT:
+            raise ValueError(f"需要 {PLAYER_COUNT} 名玩家的角色")
+        self.roles = tuple(roles)
+        self.wolves = mask_of(pid for pid, role in enumerate(roles) if role == Role.WOLF)
+        self.gods = mask_of(pid for pid, role in enumerate(roles) if role in (Role.SEER, Role.GUARD))
+
+    @classmethod
+    def from_log(cls, game_log: Dict) -> "Rules":
+        player_roles = game_log["player_roles"]
+        return cls([player_roles[pid]["role"] for pid in range(PLAYER_COUNT)])
+
+    def action_for(self, phase: str, player_id: int) -> Optional[str]:
+        return ACTIONS.get((phase, self.roles[player_id]))
+
+    def target_mask(self, action: str, alive: int, last_guarded: int = -1) -> int:
+        """规则允许的目标集合（不含弃权）：夜间操作可以选择任意玩家，守卫不能连续两晚守护同一人，只能投票给存活玩家"""
+        if action in ("wolf", "seer"):
+            return ALL
+        if action == "guard":
+            return ALL & ~bit(last_guarded)
+        if action == "vote":
+            return alive
+        return 0
+
+    def candidate_mask(self, action: str, player_id: int, alive: int, last_guarded: int = -1,
+                       checked: int = 0) -> int:
+        """
+        AI 决策时提供的候选目标：在规则允许的目标中去掉明显无意义的选择
+        （已死亡的玩家、狼人队友、自己、已经查验过的玩家）
+        """
+        mask = self.target_mask(action, alive, last_guarded) & alive
+        if action == "wolf":
+            return mask & ~self.wolves
+        if action == "seer":
+            return mask & ~bit(player_id) & ~checked
+        if action == "vote":
+            return mask & ~bit(player_id)
+        return mask
+
+    def candidates(self, action: str, player_id: int, alive: int, last_guarded: int = -1,
+                   checked: int = 0) -> Tuple[int, ...]:
+        return members(self.candidate_mask(action, player_id, alive, last_guarded, checked))
+
+    def check(self, phase: str, player_id: int, action: str, target_id: int, alive: int, last_guarded: int = -1):
+        """校验一次操作，非法时抛出 IllegalAction"""
+        if not alive & bit(player_id):
+            raise IllegalAction("玩家已死亡，无法执行操作")
+        if self.action_for(phase, player_id) != action:
+            raise IllegalAction("当前阶段或角色不允许此操作")
+        if action == "speech" or (target_id == -1 and action in ABSTAINABLE):
+            return
+        if not 0 <= target_id < PLAYER_COUNT:
+            raise IllegalAction("目标玩家不存在")
+        if self.target_mask(action, alive, last_guarded) & bit(target_id):
+            return
+        if action == "guard":
+            raise IllegalAction("不能连续两晚守护同一玩家")
+        raise IllegalAction("不能投票给已死亡的玩家")
+
+    def resolve_night(self, alive: int, wolf_votes: Dict[int, List[int]], guard_target: int,
+                      rng: random.Random = random) -> Tuple[int, int]:
+        """夜晚结算，返回 (死亡玩家或 -1, 新的存活掩码)：狼人得票最多的目标死亡，除非被守卫守护"""
+        return self.night_victim(alive, tally(wolf_votes, rng), guard_target)
+
+    def night_victim(self, alive: int, target: int, guard_target: int) -> Tuple[int, int]:
+        """按已统计出的狼人目标结算夜晚，返回 (死亡玩家或 -1, 新的存活掩码)"""
+        if target == -1 or target == guard_target or not alive & bit(target):
+            return -1, alive
+        return target, alive & ~bit(target)
+
+    def resolve_vote(self, alive: int, votes: Dict[int, List[int]],
+                     rng: random.Random = random) -> Tuple[int, int]:
+        """投票结算，返回 (被放逐玩家或 -1, 新的存活掩码)"""
+        target = tally(votes, rng)
+        if target == -1 or not alive & bit(target):
+            return -1, alive
+        return target, alive & ~bit(target)
+
+    def winner(self, alive: int) -> Optional[str]:
+        """狼人全部出局好人胜；好人全部出局或神职（预言家、守卫）全部出局狼人胜；否则返回 None"""
+        if not alive & self.wolves:
+            return Role.VILLAGER.name
+        if not alive & ~self.wolves or not alive & self.gods:
+            return Role.WOLF.name
+        return None
@@ -0,0 +1,187 @@
+# strategies.py
+"""
+玩家决策策略。策略只负责"做出决定"：输入与 call_dashscope 相同的 content（玩家视角的记忆、
+合法目标等），返回同样格式的 {"response": {"thinking", "target"[, "statements"]}}；
+更新查验记录、守护记录等副作用仍由 Player 统一处理，因此模型座位和规则座位可以混坐一桌。
+"""
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set
+
+from logic.game_utils import Role, call_dashscope, get_alive_player_ids, get_current_round
+from logic.memory import memory_query
+
+SEER_CLAIM = "我是预言家"
+_CHECK_PATTERN = re.compile(r"玩家(\d+)是(好人|坏人)")
+
+
+class Strategy(ABC):
+    """决策策略基类；子类必须实现 decide，缺少实现时在实例化时即报错"""
+
+    @abstractmethod
+    def decide(self, player, content: Dict[str, Any], game_log: Dict[str, Any],
+               situation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """返回与 call_dashscope 相同格式的决策"""
+
+
+class LLMStrategy(Strategy):
+    """通过路由器（如有）选择模型执行决策"""
+
+    def decide(self, player, content: Dict[str, Any], game_log: Dict[str, Any],
+               situation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if player.memory is not None and "memory" in content:
+            query = memory_query(content, get_alive_player_ids(game_log))
+            content["memory_text"] = player.memory.render(content["memory"], get_current_round(game_log), query)
+        if player.router is None or player.offline:
+            return call_dashscope(content, model=player.model, test=player.offline, rng=player.rng)
+        situation = dict(situation or {})
+        situation.setdefault("round", get_current_round(game_log))
+        return player.router.call(content, situation, rng=player.rng)
+
+
+class _Board:
+    """从玩家视角的记忆中提取启发式需要的公开信息"""
+    __slots__ = ("known_good", "seer_claims", "claimed_checks", "votes", "alive", "wolves")
+
+    def __init__(self, memory: Dict[str, Any]):
+        self.known_good: Set[int] = set()       # 夜里被刀的玩家一定不是狼人
+        self.seer_claims: List[int] = []        # 按首次起跳顺序
+        self.claimed_checks: Dict[int, Dict[int, str]] = {}
+        self.votes: List[Dict[int, List[int]]] = []
+        self.alive: Set[int] = set()
+        self.wolves: Set[int] = set()           # 只有狼人视角能看到
+        for key, section in memory.items():
+            if key.startswith("night-"):
+                self.known_good.update(section.get("death_log", []))
+            elif key.startswith("day-"):
+                for pid, text in section.get("heard_sayings", {}).items():
+                    if SEER_CLAIM in str(text):
+                        if pid not in self.seer_claims:
+                            self.seer_claims.append(pid)
+                        for target, identity in _CHECK_PATTERN.findall(str(text)):
+                            self.claimed_checks.setdefault(pid, {})[int(target)] = identity
+                self.votes.append(section.get("final_vote", {}))
+            elif key.startswith("result-"):
+                self.alive = set(section.get("alive", {}))
+                for group in section.values():
+                    self.wolves.update(pid for pid, role in group.items() if role == Role.WOLF.name)
+
+    def suspicion(self, candidates: List[int], own_checks: Dict[int, str]) -> Dict[int, float]:
+        """好人视角的怀疑分：投过已证实好人的票、被起跳预言家报为坏人、对跳预言家都会加分"""
+        scores = {pid: 0.0 for pid in candidates}
+        for votes in self.votes:
+            for target, voters in votes.items():
+                for voter in voters:
+                    if voter in scores and target in self.known_good:
+                        scores[voter] += 2.0
+                    if voter in scores and target == -1:
+                        scores[voter] += 0.5
+        credible = [pid for pid in self.seer_claims if pid not in scores or scores[pid] < 2.0]
+        for claimer in credible:
+            for target, identity in self.claimed_checks.get(claimer, {}).items():
+                if target in scores:
+                    scores[target] += 3.0 if identity == "坏人" else -1.5
+        if len(self.seer_claims) > 1:
+            # 对跳时后起跳的更可疑
+            for claimer in self.seer_claims[1:]:
+                if claimer in scores:
+                    scores[claimer] += 1.5
+        for target, identity in own_checks.items():
+            if target in scores:
+                scores[target] += 10.0 if identity == "坏人" else -10.0
+        return scores
+
+
+class HeuristicStrategy(Strategy):
+    """
+    不调用模型的规则策略，单次决策为微秒级：
+    - 狼人：优先刀起跳的预言家，其次刀怀疑狼人最多的玩家；白天有时悍跳预言家
+    - 预言家：白天公开查验结果，夜里查验怀疑分最高的未查验玩家
+    - 守卫：守护起跳的预言家，否则守护自己
+    - 投票：按投票历史和预言家报验计算怀疑分，投给最可疑的玩家
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None, fake_claim_rate: float = 0.3):
+        self.rng = rng or random.Random()
+        self.fake_claim_rate = fake_claim_rate
+
+    def decide(self, player, content: Dict[str, Any], game_log: Dict[str, Any],
+               situation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        board = _Board(content.get("memory", {}))
+        operation_type = content.get("type", "")
+        candidates = [t for t in content.get("legal_targets", []) if t != -1]
+        if operation_type == "speech":
+            return _response(self._speech(player, board))
+        if operation_type == "decision":
+            target = self._most_suspicious(player, board, candidates)
+            return _response(f"[策略] 玩家{target}嫌疑最大，投票放逐", target)
+        if operation_type == "faction plan":
+            target = self._wolf_target(board, candidates)
+            statements = {wid: f"[策略] 同意刀杀玩家{target}" for wid in content.get("wolf_ids", [])}
+            return {"response": {"thinking": f"[策略] 团队刀杀玩家{target}", "target": target,
+                                 "statements": statements}}
+        if operation_type == "thinking and target":
+            if player.role == Role.WOLF:
+                target = self._wolf_target(board, candidates)
+                return _response(f"[策略] 刀杀玩家{target}", target)
+            if player.role == Role.SEER:
+                target = self._most_suspicious(player, board, candidates)
+                return _response(f"[策略] 查验嫌疑最大的玩家{target}", target)
+            if player.role == Role.GUARD:
+                target = self._guard_target(player, board, candidates)
+                return _response(f"[策略] 守护玩家{target}", target)
+        return _response("[策略] 无行动")
+
+    def _pick_max(self, scores: Dict[int, float]) -> int:
+        if not scores:
+            return -1
+        best = max(scores.values())
+        return self.rng.choice(sorted(pid for pid, score in scores.items() if score == best))
+
+    def _most_suspicious(self, player, board: _Board, candidates: List[int]) -> int:
+        if player.role == Role.WOLF:
+            # 狼人投票：避开队友，把票投给对狼人威胁最大的好人
+            return self._wolf_target(board, [pid for pid in candidates if pid not in board.wolves])
+        return self._pick_max(board.suspicion(candidates, player.checked_players))
+
+    def _wolf_target(self, board: _Board, candidates: List[int]) -> int:
+        """candidates 中不含狼人队友"""
+        for claimer in board.seer_claims:
+            if claimer in candidates:
+                return claimer
+        # 投过真狼的人对狼人威胁最大：以"投票次数"近似
+        pressure = {pid: 0.0 for pid in candidates}
+        for votes in board.votes:
+            for target, voters in votes.items():
+                for voter in voters:
+                    if voter in pressure and target != -1:
+                        pressure[voter] += 1.0
+        return self._pick_max(pressure)
+
+    def _guard_target(self, player, board: _Board, candidates: List[int]) -> int:
+        for claimer in board.seer_claims:
+            if claimer in candidates and claimer != player.player_id:
+                return claimer
+        if player.player_id in candidates:
+            return player.player_id
+        return self.rng.choice(candidates) if candidates else -1
+
+    def _speech(self, player, board: _Board) -> str:
+        if player.role == Role.SEER and player.checked_players:
+            checks = "，".join(f"玩家{pid}是{identity}" for pid, identity in player.checked_players.items())
+            return f"{SEER_CLAIM}，查验结果：{checks}。"
+        alive = sorted(board.alive - {player.player_id})
+        if player.role == Role.WOLF:
+            others = [pid for pid in alive if pid not in board.wolves]
+            if not board.seer_claims and others and self.rng.random() < self.fake_claim_rate:
+                return f"{SEER_CLAIM}，查验结果：玩家{self.rng.choice(others)}是坏人。"
+            return "[策略] 我是好人，先听听大家的发言。"
+        target = self._pick_max(board.suspicion(alive, player.checked_players))
+        if target == -1:
+            return "[策略] 暂时没有明确的怀疑对象。"
+        return f"[策略] 我比较怀疑玩家{target}。"
+
+
+def _response(thinking: str, target: int = -1) -> Dict[str, Any]:
+    return {"response": {"thinking": thinking, "target": target}}
@@ -0,0 +1,148 @@
+# structured_output.py
+import json
+from typing import Any, Dict, Iterable, Optional
+
+
+class StructuredOutputError(ValueError):
+    """模型输出无法解析或不符合当前行动的格式要求"""
+
+
+class IncrementalJSONParser:
+    """
+    增量 JSON 解析器：逐块喂入模型输出，第一个完整的顶层 JSON 对象出现时立即返回。
+    会跳过字符串内部的花括号，也会跳过前面的说明文字或 ``` 代码块标记。
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """丢弃已喂入的内容，重新开始解析"""
+        self._text = ""
+        self._pos = 0          # 下一个待扫描字符
+        self._start = -1       # 当前候选对象的起点
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result: Optional[Dict[str, Any]] = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """喂入一段文本，解析出完整对象时返回该对象"""
+        if self.result is not None or not chunk:
+            return self.result
+        self._text += chunk
+
+        text = self._text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+
+            if self._start == -1:
+                if ch == "{":
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos]
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        parsed = None
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        return parsed
+                    # 不是合法 JSON（例如说明文字里的花括号），从下一个字符重新寻找
+                    self._pos = self._start + 1
+                    self._start = -1
+        return None
+
+    def close(self) -> Dict[str, Any]:
+        """输出结束时调用，没有得到完整对象则抛出异常"""
+        if self.result is None:
+            raise StructuredOutputError("输出中没有找到完整的 JSON 对象")
+        return self.result
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """一次性解析完整文本中的第一个 JSON 对象"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def _coerce_target(value: Any) -> int:
+    """把模型给出的目标转换为整数玩家ID，接受 3、"3"、"玩家3" 这类写法"""
+    if isinstance(value, bool):
+        raise StructuredOutputError(f"目标必须是玩家ID，而不是 {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        stripped = value.strip().removeprefix("玩家")
+        try:
+            return int(stripped)
+        except ValueError:
+            pass
+    raise StructuredOutputError(f"目标必须是整数玩家ID，而不是 {value!r}")
+
+
+def validate_target_action(obj: Dict[str, Any], legal_targets: Iterable[int],
+                           content: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """校验 {"thinking": str, "target": int}，目标必须在合法目标集合内"""
+    if "target" not in obj:
+        raise StructuredOutputError('缺少 "target" 字段')
+    target = _coerce_target(obj["target"])
+    legal = set(legal_targets)
+    if target not in legal:
+        raise StructuredOutputError(f"目标 {target} 不合法，可选目标为: {sorted(legal)}")
+    thinking = obj.get("thinking", "")
+    if not isinstance(thinking, str):
+        thinking = json.dumps(thinking, ensure_ascii=False)
+    return {"thinking": thinking, "target": target}
+
+
+def validate_faction_plan(obj: Dict[str, Any], legal_targets: Iterable[int],
+                          content: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """校验狼人团队计划 {"statements": {玩家ID: 发言}, "target": int}，每名狼人都必须有发言"""
+    plan = validate_target_action(obj, legal_targets)
+    statements = obj.get("statements")
+    if not isinstance(statements, dict):
+        raise StructuredOutputError('缺少 "statements" 对象')
+    normalized = {}
+    for pid, text in statements.items():
+        normalized[_coerce_target(pid)] = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
+    wolf_ids = set((content or {}).get("wolf_ids", normalized))
+    missing = wolf_ids - set(normalized)
+    if missing:
+        raise StructuredOutputError(f"缺少玩家 {sorted(missing)} 的发言")
+    plan["statements"] = {pid: normalized[pid] for pid in sorted(wolf_ids)}
+    return plan
+
+
+# 每种操作类型对应的校验函数，发言是自由文本不需要校验
+ACTION_VALIDATORS = {
+    "decision": validate_target_action,
+    "thinking and target": validate_target_action,
+    "faction plan": validate_faction_plan,
+}
@@ -0,0 +1,284 @@
+# tournament.py
+"""
+批量对局评测：把大量对局分片到多进程中运行，比较不同模型/后端配置的胜率。
+
+    python -m logic.tournament --games 2000 --config off=offline --config v3=deepseek-v3 --out results.jsonl
+    python -m logic.tournament --summarize results.jsonl
+    python -m logic.tournament --batch --concurrency 200 --games 2000 --config qwen=qwen-plus
+
+每局结果实时追加到 JSONL 文件，结束后按配置汇总胜率（Wilson 置信区间）和 Elo 评分。
+--batch 时在单个进程中用线程同时运行 --concurrency 局，模型请求汇总为批量推理任务（见 logic/batch_inference.py）。
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from logic.analytics import AnalyticsWriter, flatten_game
+from logic.batch_inference import BatchCollector, OpenAIBatchClient, batch_mode
+from logic.game_utils import Role
+from logic.gamemanager import GameManager, OFFLINE_BACKEND, SEAT_BACKENDS
+from logic.llm_scheduler import Priority
+from logic.model_config import model_config
+
+ELO_INITIAL = 1500.0
+ELO_K = 16.0
+
+# 同时提交给进程池的对局数上限，避免数千个 Future 一次性占用内存
+MAX_PENDING_PER_WORKER = 4
+
+
+def parse_configs(specs: Iterable[str]) -> Dict[str, str]:
+    """解析 --config NAME=BACKEND，BACKEND 为 offline、heuristic、router 或 model_config 中的模型名"""
+    configs = {}
+    for spec in specs:
+        name, sep, backend = spec.partition("=")
+        if not sep:
+            name, backend = spec, spec
+        if not name or not backend:
+            raise ValueError(f"配置格式应为 NAME=BACKEND: {spec}")
+        if backend not in SEAT_BACKENDS and backend not in model_config:
+            raise ValueError(f"未知后端: {backend}")
+        configs[name] = backend
+    return configs
+
+
+def seat_assignment(game_index: int, names: List[str]) -> List[str]:
+    """按局轮换座位上的配置，配合随机角色让每个配置在各座位、各角色上出现的次数大致相同"""
+    return [names[(game_index + seat) % len(names)] for seat in range(6)]
+
+
+def play_game(task: Tuple[int, int, List[str], Dict[str, str], int, bool, bool, bool]) -> Dict[str, Any]:
+    """在子进程中运行一局，返回可写入 JSONL 的结果；export 时附带展开后的分析表行"""
+    game_index, seed, seat_configs, configs, max_rounds, wolf_batch, export, speculative = task
+    # 所有随机选择都来自由 seed 派生的对局随机数，批量模式下多个线程同时运行对局也可复现
+    started = time.perf_counter()
+    game = GameManager(verbose=False, wolf_batch=wolf_batch, game_id=f"tournament-{game_index}",
+                       priority=Priority.SIMULATION, seed=seed,
+                       seat_backends=[configs[name] for name in seat_configs], speculative=speculative)
+    winner = game.run(phase_delay=0, max_rounds=max_rounds)
+    result = {
+        "game": game_index,
+        "seed": seed,
+        "winner": winner,
+        "rounds": game.current_round,
+        "duration_s": round(time.perf_counter() - started, 4),
+        "seats": [
+            {"seat": p.player_id, "config": seat_configs[p.player_id], "role": p.role.name,
+             "team": _team(p.role.name), "alive": p.alive}
+            for p in game.players
+        ],
+    }
+    if game.pipeline is not None:
+        result["pipeline"] = game.pipeline.stats()
+    if export:
+        result["tables"] = flatten_game(game.game_id, game.events, seat_configs)
+    return result
+
+
+def play_game_batched(collector: BatchCollector, task: Tuple) -> Dict[str, Any]:
+    """在线程中运行一局，模型请求交给批量收集器，等待结果时线程阻塞、不占用 CPU"""
+    with batch_mode(collector):
+        return play_game(task)
+
+
+def _team(role: str) -> str:
+    return Role.WOLF.name if role == Role.WOLF.name else Role.VILLAGER.name
+
+
+def run_tournament(configs: Dict[str, str], games: int, out_path: str, workers: Optional[int] = None,
+                   seed: int = 0, max_rounds: int = 20, wolf_batch: bool = False,
+                   analytics: Optional[AnalyticsWriter] = None, speculative: bool = False,
+                   collector: Optional[BatchCollector] = None, concurrency: int = 64) -> List[Dict[str, Any]]:
+    """
+    运行 games 局并把每局结果追加写入 out_path，提供 analytics 时同时导出到分析数据集。
+    注意：模型请求的限流在每个进程内独立生效，使用真实模型时总请求速率约为单进程限额乘以进程数。
+    提供 collector 时改为在本进程中用 concurrency 个线程同时运行对局，模型请求批量提交。
+    """
+    names = list(configs)
+    if collector is not None:
+        workers = concurrency
+        executor_class = ThreadPoolExecutor
+        run_game = functools.partial(play_game_batched, collector)
+    else:
+        workers = workers or os.cpu_count() or 1
+        executor_class = ProcessPoolExecutor
+        run_game = play_game
+    export = analytics is not None
+    tasks = ((i, seed + i, seat_assignment(i, names), configs, max_rounds, wolf_batch, export, speculative)
+             for i in range(games))
+    results = []
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, executor_class(max_workers=workers) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(run_game, task))
+            if len(pending) >= workers * MAX_PENDING_PER_WORKER:
+                pending = _drain(pending, out, results, analytics, first_only=True)
+        _drain(pending, out, results, analytics, first_only=False)
+    if analytics is not None:
+        analytics.flush()
+
+    elapsed = time.perf_counter() - started
+    unit = "个线程" if collector is not None else "个进程"
+    print(f"完成 {len(results)} 局，用时 {elapsed:.1f}s（{len(results) / elapsed:.1f} 局/秒，{workers} {unit}）",
+          file=sys.stderr)
+    return results
+
+
+def _drain(pending: set, out, results: List[Dict[str, Any]], analytics: Optional[AnalyticsWriter],
+           first_only: bool) -> set:
+    """收取已完成的对局并立即写盘；first_only 时收到一局即返回，腾出提交名额"""
+    for future in as_completed(pending):
+        pending.discard(future)
+        result = future.result()
+        tables = result.pop("tables", None)
+        if analytics is not None and tables is not None:
+            analytics.add(tables)
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        results.append(result)
+        if first_only:
+            break
+    return pending
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def wilson_interval(wins: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """胜率的 Wilson 置信区间（默认 95%）"""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def elo_ratings(results: List[Dict[str, Any]], k: float = ELO_K) -> Dict[str, float]:
+    """
+    阵营对抗的 Elo：每局把狼人阵营和好人阵营各自成员配置的平均分作为队伍分，
+    按预期胜率更新每个成员（同一配置在一局中出现几次就更新几次）。平局计 0.5。
+    """
+    ratings: Dict[str, float] = {}
+    for result in sorted(results, key=lambda r: r["game"]):
+        teams: Dict[str, List[str]] = {Role.WOLF.name: [], Role.VILLAGER.name: []}
+        for seat in result["seats"]:
+            teams[seat["team"]].append(seat["config"])
+            ratings.setdefault(seat["config"], ELO_INITIAL)
+        wolf_rating = sum(ratings[c] for c in teams[Role.WOLF.name]) / len(teams[Role.WOLF.name])
+        villager_rating = sum(ratings[c] for c in teams[Role.VILLAGER.name]) / len(teams[Role.VILLAGER.name])
+        expected_wolf = 1 / (1 + 10 ** ((villager_rating - wolf_rating) / 400))
+        score_wolf = {Role.WOLF.name: 1.0, Role.VILLAGER.name: 0.0}.get(result["winner"], 0.5)
+
+        delta = k * (score_wolf - expected_wolf)
+        for config in teams[Role.WOLF.name]:
+            ratings[config] += delta / len(teams[Role.WOLF.name])
+        for config in teams[Role.VILLAGER.name]:
+            ratings[config] -= delta / len(teams[Role.VILLAGER.name])
+    return ratings
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按配置汇总：每个座位出场算一次样本，分别统计总体和各阵营的胜率"""
+    stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+    for result in results:
+        for seat in result["seats"]:
+            by_team = stats.setdefault(seat["config"], {})
+            for key in ("all", seat["team"]):
+                entry = by_team.setdefault(key, {"n": 0, "wins": 0})
+                entry["n"] += 1
+                entry["wins"] += int(result["winner"] == seat["team"])
+
+    ratings = elo_ratings(results)
+    configs = {}
+    for config, by_team in sorted(stats.items()):
+        configs[config] = {"elo": round(ratings.get(config, ELO_INITIAL), 1)}
+        for key, entry in by_team.items():
+            low, high = wilson_interval(entry["wins"], entry["n"])
+            configs[config][key] = {
+                "n": entry["n"],
+                "win_rate": round(entry["wins"] / entry["n"], 4),
+                "ci95": [round(low, 4), round(high, 4)],
+            }
+
+    winners = [r["winner"] for r in results]
+    return {
+        "games": len(results),
+        "wolf_win_rate": round(winners.count(Role.WOLF.name) / len(results), 4) if results else None,
+        "draws": winners.count(None),
+        "avg_rounds": round(sum(r["rounds"] for r in results) / len(results), 2) if results else None,
+        "configs": configs,
+    }
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"对局数: {summary['games']}  狼人胜率: {summary['wolf_win_rate']}  "
+          f"平局: {summary['draws']}  平均轮数: {summary['avg_rounds']}")
+    print(f"{'配置':<16}{'Elo':>8}{'出场':>8}{'胜率':>8}  95%CI            {'狼人胜率':>8}{'好人胜率':>8}")
+    for config, entry in sorted(summary["configs"].items(), key=lambda item: -item[1]["elo"]):
+        overall = entry["all"]
+        wolf = entry.get(Role.WOLF.name, {}).get("win_rate", "-")
+        villager = entry.get(Role.VILLAGER.name, {}).get("win_rate", "-")
+        ci = f"[{overall['ci95'][0]:.3f}, {overall['ci95'][1]:.3f}]"
+        print(f"{config:<16}{entry['elo']:>8}{overall['n']:>8}{overall['win_rate']:>8}  {ci:<17}{wolf:>8}{villager:>8}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="多进程批量对局评测")
+    parser.add_argument("--games", type=int, default=100, help="对局数")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--seed", type=int, default=0, help="第 i 局使用 seed + i 作为种子")
+    parser.add_argument("--config", action="append", default=[],
+                        help=f"NAME=BACKEND，可重复；BACKEND 为 {'、'.join(SEAT_BACKENDS)} 或模型名")
+    parser.add_argument("--max-rounds", type=int, default=20, help="超过该轮数按平局结束")
+    parser.add_argument("--wolf-batch", action="store_true", help="狼人团队一次请求给出统一决策")
+    parser.add_argument("--speculative", action="store_true",
+                        help="提前并行执行输入已确定的模型决策（离线后端的结果将不再按种子复现）")
+    parser.add_argument("--batch", action="store_true",
+                        help="模型请求汇总为批量推理任务提交到 BATCH_BASE_URL（不适用于 offline/heuristic 座位）")
+    parser.add_argument("--concurrency", type=int, default=64, help="--batch 时同时进行的对局数")
+    parser.add_argument("--batch-linger", type=float, default=2.0, help="--batch 时请求最多等待多少秒再提交任务")
+    parser.add_argument("--batch-poll", type=float, default=5.0, help="--batch 时查询任务状态的间隔（秒）")
+    parser.add_argument("--out", default="tournament.jsonl", help="逐局结果输出文件（追加写入）")
+    parser.add_argument("--summary-out", help="把汇总结果写入该 JSON 文件")
+    parser.add_argument("--analytics", metavar="DIR", help="同时把每局展开后追加到该分析数据集目录")
+    parser.add_argument("--summarize", metavar="JSONL", help="只汇总已有结果文件，不运行对局")
+    args = parser.parse_args(argv)
+
+    if args.summarize:
+        results = load_results(args.summarize)
+    else:
+        configs = parse_configs(args.config or [OFFLINE_BACKEND])
+        analytics = AnalyticsWriter(args.analytics) if args.analytics else None
+        collector = BatchCollector(OpenAIBatchClient(), linger=args.batch_linger,
+                                   poll_interval=args.batch_poll) if args.batch else None
+        try:
+            results = run_tournament(configs, args.games, args.out, workers=args.workers, seed=args.seed,
+                                     max_rounds=args.max_rounds, wolf_batch=args.wolf_batch, analytics=analytics,
+                                     speculative=args.speculative, collector=collector,
+                                     concurrency=args.concurrency)
+        finally:
+            if collector is not None:
+                collector.close()
+                print(f"批量推理: {collector.stats()}", file=sys.stderr)
+
+    summary = summarize(results)
+    print_summary(summary)
+    if args.summary_out:
+        with open(args.summary_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,43 @@
 # main.py
-import json
-import random
+import asyncio
+import functools
+import time
 import uuid
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional, Any
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
+import config
+from logic.analytics import AnalyticsWriter
+from logic.events import compact_replay, spectator_visible
 from logic.gamemanager import GameManager
 from logic.game_utils import Role
+from logic.llm_scheduler import get_scheduler
+from logic.rules import IllegalAction
+from server.action_protocol import action_reply, parse_ws_message
+from server.chat_relay import ChatRelay
+from server.game_commands import GameCommandGuard
+from server.phase_scheduler import PhaseScheduler
+from server.profiler import MAX_DURATION, SamplingProfiler, activity
+from server.static_cache import StaticAssetCache
+from server.serialization import FastJSONResponse, SnapshotCache, dumps, dumps_text
+from server.wire import Frame, JSON, WireFormat, negotiate, reencode_rest
+from server.ws_sessions import (BufferedMessage, Connection, HeartbeatMonitor, ReplayBuffer, HEARTBEAT_INTERVAL,
+                                WS_PING_INTERVAL, WS_PING_TIMEOUT)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 退出前写出缓冲中尚未落盘的分析数据
+    if analytics is not None:
+        await asyncio.to_thread(analytics.close)
 
 # 创建FastAPI应用
-app = FastAPI(title="狼人杀游戏API", description="狼人杀游戏的HTTP接口")
+app = FastAPI(title="狼人杀游戏API", description="狼人杀游戏的HTTP接口", lifespan=lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -28,124 +51,448 @@ app.add_middleware(
 # 游戏实例存储
 games: Dict[str, GameManager] = {}
 
+# 按局串行化的命令处理与幂等键记录
+game_commands = GameCommandGuard()
+
+# 已结束对局批量追加到列式分析数据集（需设置 ANALYTICS_DIR）
+analytics = AnalyticsWriter(config.ANALYTICS_DIR) if config.ANALYTICS_DIR else None
+
+# 序列化结果缓存：对局未变化（事件序号不变）时重复读取直接返回已编码的字节
+snapshots = SnapshotCache()
+
 # 玩家连接管理
 class ConnectionManager:
+    """
+    管理各局的 WebSocket 连接。广播的消息带有按局递增的 seq 并保存在环形缓冲中，
+    客户端断线重连时带上最后收到的 seq 即可只补发错过的消息；对局结束或最后一个连接关闭时释放其缓冲。
+    连接是否存活由协议层 ping/pong 判断（见 WS_PING_INTERVAL），心跳任务只定期发送应用层 ping，
+    移除写不进去的连接。
+    """
+
     def __init__(self):
-        self.active_connections: Dict[str, Dict[int, WebSocket]] = {}
+        self.active_connections: Dict[str, Dict[int, Connection]] = {}
+        self.buffers: Dict[str, ReplayBuffer] = {}
+        self.heartbeat = HeartbeatMonitor(self.check_connections)
+        self.reaped = 0
 
-    async def connect(self, websocket: WebSocket, game_id: str, player_id: int):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, game_id: str, player_id: int, wire: WireFormat = JSON,
+                      subprotocol: Optional[str] = None) -> Connection:
+        await websocket.accept(subprotocol=subprotocol)
+        self.heartbeat.ensure_running()
         if game_id not in self.active_connections:
             self.active_connections[game_id] = {}
-        self.active_connections[game_id][player_id] = websocket
+        previous = self.active_connections[game_id].get(player_id)
+        connection = Connection(websocket, wire)
+        self.active_connections[game_id][player_id] = connection
+        if previous is not None:
+            # 同一玩家重新连接，旧连接不再接收消息
+            await previous.close()
+        return connection
 
-    def disconnect(self, game_id: str, player_id: int):
-        if game_id in self.active_connections and player_id in self.active_connections[game_id]:
-            del self.active_connections[game_id][player_id]
-            if not self.active_connections[game_id]:
-                del self.active_connections[game_id]
+    def disconnect(self, game_id: str, player_id: int, connection: Optional[Connection] = None):
+        """移除连接；给出 connection 时只在它仍是该玩家的当前连接时移除，避免误删重连后的新连接"""
+        connections = self.active_connections.get(game_id)
+        if connections is None or player_id not in connections:
+            return
+        if connection is not None and connections[player_id] is not connection:
+            return
+        del connections[player_id]
+        if not connections:
+            del self.active_connections[game_id]
+            # 没有连接时不再缓冲消息，之后重连的客户端收到完整的 init 状态
+            self.release(game_id)
 
-    async def broadcast(self, game_id: str, message: dict):
-        if game_id in self.active_connections:
-            for player_id, connection in self.active_connections[game_id].items():
-                player_message = self.filter_message_for_player(message, player_id, game_id)
-                await connection.send_json(player_message)
+    def release(self, game_id: str):
+        """释放对局的补发缓冲"""
+        self.buffers.pop(game_id, None)
 
-    def filter_message_for_player(self, message: dict, player_id: int, game_id: str) -> dict:
-        # 根据玩家角色过滤信息
+    def buffer(self, game_id: str) -> ReplayBuffer:
+        if game_id not in self.buffers:
+            self.buffers[game_id] = ReplayBuffer()
+        return self.buffers[game_id]
+
+    async def broadcast(self, game_id: str, message: dict, replayable: bool = True):
+        """
+        广播给对局的所有连接。replayable=False 的消息（聊天）不分配 seq、不进入补发缓冲，
+        避免频繁的聊天把阶段消息挤出缓冲；断线期间错过的聊天不补发
+        """
+        if game_id not in self.active_connections:
+            return
+        buffered = self.freeze(game_id, message) if replayable else BufferedMessage(0, message)
+        # 看到相同内容且使用相同编码的玩家（所有狼人，或不含游戏状态的消息的所有人）共用同一份编码
+        encoded: Dict[Any, Frame] = {}
+        targets = []
+        for player_id, connection in list(self.active_connections[game_id].items()):
+            visibility = self.visibility_class(game_id, player_id) if buffered.rest is not None else None
+            key = (visibility, connection.wire.name)
+            if key not in encoded:
+                encoded[key] = self.render(buffered, player_id, game_id, connection.wire)
+            targets.append((player_id, connection, encoded[key]))
+        # 并发发送，单个写不进去的连接只会在超时后被移除，不会阻塞其他人
+        results = await asyncio.gather(*(connection.send(text) for _, connection, text in targets))
+        for (player_id, connection, _), ok in zip(targets, results):
+            if not ok:
+                self.disconnect(game_id, player_id, connection)
+
+    def freeze(self, game_id: str, message: dict) -> BufferedMessage:
+        """分配 seq 并把消息冻结为文本存入补发缓冲"""
+        buffer = self.buffer(game_id)
+        seq = buffer.next_seq()
+        if "game_state" not in message:
+            buffered = BufferedMessage(seq, {**message, "seq": seq})
+        else:
+            game_state = message["game_state"]
+            head = {**{k: v for k, v in message.items() if k != "game_state"}, "seq": seq}
+            buffered = BufferedMessage(seq, head, self.encode_state_rest(game_state, game_id),
+                                       game_state.get("players", []))
+        buffer.append(buffered)
+        return buffered
+
+    def render(self, buffered: BufferedMessage, player_id: int, game_id: str, wire: WireFormat = JSON) -> Frame:
+        head = buffered.encoded_head(wire)
+        if buffered.rest is None:
+            return head
+        players = self.filter_players(buffered.players, player_id, game_id)
+        return wire.splice(head, wire.encode(players), buffered.encoded_rest(wire))
+
+    async def replay(self, connection: Connection, game_id: str, player_id: int, last_seq: int) -> Optional[int]:
+        """补发 last_seq 之后的消息并返回补发条数；缓冲中已没有缺失的消息时返回 None，需要发送完整状态"""
+        missed = self.buffer(game_id).since(last_seq)
+        if missed is None:
+            return None
+        for buffered in missed:
+            if not await connection.send(self.render(buffered, player_id, game_id, connection.wire)):
+                break
+        return len(missed)
+
+    async def check_connections(self):
+        """心跳：向所有连接发送应用层 ping（不要求应答），移除发送失败或超时的连接"""
+        ping = {"type": "ping", "ts": time.time(), "interval": HEARTBEAT_INTERVAL}
+        pings: Dict[str, Frame] = {}
+        targets = [(game_id, player_id, connection)
+                   for game_id, connections in list(self.active_connections.items())
+                   for player_id, connection in list(connections.items())]
+        for _, _, connection in targets:
+            if connection.wire.name not in pings:
+                pings[connection.wire.name] = connection.wire.encode(ping)
+        results = await asyncio.gather(*(connection.send(pings[connection.wire.name]) for _, _, connection in targets))
+        for (game_id, player_id, connection), ok in zip(targets, results):
+            if not ok:
+                self.disconnect(game_id, player_id, connection)
+                await connection.close()
+                self.reaped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        formats: Dict[str, int] = {}
+        for connections in self.active_connections.values():
+            for connection in connections.values():
+                formats[connection.wire.name] = formats.get(connection.wire.name, 0) + 1
+        return {
+            "games": len(self.active_connections),
+            "connections": sum(len(c) for c in self.active_connections.values()),
+            "formats": formats,
+            "buffered_games": len(self.buffers),
+            "reaped": self.reaped,
+        }
+
+    def visibility_class(self, game_id: str, player_id: int) -> Any:
+        """能看到的角色信息相同的玩家属于同一类：狼人互相可见，其他人只能看到自己"""
+        game = games.get(game_id)
+        if game is None or player_id >= len(game.players):
+            return "all"
+        if game.players[player_id].role == Role.WOLF:
+            return Role.WOLF.name
+        return player_id
+
+    def encode_state_rest(self, game_state: dict, game_id: str, wire: WireFormat = JSON) -> Frame:
+        """game_state 中除 players 以外的部分；game_log 等公共部分每个对局版本、每种编码只编码一次"""
+        def build_rest() -> str:
+            return dumps_text({k: v for k, v in game_state.items() if k != "players"})
+
+        # 广播的 game_state 都由 get_game_state 生成，与当前版本的对局一致
         if game_id not in games:
-            return message
-            
-        game = games[game_id]
-        if player_id >= len(game.players):
-            return message
-            
-        player = game.players[player_id]
-        
-        # 复制消息以避免修改原始消息
-        filtered_message = message.copy()
-        
-        # 如果消息包含游戏状态，过滤角色信息
-        if "game_state" in filtered_message:
-            game_state = filtered_message["game_state"].copy()
-            
-            # 过滤玩家角色信息，只显示自己的角色
-            if "players" in game_state:
-                filtered_players = []
-                for p in game_state["players"]:
-                    p_copy = p.copy()
-                    # 如果不是当前玩家，隐藏角色
-                    if p["player_id"] != player_id:
-                        # 狼人可以看到其他狼人的身份
-                        if player.role == Role.WOLF and p["role"] == "WOLF":
-                            pass  # 保持狼人角色可见
-                        else:
-                            p_copy["role"] = "UNKNOWN"  # 对其他玩家隐藏角色
-                    filtered_players.append(p_copy)
-                game_state["players"] = filtered_players
-            
-            filtered_message["game_state"] = game_state
-            
-        return filtered_message
+            return reencode_rest(build_rest(), wire)
+        version = games[game_id].events.last_seq
+        rest = snapshots.get(game_id, version, "ws-state", build_rest)
+        if wire is JSON:
+            return rest
+        return snapshots.get(game_id, version, ("ws-state", wire.name), lambda: reencode_rest(rest, wire))
+
+    def encode_for_player(self, message: dict, player_id: int, game_id: str, wire: WireFormat = JSON) -> Frame:
+        """按玩家身份过滤角色信息后编码（不分配 seq，用于只发给单个连接的消息）"""
+        if "game_state" not in message:
+            return wire.encode(message)
+        game_state = message["game_state"]
+        head = wire.encode({k: v for k, v in message.items() if k != "game_state"})
+        players = self.filter_players(game_state.get("players", []), player_id, game_id)
+        return wire.splice(head, wire.encode(players), self.encode_state_rest(game_state, game_id, wire))
+
+    def filter_players(self, players: List[dict], player_id: int, game_id: str) -> List[dict]:
+        # 根据玩家角色过滤信息
+        game = games.get(game_id)
+        if game is None or player_id >= len(game.players):
+            return players
+        viewer = game.players[player_id]
+
+        filtered_players = []
+        for p in players:
+            p_copy = p.copy()
+            # 如果不是当前玩家，隐藏角色
+            if p["player_id"] != player_id:
+                # 狼人可以看到其他狼人的身份
+                if viewer.role == Role.WOLF and p["role"] == "WOLF":
+                    pass  # 保持狼人角色可见
+                else:
+                    p_copy["role"] = "UNKNOWN"  # 对其他玩家隐藏角色
+            filtered_players.append(p_copy)
+        return filtered_players
 
 manager = ConnectionManager()
 
+# 聊天按玩家限流，并按局合并为每个时间窗口一帧广播
+chat_relay = ChatRelay(functools.partial(manager.broadcast, replayable=False))
+
+# 自动推进对局各阶段的默认时限（秒）
+DEFAULT_PHASE_TIMEOUTS = {"NIGHT": 60.0, "DAY": 180.0, "VOTING": 60.0}
+
+# 开启了自动推进的对局 -> 各阶段时限
+auto_advance_games: Dict[str, Dict[str, float]] = {}
+
 # 数据模型
 class GameCreate(BaseModel):
     verbose: bool = False
+    # 开启后由服务端推进阶段：所有必需行动提交完毕或阶段超时即进入下一阶段
+    auto_advance: bool = False
+    phase_timeouts: Dict[str, float] = Field(default_factory=lambda: dict(DEFAULT_PHASE_TIMEOUTS))
+
+class GameFork(BaseModel):
+    # 快照下标（每个阶段边界一个），负数从最新往前数
+    snapshot: int = -1
+    # 不指定时沿用快照时的随机数状态
+    seed: Optional[int] = None
+    verbose: bool = False
 
 class PlayerAction(BaseModel):
     action_type: str  # "vote", "guard", "seer", "speech"
     target_id: Optional[int] = None
     content: Optional[str] = None
 
+# 单次批量请求最多包含的操作数
+MAX_BULK_ACTIONS = 1000
+
+class BulkActionItem(PlayerAction):
+    game_id: str
+    player_id: int
+    idempotency_key: Optional[str] = None
+
+class BulkActionRequest(BaseModel):
+    actions: List[BulkActionItem] = Field(..., min_length=1, max_length=MAX_BULK_ACTIONS)
+
+# 响应模型：用于接口文档；实际响应由 FastJSONResponse 直接输出预编码的字节
+class PlayerState(BaseModel):
+    player_id: int
+    role: str
+    alive: bool
+
+class GameCreated(BaseModel):
+    game_id: str
+    message: str
+    players: List[PlayerState]
+    current_phase: str
+    current_round: int
+    deadline: Optional[float] = None
+
+class GameForked(GameCreated):
+    forked_from: str
+    snapshot: Dict[str, Any]
+
+class GameState(BaseModel):
+    game_id: str
+    players: List[PlayerState]
+    current_phase: str
+    current_round: int
+    event_seq: int
+    # include_log=false 时不返回
+    game_log: Optional[Dict[str, Any]] = None
+
+class PlayerInfo(BaseModel):
+    player_id: int
+    role: str
+    alive: bool
+    checked_players: Dict[int, str]
+    last_guarded: int
+    game_log: Dict[str, Any]
+
 # API路由
 @app.get("/")
 async def get_root():
     return {"message": "欢迎使用狼人杀游戏API"}
 
-@app.post("/games", response_model=Dict[str, Any])
+@app.post("/games", response_model=GameCreated, response_class=FastJSONResponse)
 async def create_game(game_data: GameCreate):
+    timeouts = dict(DEFAULT_PHASE_TIMEOUTS, **game_data.phase_timeouts)
+    if set(timeouts) != set(DEFAULT_PHASE_TIMEOUTS) or any(t <= 0 for t in timeouts.values()):
+        raise HTTPException(status_code=400, detail="阶段时限只能设置 NIGHT/DAY/VOTING，且必须大于0")
+    
     game_id = str(uuid.uuid4())
-    games[game_id] = GameManager(verbose=game_data.verbose)
+    games[game_id] = GameManager(verbose=game_data.verbose, game_id=game_id)
+    
+    deadline = None
+    if game_data.auto_advance:
+        auto_advance_games[game_id] = timeouts
+        deadline = phase_timers.schedule(game_id, timeouts[games[game_id].current_phase])
     
     # 返回游戏信息
-    return {
+    return FastJSONResponse({
         "game_id": game_id,
         "message": "游戏创建成功",
-        "players": [
-            {
-                "player_id": player.player_id,
-                "role": player.role.name,
-                "alive": player.alive
-            } for player in games[game_id].players
-        ],
+        "players": players_state(games[game_id]),
         "current_phase": games[game_id].current_phase,
-        "current_round": games[game_id].current_round
+        "current_round": games[game_id].current_round,
+        "deadline": deadline
+    })
+
+@app.get("/games/{game_id}/snapshots", response_model=Dict[str, Any])
+async def list_game_snapshots(game_id: str):
+    if game_id not in games:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    return {
+        "game_id": game_id,
+        "snapshots": [dict(index=i, **snapshot.describe()) for i, snapshot in enumerate(games[game_id].snapshots)]
     }
 
-@app.get("/games/{game_id}", response_model=Dict[str, Any])
-async def get_game(game_id: str):
+@app.post("/games/{game_id}/fork", response_model=GameForked, response_class=FastJSONResponse)
+async def fork_game(game_id: str, fork_data: GameFork):
+    """从某个阶段边界分叉出一局新游戏，用于换种子/换模型的假设重放；原对局不受影响"""
+    if game_id not in games:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    source = games[game_id]
+    # 在源对局的命令锁内分叉，保证读到的是完整的阶段边界
+    async with game_commands.command(game_id):
+        if not -len(source.snapshots) <= fork_data.snapshot < len(source.snapshots):
+            raise HTTPException(status_code=400, detail="快照不存在")
+        new_game_id = str(uuid.uuid4())
+        forked = source.fork(fork_data.snapshot, game_id=new_game_id, seed=fork_data.seed,
+                             verbose=fork_data.verbose)
+        games[new_game_id] = forked
+    
+    return FastJSONResponse({
+        "game_id": new_game_id,
+        "message": "分叉成功",
+        "players": players_state(forked),
+        "current_phase": forked.current_phase,
+        "current_round": forked.current_round,
+        "deadline": None,
+        "forked_from": game_id,
+        "snapshot": source.snapshots[fork_data.snapshot].describe()
+    })
+
+@app.get("/games/{game_id}", response_model=GameState, response_class=FastJSONResponse)
+async def get_game(game_id: str, include_log: bool = True):
     if game_id not in games:
         raise HTTPException(status_code=404, detail="游戏不存在")
     
     game = games[game_id]
     
+    def build() -> bytes:
+        response = {
+            "game_id": game_id,
+            "players": players_state(game),
+            "current_phase": game.current_phase,
+            "current_round": game.current_round,
+            "event_seq": game.events.last_seq
+        }
+        # 日志随对局变长，只需要状态的客户端可以用 include_log=false 并通过 /events 增量读取
+        if include_log:
+            response["game_log"] = game.game_log
+        return dumps(response)
+    
+    # 每次状态变化都会追加事件，事件序号即对局版本
+    visibility = "full" if include_log else "full-nolog"
+    with activity(game_id):
+        return FastJSONResponse(snapshots.get(game_id, game.events.last_seq, visibility, build))
+
+# 观战接口：基于游标的历史分页、SSE 实时事件流和已结束对局的紧凑回放
+SSE_KEEPALIVE_SECONDS = 15
+SSE_BATCH_SIZE = 200
+
+@app.get("/games/{game_id}/events", response_model=Dict[str, Any])
+async def get_game_events(game_id: str, cursor: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    if game_id not in games:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    game = games[game_id]
+    events, next_cursor = game.events.read(cursor, limit, visible=spectator_visible(game.finished))
+    
     return {
         "game_id": game_id,
-        "players": [
-            {
-                "player_id": player.player_id,
-                "role": player.role.name,
-                "alive": player.alive
-            } for player in game.players
-        ],
-        "current_phase": game.current_phase,
-        "current_round": game.current_round,
-        "game_log": game.game_log
+        "events": events,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor < game.events.last_seq,
+        "finished": game.finished
     }
 
-@app.get("/games/{game_id}/player/{player_id}", response_model=Dict[str, Any])
+@app.get("/games/{game_id}/events/stream")
+async def stream_game_events(game_id: str, request: Request, cursor: int = Query(0, ge=0)):
+    if game_id not in games:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    game = games[game_id]
+    # 浏览器 EventSource 断线重连时会带上最后收到的事件ID
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        cursor = int(last_event_id)
+    
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    
+    def on_event(event: dict):
+        # 事件可能由后台线程追加，切回事件循环再唤醒
+        loop.call_soon_threadsafe(wakeup.set)
+    
+    async def event_source():
+        nonlocal cursor
+        game.events.subscribe(on_event)
+        try:
+            while True:
+                wakeup.clear()
+                events, cursor = game.events.read(cursor, SSE_BATCH_SIZE, visible=spectator_visible(game.finished))
+                for event in events:
+                    payload = dumps_text(event)
+                    yield f"id: {event['seq']}\nevent: {event['kind']}\ndata: {payload}\n\n"
+                if cursor < game.events.last_seq:
+                    continue
+                if game.finished:
+                    break
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+        finally:
+            game.events.unsubscribe(on_event)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/games/{game_id}/replay", response_model=Dict[str, Any])
+async def get_game_replay(game_id: str):
+    if game_id not in games:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    game = games[game_id]
+    if not game.finished:
+        raise HTTPException(status_code=409, detail="游戏尚未结束，无法获取回放")
+    
+    return compact_replay(game_id, game.events)
+
+@app.get("/games/{game_id}/player/{player_id}", response_model=PlayerInfo, response_class=FastJSONResponse)
 async def get_player_info(game_id: str, player_id: int):
     if game_id not in games:
         raise HTTPException(status_code=404, detail="游戏不存在")
@@ -157,324 +504,246 @@ async def get_player_info(game_id: str, player_id: int):
     
     player = game.players[player_id]
     
-    # 过滤游戏日志，只返回玩家可见的信息
-    filtered_log = player.filter_receive_info(game.game_log)
-    
+    def build() -> bytes:
+        # 过滤游戏日志，只返回玩家可见的信息
+        filtered_log = player.filter_receive_info(game.game_log)
+        return dumps({
+            "player_id": player.player_id,
+            "role": player.role.name,
+            "alive": player.alive,
+            "checked_players": player.checked_players if player.role == Role.SEER else {},
+            "last_guarded": player.last_guarded if player.role == Role.GUARD else -1,
+            "game_log": filtered_log
+        })
+    
+    # 每个玩家看到的日志不同，按玩家分别缓存
+    with activity(game_id):
+        return FastJSONResponse(snapshots.get(game_id, game.events.last_seq, ("player", player_id), build))
+
+@app.post("/games/{game_id}/player/{player_id}/action", response_model=Dict[str, Any])
+async def player_action(game_id: str, player_id: int, action: PlayerAction,
+                        idempotency_key: Optional[str] = Header(None)):
+    return await submit_action(game_id, player_id, action, idempotency_key)
+
+@app.post("/actions/bulk", response_model=Dict[str, Any])
+async def bulk_actions(request: BulkActionRequest):
+    """一次提交多个玩家、多局游戏的操作；同一局内按提交顺序执行，不同局并发执行"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.actions)
+    by_game: Dict[str, List[int]] = {}
+    for index, item in enumerate(request.actions):
+        by_game.setdefault(item.game_id, []).append(index)
+    
+    async def run_game_actions(indices: List[int]):
+        for index in indices:
+            item = request.actions[index]
+            action = PlayerAction(action_type=item.action_type, target_id=item.target_id, content=item.content)
+            try:
+                result = await submit_action(item.game_id, item.player_id, action, item.idempotency_key)
+                results[index] = {"index": index, "ok": True, "status": 200, "result": result}
+            except HTTPException as e:
+                results[index] = {"index": index, "ok": False, "status": e.status_code, "detail": e.detail}
+    
+    await asyncio.gather(*(run_game_actions(indices) for indices in by_game.values()))
     return {
-        "player_id": player.player_id,
-        "role": player.role.name,
-        "alive": player.alive,
-        "checked_players": player.checked_players if player.role == Role.SEER else {},
-        "last_guarded": player.last_guarded if player.role == Role.GUARD else -1,
-        "game_log": filtered_log
+        "results": results,
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"])
     }
 
-@app.post("/games/{game_id}/player/{player_id}/action", response_model=Dict[str, Any])
-async def player_action(game_id: str, player_id: int, action: PlayerAction):
+async def submit_action(game_id: str, player_id: int, action: PlayerAction,
+                        idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """HTTP、WebSocket 和批量接口共用的操作入口，非法操作抛出 HTTPException"""
     if game_id not in games:
         raise HTTPException(status_code=404, detail="游戏不存在")
     
-    game = games[game_id]
-    
+    # 同一局的命令串行执行；带幂等键的重试直接返回第一次的结果
+    payload = {"player_id": player_id, **action.model_dump()}
+    async with game_commands.command(game_id):
+        cached = game_commands.lookup(game_id, idempotency_key, payload)
+        if cached is not None:
+            return cached
+        reject_if_finished(games[game_id])
+        result = apply_player_action(games[game_id], player_id, action)
+        game_commands.remember(game_id, idempotency_key, payload, result)
+        await maybe_auto_advance(game_id)
+    return result
+
+def reject_if_finished(game: GameManager):
+    """已结束的对局不再接受操作和阶段推进（结束时其幂等记录已释放，重试同样得到 409）"""
+    if game.finished:
+        raise HTTPException(status_code=409, detail="游戏已结束")
+
+def apply_player_action(game: GameManager, player_id: int, action: PlayerAction) -> Dict[str, Any]:
+    """校验并执行一次玩家操作（规则由 GameManager 的规则引擎统一判定），非法操作抛出 HTTPException"""
     if player_id < 0 or player_id >= len(game.players):
         raise HTTPException(status_code=404, detail="玩家不存在")
     
-    player = game.players[player_id]
-    
-    if not player.alive:
-        raise HTTPException(status_code=400, detail="玩家已死亡，无法执行操作")
-    
-    # 根据当前游戏阶段和玩家角色验证操作
-    if game.current_phase == "NIGHT":
-        if action.action_type == "guard" and player.role == Role.GUARD:
-            if action.target_id == player.last_guarded:
-                raise HTTPException(status_code=400, detail="不能连续两晚守护同一玩家")
-            # 处理守卫操作
-            night_key = f"night-{game.current_round}"
-            if night_key not in game.game_log:
-                game.game_log[night_key] = {
-                    "wolf_sayings": {},
-                    "wolf_vote": {},
-                    "seer_analysis": "",
-                    "seer_predict": {},
-                    "guard_analysis": "",
-                    "guard_protect": -1,
-                }
-            game.game_log[night_key]["guard_protect"] = action.target_id
-            player.last_guarded = action.target_id
-            return {"message": f"守卫成功保护玩家 {action.target_id}"}
-            
-        elif action.action_type == "seer" and player.role == Role.SEER:
-            # 处理预言家操作
-            target_id = action.target_id
-            if target_id < 0 or target_id >= len(game.players):
-                raise HTTPException(status_code=400, detail="目标玩家不存在")
-                
-            target_player = game.players[target_id]
-            role_set = "好人" if target_player.role in [Role.VILLAGER, Role.GUARD, Role.SEER] else "坏人"
-            
-            night_key = f"night-{game.current_round}"
-            if night_key not in game.game_log:
-                game.game_log[night_key] = {
-                    "wolf_sayings": {},
-                    "wolf_vote": {},
-                    "seer_analysis": "",
-                    "seer_predict": {},
-                    "guard_analysis": "",
-                    "guard_protect": -1,
-                }
-            
-            game.game_log[night_key]["seer_predict"][target_id] = role_set
-            player.checked_players[target_id] = role_set
-            
-            return {"message": f"预言家查验结果: 玩家 {target_id} 是 {role_set}"}
-            
-        elif action.action_type == "wolf" and player.role == Role.WOLF:
-            # 处理狼人操作
-            target_id = action.target_id
-            if target_id < 0 or target_id >= len(game.players):
-                raise HTTPException(status_code=400, detail="目标玩家不存在")
-                
-            night_key = f"night-{game.current_round}"
-            if night_key not in game.game_log:
-                game.game_log[night_key] = {
-                    "wolf_sayings": {},
-                    "wolf_vote": {},
-                    "seer_analysis": "",
-                    "seer_predict": {},
-                    "guard_analysis": "",
-                    "guard_protect": -1,
-                }
-            
-            # 记录狼人发言
-            if action.content:
-                game.game_log[night_key]["wolf_sayings"][player_id] = action.content
-            
-            # 记录狼人投票
-            if "wolf_vote" not in game.game_log[night_key]:
-                game.game_log[night_key]["wolf_vote"] = {}
-                
-            if target_id not in game.game_log[night_key]["wolf_vote"]:
-                game.game_log[night_key]["wolf_vote"][target_id] = []
-                
-            game.game_log[night_key]["wolf_vote"][target_id].append(player_id)
-            
-            return {"message": f"狼人选择了攻击目标: 玩家 {target_id}"}
-        else:
-            raise HTTPException(status_code=400, detail="当前阶段或角色不允许此操作")
-            
-    elif game.current_phase == "DAY":
-        if action.action_type == "speech":
-            # 处理白天发言
-            if not action.content:
-                raise HTTPException(status_code=400, detail="发言内容不能为空")
-                
-            day_key = f"day-{game.current_round}"
-            if day_key not in game.game_log:
-                game.game_log[day_key] = {
-                    "heard_sayings": {},
-                    "final_vote": {}
-                }
-                
-            game.game_log[day_key]["heard_sayings"][player_id] = action.content
-            
-            return {"message": "发言已记录"}
-        else:
-            raise HTTPException(status_code=400, detail="当前阶段不允许此操作")
-            
-    elif game.current_phase == "VOTING":
-        if action.action_type == "vote":
-            # 处理投票
-            target_id = action.target_id
-            if target_id != -1 and (target_id < 0 or target_id >= len(game.players)):
-                raise HTTPException(status_code=400, detail="目标玩家不存在")
-                
-            if target_id != -1 and not game.players[target_id].alive:
-                raise HTTPException(status_code=400, detail="不能投票给已死亡的玩家")
-                
-            day_key = f"day-{game.current_round}"
-            if day_key not in game.game_log:
-                game.game_log[day_key] = {
-                    "heard_sayings": {},
-                    "final_vote": {}
-                }
-                
-            if "final_vote" not in game.game_log[day_key]:
-                game.game_log[day_key]["final_vote"] = {}
-                
-            if target_id not in game.game_log[day_key]["final_vote"]:
-                game.game_log[day_key]["final_vote"][target_id] = []
-                
-            game.game_log[day_key]["final_vote"][target_id].append(player_id)
-            
-            return {"message": f"玩家 {player_id} 投票给了玩家 {target_id}"}
-        else:
-            raise HTTPException(status_code=400, detail="当前阶段不允许此操作")
-    else:
-        raise HTTPException(status_code=400, detail="未知游戏阶段")
+    # 弃权需要明确提交 -1，缺少目标不会被当作弃权
+    if action.target_id is None and action.action_type != "speech":
+        raise HTTPException(status_code=400, detail="缺少目标玩家")
+    try:
+        message = game.apply_action(player_id, action.action_type,
+                                    -1 if action.target_id is None else action.target_id, action.content)
+    except IllegalAction as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": message}
 
 @app.post("/games/{game_id}/next-phase", response_model=Dict[str, Any])
-async def advance_game_phase(game_id: str):
+async def advance_game_phase(game_id: str, idempotency_key: Optional[str] = Header(None)):
     if game_id not in games:
         raise HTTPException(status_code=404, detail="游戏不存在")
     
+    # 带幂等键时，重复点击或重试不会把游戏推进两次
+    payload = {"command": "next-phase"}
+    async with game_commands.command(game_id):
+        cached = game_commands.lookup(game_id, idempotency_key, payload)
+        if cached is not None:
+            return cached
+        reject_if_finished(games[game_id])
+        result = await advance_phase(game_id, reason="manual")
+        game_commands.remember(game_id, idempotency_key, payload, result)
+    return result
+
+async def advance_phase(game_id: str, reason: str) -> Dict[str, Any]:
+    """推进一个阶段并广播；reason 为 manual / all_actions_in / deadline。调用方需持有该局的命令锁"""
     game = games[game_id]
     
     # 保存当前阶段和轮次
     current_phase = game.current_phase
     current_round = game.current_round
     
-    # 根据当前阶段执行相应的处理
+    # 根据当前阶段执行相应的处理：夜晚结算后进入白天，白天发言后进入投票，投票结算后进入下一轮夜晚
     if current_phase == "NIGHT":
-        # 处理夜晚结束，进入白天
-        process_night_results(game)
-        game.current_phase = "DAY"
-    elif current_phase == "DAY":
-        # 白天发言结束，进入投票阶段
-        game.current_phase = "VOTING"
+        game.resolve_night()
     elif current_phase == "VOTING":
-        # 投票结束，处理投票结果，进入下一轮夜晚
-        process_voting_results(game)
-        game.current_phase = "NIGHT"
-        game.current_round += 1
+        game.resolve_voting()
+    game.next_phase()
     
     # 检查游戏是否结束
+    was_finished = game.finished
     game_ended = game.check_game_end()
+    winner = WINNER_NAMES[game.winner()] if game_ended else None
+    if game_ended and not was_finished and analytics is not None:
+        # 展开事件并可能写出分片，放到线程中执行，不阻塞事件循环
+        await asyncio.to_thread(analytics.export_game, game_id, game.events)
+    
+    # 自动推进的对局：为新阶段重新计时，结束后停止计时
+    deadline = None
+    if game_ended:
+        phase_timers.cancel(game_id)
+        auto_advance_games.pop(game_id, None)
+        chat_relay.forget(game_id)
+    elif game_id in auto_advance_games:
+        deadline = phase_timers.schedule(game_id, auto_advance_games[game_id][game.current_phase])
     
     # 广播游戏状态更新
     await manager.broadcast(game_id, {
         "type": "phase_change",
+        "reason": reason,
         "previous_phase": current_phase,
         "current_phase": game.current_phase,
         "current_round": game.current_round,
+        "deadline": deadline,
         "game_state": get_game_state(game),
-        "game_ended": game_ended
+        "game_ended": game_ended,
+        "winner": winner
     })
+    if game_ended:
+        # 结束后不会再有阶段消息，之后连接的客户端直接收到完整的最终状态
+        manager.release(game_id)
+        # 已结束的对局拒绝新的命令，不再需要命令锁、幂等记录和序列化缓存
+        game_commands.retire(game_id)
+        snapshots.invalidate(game_id)
     
     return {
         "previous_phase": current_phase,
         "current_phase": game.current_phase,
         "current_round": game.current_round,
+        "deadline": deadline,
         "game_ended": game_ended,
-        "winner": get_winner(game) if game_ended else None
+        "winner": winner
     }
 
-def process_night_results(game: GameManager):
-    """处理夜晚阶段的结果"""
-    night_key = f"night-{game.current_round}"
-    
-    # 确保夜晚记录存在
-    if night_key not in game.game_log:
-        game.game_log[night_key] = {
-            "wolf_sayings": {},
-            "wolf_vote": {},
-            "seer_analysis": "",
-            "seer_predict": {},
-            "guard_analysis": "",
-            "guard_protect": -1,
-            "death_log": []
-        }
-    
-    # 处理狼人投票
-    wolf_votes = game.game_log[night_key].get("wolf_vote", {})
-    
-    # 统计票数
-    vote_counts = {}
-    for target, voters in wolf_votes.items():
-        if target != -1:  # 忽略弃权
-            vote_counts[target] = len(voters)
-    
-    # 找出得票最多的玩家
-    wolf_target = -1
-    if vote_counts:
-        max_votes = max(vote_counts.values())
-        candidates = [pid for pid, count in vote_counts.items() if count == max_votes]
-        wolf_target = random.choice(candidates) if candidates else -1
-    
-    # 获取守卫保护的目标
-    guard_target = game.game_log[night_key].get("guard_protect", -1)
-    
-    # 处理夜间死亡
-    death_log = []
-    if wolf_target != -1 and wolf_target != guard_target:
-        # 狼人目标没有被守护，死亡
-        if wolf_target < len(game.players) and game.players[wolf_target].alive:
-            game.players[wolf_target].alive = False
-            death_log.append(wolf_target)
-    
-    game.game_log[night_key]["death_log"] = death_log
-    game._log_round_result()
-
-def process_voting_results(game: GameManager):
-    """处理投票阶段的结果"""
-    day_key = f"day-{game.current_round}"
-    
-    # 确保白天记录存在
-    if day_key not in game.game_log:
-        game.game_log[day_key] = {
-            "heard_sayings": {},
-            "final_vote": {},
-            "death_log": []
-        }
-    
-    # 处理投票
-    votes = game.game_log[day_key].get("final_vote", {})
-    
-    # 统计票数
-    vote_counts = {}
-    for target, voters in votes.items():
-        if target != -1:  # 忽略弃权
-            vote_counts[target] = len(voters)
-    
-    # 找出得票最多的玩家
-    exiled_player = -1
-    if vote_counts:
-        max_votes = max(vote_counts.values())
-        candidates = [pid for pid, count in vote_counts.items() if count == max_votes]
-        exiled_player = random.choice(candidates) if candidates else -1
-    
-    # 处理放逐
-    if exiled_player != -1:
-        if exiled_player < len(game.players) and game.players[exiled_player].alive:
-            game.players[exiled_player].alive = False
-            game.game_log[day_key]["death_log"] = [exiled_player]
-    else:
-        game.game_log[day_key]["death_log"] = []
-    
-    game._log_round_result()
+async def maybe_auto_advance(game_id: str):
+    """自动推进的对局在当前阶段所有必需行动都已提交时立即进入下一阶段（调用方需持有命令锁）"""
+    game = games.get(game_id)
+    if game is None or game_id not in auto_advance_games or game.finished:
+        return
+    if not game.pending_players():
+        await advance_phase(game_id, reason="all_actions_in")
+
+async def on_phase_deadline(game_id: str):
+    """阶段截止时间已到，不再等待未行动的玩家"""
+    async with game_commands.command(game_id):
+        # 等锁期间阶段可能已被手动推进并重新计时，此时这次超时作废
+        if phase_timers.deadline(game_id) is not None:
+            return
+        if game_id in games and game_id in auto_advance_games:
+            await advance_phase(game_id, reason="deadline")
+
+# 服务端阶段计时：单个后台任务管理所有对局的截止时间
+phase_timers = PhaseScheduler(on_phase_deadline)
+
+def players_state(game: GameManager) -> List[dict]:
+    return [
+        {
+            "player_id": player.player_id,
+            "role": player.role.name,
+            "alive": player.alive
+        } for player in game.players
+    ]
 
 def get_game_state(game: GameManager) -> dict:
     """获取当前游戏状态"""
     return {
-        "players": [
-            {
-                "player_id": player.player_id,
-                "role": player.role.name,
-                "alive": player.alive
-            } for player in game.players
-        ],
+        "players": players_state(game),
         "current_phase": game.current_phase,
         "current_round": game.current_round,
         "game_log": game.game_log
     }
 
-def get_winner(game: GameManager) -> str:
-    """获取游戏胜利方"""
-    werewolf_count = sum(1 for p in game.players if p.role == Role.WOLF and p.alive)
-    villager_count = sum(1 for p in game.players if p.role != Role.WOLF and p.alive)
-    god_count = sum(1 for p in game.players if (p.role == Role.SEER or p.role == Role.GUARD) and p.alive)
-    
-    if werewolf_count == 0:
-        return "好人阵营"
-    
-    if villager_count == 0 or god_count == 0:
-        return "狼人阵营"
-    
-    return "游戏尚未结束"
+# 接口返回的胜利方名称
+WINNER_NAMES = {Role.VILLAGER.name: "好人阵营", Role.WOLF.name: "狼人阵营"}
+
+# 管理接口
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """校验管理令牌，未配置 ADMIN_TOKEN 时管理接口不可用"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口未启用")
+    if x_admin_token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+@app.get("/admin/llm-scheduler", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def get_llm_scheduler_stats():
+    return get_scheduler().stats()
+
+# 按需采样分析：样本按当时正在处理的对局及其阶段归类
+profiler = SamplingProfiler(lambda game_id: games[game_id].current_phase if game_id in games else None)
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def run_profiler(seconds: float = Query(10.0, gt=0, le=MAX_DURATION),
+                       interval_ms: float = Query(5.0, ge=1, le=1000),
+                       top: int = Query(20, ge=1, le=200),
+                       format: str = Query("json", pattern="^(json|collapsed)$")):
+    """采样 seconds 秒后返回热点函数汇总；format=collapsed 时返回折叠栈文件，可直接生成火焰图"""
+    try:
+        result = await profiler.profile(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        filename = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        return PlainTextResponse(result.collapsed(), headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    return result.summary(top)
+
+@app.get("/admin/connections", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def get_connection_stats():
+    return {**manager.stats(), "chat": chat_relay.stats(), "commands": game_commands.stats()}
 
 # WebSocket连接
 @app.websocket("/ws/{game_id}/{player_id}")
-async def websocket_endpoint(websocket: WebSocket, game_id: str, player_id: int):
+async def websocket_endpoint(websocket: WebSocket, game_id: str, player_id: int,
+                             last_seq: Optional[int] = Query(None, ge=0),
+                             format: Optional[str] = Query(None)):
     if game_id not in games:
         await websocket.accept()
         await websocket.send_json({"error": "游戏不存在"})
@@ -489,35 +758,93 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_id: int)
         await websocket.close()
         return
     
-    await manager.connect(websocket, game_id, player_id)
+    # 下行编码：优先按子协议协商，其次 ?format=，默认 JSON
+    wire, subprotocol = negotiate(websocket.scope.get("subprotocols", []), format)
+    connection = await manager.connect(websocket, game_id, player_id, wire, subprotocol)
     
     try:
-        # 发送初始游戏状态
-        send_json = {
-            "type": "init",
-            "player_id": player_id,
-            "role": game.players[player_id].role.name,
-            "game_state": manager.filter_message_for_player({"game_state": get_game_state(game)}, player_id, game_id)["game_state"]
-        }
-        await websocket.send_json(send_json)
+        hello = wire.hello()
+        if hello is not None:
+            await connection.send(hello)
+        # 断线重连时只补发错过的消息，缓冲中已找不到缺失部分时退回发送完整状态
+        replayed = None
+        if last_seq is not None:
+            replayed = await manager.replay(connection, game_id, player_id, last_seq)
+        if replayed is not None:
+            await connection.send_message({
+                "type": "resumed",
+                "seq": manager.buffer(game_id).last_seq,
+                "replayed": replayed
+            })
+        else:
+            # 发送初始游戏状态
+            init_message = {
+                "type": "init",
+                "player_id": player_id,
+                "role": game.players[player_id].role.name,
+                "seq": manager.buffer(game_id).last_seq,
+                "game_state": get_game_state(game)
+            }
+            await connection.send(manager.encode_for_player(init_message, player_id, game_id, wire))
         
+        rate_limit_notice_until = 0.0
         while True:
-            data = await websocket.receive_text()
-            # 这里可以处理从客户端接收的消息
-            # 目前我们只是简单地广播消息
-            await manager.broadcast(game_id, {"type": "message", "player_id": player_id, "message": data})
+            try:
+                data = await websocket.receive_text()
+            except RuntimeError:
+                # 连接已被心跳回收或被同一玩家的新连接替换后关闭
+                break
+            message = parse_ws_message(data)
+            if message is None:
+                # 普通文本按聊天消息合并转发；被限流时提示一次，等待期间不再重复提示
+                retry_after = chat_relay.submit(game_id, player_id, data)
+                if retry_after is not None and time.monotonic() >= rate_limit_notice_until:
+                    rate_limit_notice_until = time.monotonic() + retry_after
+                    await connection.send_message({"type": "rate_limited", "retry_after": round(retry_after, 2)})
+                continue
+            
+            # 操作指令与 HTTP 接口走同一套校验和执行逻辑
+            try:
+                action = PlayerAction.model_validate(message.fields)
+                reply = action_reply(message, 200, await submit_action(game_id, player_id, action, message.idempotency_key))
+            except ValidationError as e:
+                detail = "操作格式错误: " + "; ".join(err["msg"] for err in e.errors())
+                reply = action_reply(message, 422, {"detail": detail})
+            except HTTPException as e:
+                reply = action_reply(message, e.status_code, {"detail": e.detail})
+            except Exception as e:
+                # 游戏逻辑中的意外错误只影响这一条操作，记录后回复 500，连接保持可用
+                print(f"对局 {game_id} 玩家 {player_id} 的操作处理失败: {e!r}")
+                reply = action_reply(message, 500, {"detail": "服务器内部错误"})
+            await connection.send_message(reply)
     except WebSocketDisconnect:
-        manager.disconnect(game_id, player_id)
+        pass
+    finally:
+        manager.disconnect(game_id, player_id, connection)
+
+# 静态文件启动时全部读入内存（预压缩 + ETag），文件修改后通过 /admin/static/reload 重新加载
+static_assets = StaticAssetCache("static")
 
-# 挂载静态文件
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# /static 下的资源允许浏览器缓存一小时；页面本身每次向服务端校验 ETag，保证更新立即生效
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+PAGE_CACHE_CONTROL = "no-cache"
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def get_static_asset(path: str, request: Request):
+    return static_assets.response(request, path, STATIC_CACHE_CONTROL)
 
 # 提供HTML页面
-@app.get("/play", response_class=HTMLResponse)
-async def get_game_page():
-    with open("static/index.html", encoding="utf-8") as f:
-        return f.read()
+@app.api_route("/play", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def get_game_page(request: Request):
+    return static_assets.response(request, "index.html", PAGE_CACHE_CONTROL)
+
+@app.post("/admin/static/reload", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def reload_static_assets():
+    return {"loaded": static_assets.reload()}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # permessage-deflate 由客户端在握手时协商，对所有下行编码都生效；
+    # 协议层 ping 超时未收到 pong 的连接由 uvicorn 关闭，接收循环随之退出并移除连接
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True,
+                ws_ping_interval=WS_PING_INTERVAL, ws_ping_timeout=WS_PING_TIMEOUT)
\ No newline at end of file
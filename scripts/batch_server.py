@@ -0,0 +1,213 @@
+# batch_server.py
+"""
+本地模拟的 OpenAI 兼容批量推理服务，用于离线测试批量模式（只依赖标准库）。
+
+实现 /v1/files 上传与下载、/v1/batches 创建与查询。任务创建后等待 --delay 秒完成，
+每条请求的回复按提示中的合法目标随机生成（与 LLM_BACKEND=offline 的决策方式相同）；
+--fail-rate 可让一部分请求失败，用于验证重试。
+
+用法:
+    python scripts/batch_server.py --port 8765 --delay 1
+    BATCH_BASE_URL=http://127.0.0.1:8765/v1 python -m logic.tournament --batch --games 200 --concurrency 100
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_TARGET_PATTERNS = (re.compile(r"可选目标: ([^，。]*)"), re.compile(r"只能从这些玩家中选择: ([^。]*)。"))
+_FACTION_PATTERN = re.compile(r"代表全体狼人（([^）]*)）")
+
+
+def _targets(prompt: str) -> List[int]:
+    for pattern in _TARGET_PATTERNS:
+        match = pattern.search(prompt)
+        if match:
+            return [int(t) for t in re.findall(r"-?\d+", match.group(1)) if int(t) != -1]
+    return []
+
+
+def answer(messages: List[Dict[str, str]], rng: random.Random) -> str:
+    """按提示中的操作类型生成一条格式正确的回复"""
+    prompt = "\n".join(m["content"] for m in messages if m["role"] == "user")
+    if "现在需要你进行发言" in prompt:
+        return "[批量模拟] 我觉得场上还需要更多信息，先听听大家的看法。"
+    candidates = _targets(prompt)
+    target = rng.choice(candidates) if candidates else -1
+    reply: Dict[str, Any] = {"thinking": f"[批量模拟] 选择了玩家 {target}", "target": target}
+    faction = _FACTION_PATTERN.search(prompt)
+    if faction:
+        reply["statements"] = {wid: f"[批量模拟] 同意刀杀玩家 {target}"
+                               for wid in re.findall(r"玩家(\d+)", faction.group(1))}
+    return json.dumps(reply, ensure_ascii=False)
+
+
+class BatchStore:
+    """内存中的文件与批量任务"""
+
+    def __init__(self, delay: float, fail_rate: float, seed: int):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def add_file(self, data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        with self.lock:
+            file_id = f"file-{next(self.ids)}"
+            meta = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                    "filename": filename, "purpose": purpose, "status": "processed"}
+            self.files[file_id] = {"meta": meta, "data": data}
+        return meta
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        with self.lock:
+            if input_file_id not in self.files:
+                raise KeyError(input_file_id)
+            batch_id = f"batch-{next(self.ids)}"
+            lines = self.files[input_file_id]["data"].decode("utf-8").splitlines()
+            now = int(time.time())
+            batch = {
+                "id": batch_id, "object": "batch", "endpoint": endpoint, "errors": None,
+                "input_file_id": input_file_id, "completion_window": completion_window,
+                "status": "in_progress", "output_file_id": None, "error_file_id": None,
+                "created_at": now, "in_progress_at": now, "completed_at": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            }
+            self.batches[batch_id] = batch
+        threading.Timer(self.delay, self._complete, args=(batch_id, lines)).start()
+        return batch
+
+    def _complete(self, batch_id: str, lines: List[str]):
+        outputs, errors = [], []
+        with self.lock:
+            rng_values = [(self.rng.random(), random.Random(self.rng.getrandbits(32))) for _ in lines]
+        for line, (roll, rng) in zip(lines, rng_values):
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            if roll < self.fail_rate:
+                errors.append({"id": f"resp-{custom_id}", "custom_id": custom_id, "response": None,
+                               "error": {"code": "server_error", "message": "模拟的请求失败"}})
+                continue
+            content = answer(request["body"]["messages"], rng)
+            outputs.append({"id": f"resp-{custom_id}", "custom_id": custom_id, "error": None, "response": {
+                "status_code": 200,
+                "body": {
+                    "id": f"chatcmpl-{custom_id}", "object": "chat.completion", "created": int(time.time()),
+                    "model": request["body"].get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                },
+            }})
+
+        def encode(rows):
+            return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+        output_file = self.add_file(encode(outputs), f"{batch_id}_output.jsonl", "batch_output") if outputs else None
+        error_file = self.add_file(encode(errors), f"{batch_id}_error.jsonl", "batch_output") if errors else None
+        with self.lock:
+            batch = self.batches[batch_id]
+            batch.update({
+                "status": "completed", "completed_at": int(time.time()),
+                "output_file_id": output_file["id"] if output_file else None,
+                "error_file_id": error_file["id"] if error_file else None,
+                "request_counts": {"total": len(lines), "completed": len(outputs), "failed": len(errors)},
+            })
+
+
+def _multipart(content_type: str, body: bytes) -> Tuple[Dict[str, str], Optional[Tuple[str, bytes]]]:
+    """解析 multipart/form-data，返回 (普通字段, (文件名, 文件内容))"""
+    message = BytesParser(policy=default_policy).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    fields, upload = {}, None
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True) or b""
+        if part.get_filename() is not None:
+            upload = (part.get_filename(), payload)
+        else:
+            fields[name] = payload.decode("utf-8")
+    return fields, upload
+
+
+def make_handler(store: BatchStore):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: Any, raw: bool = False):
+            body = payload if raw else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self):
+            self._send(404, {"error": {"message": f"{self.path} 不存在", "type": "invalid_request_error"}})
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_POST(self):
+            if self.path == "/v1/files":
+                fields, upload = _multipart(self.headers.get("Content-Type", ""), self._body())
+                if upload is None:
+                    return self._send(400, {"error": {"message": "缺少文件", "type": "invalid_request_error"}})
+                return self._send(200, store.add_file(upload[1], upload[0], fields.get("purpose", "batch")))
+            if self.path == "/v1/batches":
+                request = json.loads(self._body() or b"{}")
+                try:
+                    batch = store.create_batch(request["input_file_id"], request.get("endpoint", ""),
+                                               request.get("completion_window", "24h"))
+                except KeyError:
+                    return self._not_found()
+                return self._send(200, batch)
+            self._not_found()
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            with store.lock:
+                if len(parts) == 3 and parts[:2] == ["v1", "batches"] and parts[2] in store.batches:
+                    payload = dict(store.batches[parts[2]])
+                    return self._send(200, payload)
+                if len(parts) == 3 and parts[:2] == ["v1", "files"] and parts[2] in store.files:
+                    return self._send(200, store.files[parts[2]]["meta"])
+                if len(parts) == 4 and parts[:2] == ["v1", "files"] and parts[3] == "content" \
+                        and parts[2] in store.files:
+                    return self._send(200, store.files[parts[2]]["data"], raw=True)
+            self._not_found()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容批量推理服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=1.0, help="每个批量任务完成所需的秒数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="单条请求失败的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = BatchStore(args.delay, args.fail_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    print(f"批量推理模拟服务: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
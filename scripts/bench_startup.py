@@ -0,0 +1,90 @@
+# bench_startup.py
+"""
+冷启动基准：在全新的子进程中测量导入 main（即 worker 启动）和创建第一局游戏的耗时。
+
+用法:
+    python scripts/bench_startup.py --runs 20
+    python scripts/bench_startup.py --module logic.gamemanager --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程内执行的测量代码，结果以一行 JSON 输出
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+from logic.gamemanager import GameManager
+GameManager(verbose=False)
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_game_ms": (t2 - t1) * 1000,
+                  "dashscope_loaded": "dashscope" in sys.modules}}))
+"""
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_once(module: str, env: dict) -> dict:
+    """启动一个全新解释器测量一次"""
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def show_importtime(module: str, env: dict, top: int = 15):
+    """打印 -X importtime 中自身耗时最多的模块"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    print(f"\n自身导入耗时最多的 {top} 个模块:")
+    for self_us, cumulative_us, name in rows[:top]:
+        print(f"  {self_us / 1000:8.2f} ms (累计 {cumulative_us / 1000:8.2f} ms)  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 worker 冷启动耗时")
+    parser.add_argument("--runs", type=int, default=10, help="子进程重复次数")
+    parser.add_argument("--module", default="main", help="要导入的入口模块")
+    parser.add_argument("--backend", default="offline", help="LLM_BACKEND 取值")
+    parser.add_argument("--importtime", action="store_true", help="额外输出 -X importtime 明细")
+    args = parser.parse_args()
+
+    env = dict(os.environ, LLM_BACKEND=args.backend)
+    # 离线模式下不应需要真实的 API Key
+    if args.backend == "offline":
+        env.pop("DASHSCOPE_API_KEY", None)
+
+    samples = [run_once(args.module, env) for _ in range(args.runs)]
+    for field in ("import_ms", "first_game_ms"):
+        values = [s[field] for s in samples]
+        print(f"{field:>14}: min {min(values):7.1f}  median {statistics.median(values):7.1f}  "
+              f"p95 {_percentile(values, 95):7.1f}  (ms, n={len(values)})")
+    print(f"dashscope 是否在启动时被导入: {any(s['dashscope_loaded'] for s in samples)}")
+
+    if args.importtime:
+        show_importtime(args.module, env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# loadgen.py
+"""
+端到端压测：模拟真人玩家通过 HTTP 和 WebSocket 玩完整局游戏。
+
+每局为所有座位各打开一个 /ws/{game_id}/{player_id} 连接（应答心跳、偶尔聊天），
+各玩家在思考时间后通过 /games/{id}/player/{pid}/action 提交当前阶段的合法操作，
+由每局的主持协程调用 /next-phase 推进。结束后输出各接口的延迟分位数、错误率，
+以及从发出 next-phase 到各连接收到 phase_change 的推送延迟。
+
+用法:
+    python scripts/loadgen.py --spawn --games 200 --concurrency 50
+    python scripts/loadgen.py --url http://127.0.0.1:8000 --games 20 --think 200,1500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Metrics:
+    """按接口记录延迟与错误，另记 WebSocket 推送延迟"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: List[str] = []
+        self.delivery_lag: List[float] = []
+        self.ws_messages = 0
+        self.ws_errors = 0
+        self.games_finished = 0
+        self.games_failed = 0
+
+    def record(self, label: str, seconds: float, ok: bool, detail: str = ""):
+        self.latencies.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(f"{label}: {detail}")
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            errors = self.errors.get(label, 0)
+            endpoints[label] = {
+                "requests": len(values),
+                "error_rate": round(errors / len(values), 4),
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p90_ms": round(_percentile(values, 90) * 1000, 2),
+                "p99_ms": round(_percentile(values, 99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        lag = self.delivery_lag
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "games_finished": self.games_finished,
+            "games_failed": self.games_failed,
+            "requests": total,
+            "requests_per_s": round(total / elapsed, 1) if elapsed else None,
+            "endpoints": endpoints,
+            "ws_messages": self.ws_messages,
+            "ws_errors": self.ws_errors,
+            "delivery_lag_ms": {
+                "samples": len(lag),
+                "p50": round(_percentile(lag, 50) * 1000, 2),
+                "p90": round(_percentile(lag, 90) * 1000, 2),
+                "p99": round(_percentile(lag, 99) * 1000, 2),
+                "max": round(max(lag) * 1000, 2),
+            } if lag else None,
+            "error_samples": self.error_samples,
+        }
+
+
+class SimulatedGame:
+    """一局游戏：主持协程推进阶段，每个座位一个 WebSocket 读协程"""
+
+    def __init__(self, client: httpx.AsyncClient, ws_url: str, metrics: Metrics, args: argparse.Namespace,
+                 rng: random.Random):
+        self.client = client
+        self.ws_url = ws_url
+        self.metrics = metrics
+        self.args = args
+        self.rng = rng
+        self.game_id: Optional[str] = None
+        self.roles: Dict[int, str] = {}
+        self.last_guarded = -1
+        self.checked: set = set()
+        # (轮次, 阶段) -> 发出 next-phase 的时刻，用于计算推送延迟
+        self.phase_sent: Dict[Tuple[int, str], float] = {}
+
+    async def request(self, label: str, method: str, path: str, **kwargs) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.metrics.record(label, time.perf_counter() - started, False, repr(e))
+            return None
+        ok = response.status_code < 400
+        self.metrics.record(label, time.perf_counter() - started, ok, f"{response.status_code} {response.text[:200]}")
+        return response.json() if ok else None
+
+    async def think(self):
+        low, high = self.args.think
+        await asyncio.sleep(self.rng.uniform(low, high) / 1000)
+
+    async def play(self):
+        created = await self.request("POST /games", "POST", "/games", json={})
+        if created is None:
+            self.metrics.games_failed += 1
+            return
+        self.game_id = created["game_id"]
+        self.roles = {p["player_id"]: p["role"] for p in created["players"]}
+
+        readers = []
+        sockets = []
+        if not self.args.no_ws:
+            for player_id in self.roles:
+                try:
+                    ws = await websockets.connect(f"{self.ws_url}/ws/{self.game_id}/{player_id}", max_size=None)
+                except Exception as e:
+                    self.metrics.ws_errors += 1
+                    self.metrics.record("WS connect", 0.0, False, repr(e))
+                    continue
+                sockets.append(ws)
+                readers.append(asyncio.create_task(self.read(ws, player_id)))
+        try:
+            finished = await self.drive(sockets)
+            if finished:
+                self.metrics.games_finished += 1
+            else:
+                self.metrics.games_failed += 1
+        finally:
+            for ws in sockets:
+                await ws.close()
+            for task in readers:
+                task.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+    async def read(self, ws, player_id: int):
+        try:
+            async for text in ws:
+                received = time.perf_counter()
+                self.metrics.ws_messages += 1
+                data = json.loads(text)
+                if data.get("type") == "phase_change":
+                    sent = self.phase_sent.get((data["current_round"], data["current_phase"]))
+                    if sent is not None:
+                        self.metrics.delivery_lag.append(received - sent)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            self.metrics.ws_errors += 1
+
+    async def drive(self, sockets) -> bool:
+        for _ in range(self.args.max_rounds * 3):
+            state = await self.request("GET /games/{id}", "GET", f"/games/{self.game_id}",
+                                       params={"include_log": "false"})
+            if state is None:
+                return False
+            alive = [p["player_id"] for p in state["players"] if p["alive"]]
+            phase = state["current_phase"]
+            await asyncio.gather(*(self.act(pid, phase, alive) for pid in alive))
+            if sockets and self.rng.random() < self.args.chat_rate:
+                await self.rng.choice(sockets).send(f"压测聊天 {self.rng.randrange(1000)}")
+
+            next_phase, next_round = {"NIGHT": ("DAY", 0), "DAY": ("VOTING", 0), "VOTING": ("NIGHT", 1)}[phase]
+            self.phase_sent[(state["current_round"] + next_round, next_phase)] = time.perf_counter()
+            result = await self.request("POST /next-phase", "POST", f"/games/{self.game_id}/next-phase")
+            if result is None:
+                return False
+            if result["game_ended"]:
+                # 给推送留一点时间到达，再关闭连接
+                await asyncio.sleep(0.05)
+                return True
+        return True
+
+    async def act(self, player_id: int, phase: str, alive: List[int]):
+        """按阶段和角色提交一个合法操作；没有需要做的操作时直接返回"""
+        role = self.roles[player_id]
+        others = [pid for pid in alive if pid != player_id]
+        action = None
+        if phase == "NIGHT":
+            if role == "WOLF":
+                targets = [pid for pid in alive if self.roles[pid] != "WOLF"]
+                action = {"action_type": "wolf", "target_id": self.rng.choice(targets), "content": "刀这个"}
+            elif role == "SEER":
+                # 不能重复查验同一玩家
+                targets = [pid for pid in others if pid not in self.checked]
+                if targets:
+                    target = self.rng.choice(targets)
+                    self.checked.add(target)
+                    action = {"action_type": "seer", "target_id": target}
+            elif role == "GUARD":
+                targets = [pid for pid in alive if pid != self.last_guarded]
+                target = self.rng.choice(targets)
+                self.last_guarded = target
+                action = {"action_type": "guard", "target_id": target}
+        elif phase == "DAY":
+            action = {"action_type": "speech", "content": f"我是玩家{player_id}，我觉得大家都很可疑。"}
+        elif phase == "VOTING" and others:
+            action = {"action_type": "vote", "target_id": self.rng.choice(others)}
+        if action is None:
+            return
+        await self.think()
+        await self.request("POST /action", "POST", f"/games/{self.game_id}/player/{player_id}/action", json=action)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """在子进程中以离线后端启动服务，等待其可以接受请求"""
+    env = dict(os.environ, LLM_BACKEND="offline")
+    env.pop("DASHSCOPE_API_KEY", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"服务启动失败，退出码 {proc.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("等待服务启动超时")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    metrics = Metrics()
+    ws_url = "ws" + args.url[len("http"):]
+    limits = httpx.Limits(max_connections=args.concurrency * 6, max_keepalive_connections=args.concurrency * 6)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        async def one(index: int):
+            async with semaphore:
+                await SimulatedGame(client, ws_url, metrics, args, random.Random(args.seed + index)).play()
+
+        await asyncio.gather(*(one(i) for i in range(args.games)))
+    return metrics.summary(time.perf_counter() - started)
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"完成 {summary['games_finished']} 局，失败 {summary['games_failed']} 局，用时 {summary['elapsed_s']}s，"
+          f"{summary['requests']} 个请求（{summary['requests_per_s']} 请求/秒）")
+    print(f"{'接口':<22}{'请求数':>8}{'错误率':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for label, entry in summary["endpoints"].items():
+        print(f"{label:<22}{entry['requests']:>8}{entry['error_rate']:>9.2%}{entry['p50_ms']:>9}"
+              f"{entry['p90_ms']:>9}{entry['p99_ms']:>9}{entry['max_ms']:>9}")
+    print(f"WebSocket: 收到 {summary['ws_messages']} 条消息，错误 {summary['ws_errors']} 次")
+    lag = summary["delivery_lag_ms"]
+    if lag:
+        print(f"阶段推送延迟: p50 {lag['p50']} ms  p90 {lag['p90']} ms  p99 {lag['p99']} ms  "
+              f"max {lag['max']} ms  (n={lag['samples']})")
+    for sample in summary["error_samples"]:
+        print(f"  错误示例: {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟真人玩家的 HTTP + WebSocket 端到端压测")
+    parser.add_argument("--url", default=None, help="服务地址，默认 http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="在本机以离线后端启动一个服务进程并对其压测")
+    parser.add_argument("--games", type=int, default=50, help="总局数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时进行的局数")
+    parser.add_argument("--think", default="50,300", help="玩家思考时间范围（毫秒），如 200,1500")
+    parser.add_argument("--max-rounds", type=int, default=20, help="每局最多轮数")
+    parser.add_argument("--chat-rate", type=float, default=0.3, help="每个阶段发送一条聊天的概率")
+    parser.add_argument("--no-ws", action="store_true", help="只压测 HTTP，不打开 WebSocket")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个 HTTP 请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="把汇总结果写入该 JSON 文件")
+    args = parser.parse_args()
+    args.think = tuple(float(x) for x in args.think.split(","))
+    if len(args.think) == 1:
+        args.think = (args.think[0], args.think[0])
+
+    server = None
+    if args.spawn:
+        port = _free_port()
+        server = spawn_server(port)
+        args.url = f"http://127.0.0.1:{port}"
+    args.url = (args.url or "http://127.0.0.1:8000").rstrip("/")
+
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print_summary(summary)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# action_protocol.py
+import json
+from typing import Any, Dict, Optional
+
+# 紧凑协议中的操作类型缩写
+ACTION_CODES = {
+    "v": "vote",
+    "g": "guard",
+    "s": "seer",
+    "w": "wolf",
+    "p": "speech",
+}
+
+
+class ActionMessage:
+    """从 WebSocket 收到的一条操作指令"""
+    __slots__ = ("fields", "idempotency_key", "request_id", "compact")
+
+    def __init__(self, fields: Dict[str, Any], idempotency_key: Optional[str], request_id: Any, compact: bool):
+        self.fields = fields
+        self.idempotency_key = idempotency_key
+        self.request_id = request_id
+        self.compact = compact
+
+
+def parse_ws_message(text: str) -> Optional[ActionMessage]:
+    """
+    解析客户端发来的文本帧。支持两种写法，其余内容（包括普通文本）返回 None 按聊天消息处理：
+    - 完整格式: {"type": "action", "action_type": "vote", "target_id": 2, "content": null,
+                 "idempotency_key": "...", "id": 客户端请求ID}
+    - 紧凑格式: {"op": "act", "a": "v", "t": 2, "c": null, "k": "...", "i": 客户端请求ID}
+    """
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    if data.get("op") == "act":
+        action_type = data.get("a")
+        fields = {
+            "action_type": ACTION_CODES.get(action_type, action_type),
+            "target_id": data.get("t"),
+            "content": data.get("c"),
+        }
+        return ActionMessage(fields, data.get("k"), data.get("i"), compact=True)
+
+    if data.get("type") == "action":
+        fields = {key: data.get(key) for key in ("action_type", "target_id", "content")}
+        return ActionMessage(fields, data.get("idempotency_key"), data.get("id"), compact=False)
+
+    return None
+
+
+def action_reply(message: ActionMessage, status: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """操作结果回执，格式与请求保持一致"""
+    ok = status < 400
+    if message.compact:
+        reply = {"op": "ack", "i": message.request_id, "ok": int(ok)}
+        reply["r" if ok else "e"] = body if ok else body.get("detail")
+        if not ok:
+            reply["s"] = status
+        return reply
+    reply = {"type": "action_result", "id": message.request_id, "ok": ok, "status": status}
+    reply["result" if ok else "detail"] = body if ok else body.get("detail")
+    return reply
@@ -0,0 +1,124 @@
+# chat_relay.py
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+# 每名玩家每秒可发送的聊天条数与允许的突发条数
+CHAT_RATE = 2.0
+CHAT_BURST = 5
+
+# 合并窗口（秒）：同一局在一个窗口内的聊天合并为一帧广播
+CHAT_TICK = 0.25
+
+# 每局待发送聊天的上限，超出时丢弃最早的消息
+MAX_PENDING_PER_GAME = 64
+
+# 单条聊天的最大字符数，超出部分截断
+MAX_MESSAGE_CHARS = 500
+
+
+class TokenBucket:
+    """令牌桶限流：按 rate 匀速补充令牌，最多积累 burst 个"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float = CHAT_RATE, burst: int = CHAT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class ChatRelay:
+    """
+    聊天转发：每名玩家一个令牌桶，通过限流的消息进入所在对局的有界缓冲，
+    由单个后台任务每 CHAT_TICK 秒把各局缓冲合并成一条 {"type": "messages"} 广播。
+    无论客户端发得多快，每局每个窗口最多向每个连接发送一帧，且该帧只编码一次。
+    """
+
+    def __init__(self, broadcast: Callable[[str, dict], Awaitable[None]], tick: float = CHAT_TICK,
+                 max_pending: int = MAX_PENDING_PER_GAME):
+        self._broadcast = broadcast
+        self.tick = tick
+        self.max_pending = max_pending
+        self._pending: Dict[str, Deque[dict]] = {}
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.frames = 0
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, game_id: str, player_id: int, text: str) -> Optional[float]:
+        """接收一条聊天；被限流时返回建议的重试等待秒数，否则返回 None"""
+        self._ensure_running()
+        bucket = self._buckets.get((game_id, player_id))
+        if bucket is None:
+            bucket = self._buckets[(game_id, player_id)] = TokenBucket()
+        if not bucket.take():
+            self.rate_limited += 1
+            return bucket.retry_after()
+
+        pending = self._pending.get(game_id)
+        if pending is None:
+            pending = self._pending[game_id] = deque(maxlen=self.max_pending)
+        if len(pending) == self.max_pending:
+            self.dropped += 1
+        pending.append({"player_id": player_id, "message": text[:MAX_MESSAGE_CHARS]})
+        self.accepted += 1
+        self._wakeup.set()
+        return None
+
+    def forget(self, game_id: str):
+        """对局结束后释放限流状态"""
+        self._pending.pop(game_id, None)
+        for key in [key for key in self._buckets if key[0] == game_id]:
+            del self._buckets[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "frames": self.frames,
+            "pending": sum(len(p) for p in self._pending.values()),
+        }
+
+    async def flush(self):
+        batches: List[Tuple[str, List[dict]]] = []
+        for game_id in list(self._pending):
+            messages = list(self._pending.pop(game_id))
+            if messages:
+                batches.append((game_id, messages))
+        for game_id, messages in batches:
+            self.frames += 1
+            try:
+                await self._broadcast(game_id, {"type": "messages", "messages": messages})
+            except Exception as e:
+                print(f"对局 {game_id} 聊天转发失败: {e}")
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 等一个窗口，让这段时间内的聊天合并到同一帧
+            await asyncio.sleep(self.tick)
+            self._wakeup.clear()
+            await self.flush()
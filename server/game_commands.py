@@ -0,0 +1,90 @@
+# game_commands.py
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from server.profiler import activity
+
+
+class GameCommandGuard:
+    """
+    按局串行化命令：每局一把 asyncio 锁（先到先得的 FIFO 队列），同一局的操作、阶段推进、
+    超时推进和后台 AI 决策的落库都在锁内一次性完成，不同局之间互不阻塞。
+    同时为每局保存有限数量的幂等键，重试的请求直接返回第一次的结果。
+    对局结束后调用 retire，该局正在执行和排队的命令都完成后释放锁和幂等记录。
+    """
+
+    def __init__(self, max_keys_per_game: int = 1024):
+        self.max_keys_per_game = max_keys_per_game
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._results: Dict[str, "OrderedDict[str, Tuple[str, Dict[str, Any]]]"] = {}
+        # 每局正在执行或等待锁的命令数
+        self._active: Dict[str, int] = {}
+        self._retired: Set[str] = set()
+
+    def lock(self, game_id: str) -> asyncio.Lock:
+        if game_id not in self._locks:
+            self._locks[game_id] = asyncio.Lock()
+        return self._locks[game_id]
+
+    @asynccontextmanager
+    async def command(self, game_id: str):
+        """async with guard.command(game_id): 块内对该局的读写是原子的"""
+        lock = self.lock(game_id)
+        self._active[game_id] = self._active.get(game_id, 0) + 1
+        try:
+            async with lock:
+                # 采样分析时把锁内的样本归属到该局
+                with activity(game_id):
+                    yield
+        finally:
+            self._active[game_id] -= 1
+            if not self._active[game_id]:
+                del self._active[game_id]
+                if game_id in self._retired:
+                    self.forget(game_id)
+
+    def lookup(self, game_id: str, key: Optional[str], payload: Any) -> Optional[Dict[str, Any]]:
+        """幂等键已处理过时返回当时的结果；同一个键对应不同请求内容时报 409"""
+        if not key:
+            return None
+        entry = self._results.get(game_id, {}).get(key)
+        if entry is None:
+            return None
+        fingerprint, result = entry
+        if fingerprint != _fingerprint(payload):
+            raise HTTPException(status_code=409, detail="幂等键已用于另一个不同的请求")
+        return result
+
+    def remember(self, game_id: str, key: Optional[str], payload: Any, result: Dict[str, Any]):
+        if not key:
+            return
+        results = self._results.setdefault(game_id, OrderedDict())
+        results[key] = (_fingerprint(payload), result)
+        while len(results) > self.max_keys_per_game:
+            results.popitem(last=False)
+
+    def retire(self, game_id: str):
+        """对局已结束：没有命令在执行或排队时立即释放，否则等最后一个命令完成后释放"""
+        if game_id in self._active:
+            self._retired.add(game_id)
+        else:
+            self.forget(game_id)
+
+    def forget(self, game_id: str):
+        """释放对局的锁和幂等记录"""
+        self._locks.pop(game_id, None)
+        self._results.pop(game_id, None)
+        self._retired.discard(game_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"locks": len(self._locks), "idempotency_games": len(self._results)}
+
+
+def _fingerprint(payload: Any) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
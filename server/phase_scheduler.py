@@ -0,0 +1,79 @@
+# phase_scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class PhaseScheduler:
+    """
+    阶段截止时间调度器：所有对局的截止时间放在一个最小堆里，由单个后台任务等待最早的那个。
+    重新设置或取消某局的计时只需更新它的版本号，堆中旧条目在弹出时被丢弃（惰性删除），
+    因此上千局同时进行时每次操作也只是 O(log n)。
+    """
+
+    def __init__(self, on_deadline: Callable[[str], Awaitable[None]]):
+        self._on_deadline = on_deadline
+        self._heap: List[Tuple[float, int, str]] = []
+        self._versions: Dict[str, int] = {}
+        # 版本号全局递增：取消后重新计时的对局不会与堆中残留的旧条目撞号
+        self._version_seq = itertools.count(1)
+        self._deadlines: Dict[str, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def schedule(self, game_id: str, delay: float) -> float:
+        """设置（或重置）某局的截止时间，返回截止时刻的 Unix 时间戳"""
+        self._ensure_running()
+        version = next(self._version_seq)
+        self._versions[game_id] = version
+        deadline = time.monotonic() + delay
+        self._deadlines[game_id] = deadline
+        heapq.heappush(self._heap, (deadline, version, game_id))
+        if self._heap[0][2] == game_id:
+            # 新的截止时间最早，叫醒后台任务重新计算等待时长
+            self._wakeup.set()
+        return time.time() + delay
+
+    def cancel(self, game_id: str):
+        self._versions.pop(game_id, None)
+        self._deadlines.pop(game_id, None)
+
+    def deadline(self, game_id: str) -> Optional[float]:
+        """某局当前截止时刻的 Unix 时间戳，没有计时时返回 None"""
+        deadline = self._deadlines.get(game_id)
+        if deadline is None:
+            return None
+        return time.time() + (deadline - time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, version, game_id = heapq.heappop(self._heap)
+                if self._versions.get(game_id) != version:
+                    continue  # 已被重置或取消
+                self.cancel(game_id)
+                asyncio.get_running_loop().create_task(self._fire(game_id))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, game_id: str):
+        try:
+            await self._on_deadline(game_id)
+        except Exception as e:
+            print(f"对局 {game_id} 超时推进失败: {e}")
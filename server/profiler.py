@@ -0,0 +1,192 @@
+# profiler.py
+"""
+按需采样分析器：在运行中的进程里临时开启，结束后自动停止，无需重启服务。
+
+- 后台线程按固定间隔读取 sys._current_frames()，记录每个线程的调用栈
+- 事件循环线程的样本标注当时正在执行的对局与阶段（通过 activity() 设置的上下文变量）
+- 同时在事件循环中测量调度延迟（sleep 超出预期的时长）
+- 输出折叠栈文本（flamegraph.pl / speedscope 可直接读取）和按自身/累计样本排序的热点函数
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 单次采样的最长时长（秒），避免忘记停止的分析拖慢服务
+MAX_DURATION = 60.0
+
+# 栈顶为这些帧的样本视为空闲（事件循环等待 IO、线程池等待任务），不计入热点排名
+IDLE_FRAMES = ("select (selectors.py", "wait (threading.py", "_worker (thread.py", "get (queue.py")
+
+# 正在处理的对局：事件循环线程上的样本据此归属到对局与阶段
+ACTIVITY: contextvars.ContextVar = contextvars.ContextVar("profiler_activity", default=None)
+
+
+@contextmanager
+def activity(game_id: str):
+    """标记当前任务正在处理某局，异步代码中同样有效（上下文变量随任务传递）"""
+    token = ACTIVITY.set(game_id)
+    try:
+        yield
+    finally:
+        ACTIVITY.reset(token)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileResult:
+    """一次采样的结果"""
+
+    def __init__(self, duration: float, interval: float, stacks: Counter, activities: Counter,
+                 loop_lags: List[float], samples: int):
+        self.duration = duration
+        self.interval = interval
+        self.stacks = stacks
+        self.activities = activities
+        self.loop_lags = loop_lags
+        self.samples = samples
+
+    def collapsed(self) -> str:
+        """折叠栈格式：每行 "根;...;叶 样本数" """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """非空闲样本中自身样本（栈顶）与累计样本（出现在栈中）最多的 n 个函数"""
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            if frames[-1].startswith(IDLE_FRAMES):
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames[1:]):  # 第一层为线程/阶段标签
+                inclusive[frame] += count
+        total = sum(own.values()) or 1
+        return {
+            "self": [{"frame": f, "samples": c, "pct": round(c / total * 100, 2)} for f, c in own.most_common(n)],
+            "inclusive": [{"frame": f, "samples": c, "pct": round(c / total * 100, 2)}
+                          for f, c in inclusive.most_common(n)],
+        }
+
+    def busy_samples(self) -> int:
+        return sum(c for stack, c in self.stacks.items() if not stack.rsplit(";", 1)[-1].startswith(IDLE_FRAMES))
+
+    def summary(self, n: int = 20) -> Dict[str, Any]:
+        lags = sorted(self.loop_lags)
+
+        def pct(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(p / 100 * (len(lags) - 1) + 0.5))] * 1000, 3)
+
+        return {
+            "duration_s": round(self.duration, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "busy_thread_samples": self.busy_samples(),
+            "loop_lag_ms": {"samples": len(lags), "p50": pct(50), "p99": pct(99), "max": pct(100)},
+            "activities": [{"game_id": game_id, "phase": phase, "samples": count}
+                           for (game_id, phase), count in self.activities.most_common(n)],
+            "top": self.top(n),
+        }
+
+
+class SamplingProfiler:
+    """
+    同一时刻只允许一次采样。phase_of 用于把对局 ID 解析为当前阶段，
+    在采样线程中调用，只应做简单的属性读取。
+    """
+
+    def __init__(self, phase_of: Optional[Callable[[str], Optional[str]]] = None):
+        self.phase_of = phase_of
+        self._lock = threading.Lock()
+        self.running = False
+
+    async def profile(self, duration: float, interval: float = 0.005) -> ProfileResult:
+        duration = min(max(duration, 0.1), MAX_DURATION)
+        interval = max(interval, 0.001)
+        with self._lock:
+            if self.running:
+                raise RuntimeError("已有采样正在进行")
+            self.running = True
+        try:
+            loop = asyncio.get_running_loop()
+            stop = threading.Event()
+            state = {"stacks": Counter(), "activities": Counter(), "samples": 0}
+            sampler = threading.Thread(target=self._sample, name="profiler",
+                                       args=(loop, threading.get_ident(), interval, stop, state), daemon=True)
+            started = time.perf_counter()
+            sampler.start()
+            lags = await self._measure_loop_lag(duration, interval)
+            stop.set()
+            # 不占用线程池等待采样线程退出，避免把等待本身计入样本
+            while sampler.is_alive():
+                await asyncio.sleep(interval)
+            return ProfileResult(time.perf_counter() - started, interval, state["stacks"], state["activities"],
+                                 lags, state["samples"])
+        finally:
+            self.running = False
+
+    async def _measure_loop_lag(self, duration: float, interval: float) -> List[float]:
+        """事件循环调度延迟：每次 sleep 实际醒来的时间比预期晚了多少"""
+        lags = []
+        tick = max(interval * 2, 0.01)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            expected = time.perf_counter() + tick
+            await asyncio.sleep(tick)
+            lags.append(max(0.0, time.perf_counter() - expected))
+        return lags
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, loop_thread: int, interval: float,
+                stop: threading.Event, state: Dict[str, Any]):
+        own = threading.get_ident()
+        names = {}
+        stacks: Counter = state["stacks"]
+        activities: Counter = state["activities"]
+        while not stop.wait(interval):
+            state["samples"] += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.reverse()
+
+                root = names.get(thread_id, f"thread-{thread_id}")
+                if thread_id == loop_thread:
+                    game_id, phase = self._current_activity(loop)
+                    root = f"event-loop[{phase}]" if phase else "event-loop"
+                    if game_id is not None:
+                        activities[(game_id, phase)] += 1
+                stacks[";".join([root, *labels])] += 1
+
+    def _current_activity(self, loop: asyncio.AbstractEventLoop) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            task = asyncio.current_task(loop)
+        except RuntimeError:
+            return None, None
+        if task is None:
+            return None, None
+        game_id = task.get_context().get(ACTIVITY)
+        if game_id is None:
+            return None, None
+        phase = None
+        if self.phase_of is not None:
+            try:
+                phase = self.phase_of(game_id)
+            except Exception:
+                phase = None
+        return game_id, phase
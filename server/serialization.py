@@ -0,0 +1,95 @@
+# serialization.py
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，缺失时退回标准库
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """把游戏状态编码为 UTF-8 JSON 字节；game_log 中的整数键会被转成字符串"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_text(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """直接输出预编码的 JSON，跳过 jsonable_encoder 和响应模型校验"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+
+class SnapshotCache:
+    """
+    按 (对局, 版本, 可见性类别) 缓存序列化结果。对局版本变化后旧版本的缓存整体失效，
+    因此对未变化对局的重复读取只需一次字典查找。
+    """
+
+    def __init__(self, max_games: int = 1024):
+        self.max_games = max_games
+        self._entries: "OrderedDict[str, Tuple[int, Dict[Hashable, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, game_id: str, version: int, visibility: Hashable, build: Callable[[], Any]) -> Any:
+        """返回缓存值，缺失时调用 build() 生成并缓存"""
+        entry = self._entries.get(game_id)
+        if entry is None or entry[0] != version:
+            entry = (version, {})
+            self._entries[game_id] = entry
+        self._entries.move_to_end(game_id)
+
+        values = entry[1]
+        if visibility in values:
+            self.hits += 1
+            return values[visibility]
+
+        self.misses += 1
+        value = build()
+        values[visibility] = value
+        while len(self._entries) > self.max_games:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, game_id: str):
+        self._entries.pop(game_id, None)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "games": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+def splice_game_state(head: str, players_text: str, state_rest: str) -> str:
+    """
+    拼接 {..., "game_state": {"players": ..., <其余状态>}} 的文本。
+    head 为不含 game_state 的消息 JSON，state_rest 为不含 players 的状态 JSON，
+    这样体积最大的 game_log 每个版本只编码一次，每个连接只需单独编码很小的玩家列表。
+    """
+    rest = state_rest[1:-1]
+    state = '{"players":' + players_text + ("," + rest if rest else "") + "}"
+    if head == "{}":
+        return '{"game_state":' + state + "}"
+    return head[:-1] + ',"game_state":' + state + "}"
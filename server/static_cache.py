@@ -0,0 +1,116 @@
+# static_cache.py
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，缺失时只提供 gzip
+    brotli = None
+
+# 小于该大小的文件压缩收益不大，直接原样返回
+MIN_COMPRESS_SIZE = 256
+
+
+class _Asset:
+    """一个静态文件的原始内容、预压缩版本和校验信息"""
+    __slots__ = ("media_type", "etag", "variants")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        # 编码 -> 内容，只保留比原文更小的压缩版本
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = data
+
+    def tag(self, encoding: str) -> str:
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+
+class StaticAssetCache:
+    """
+    静态文件内存缓存：创建时读入目录下全部文件并预压缩为 gzip/brotli，请求只查内存，不再访问磁盘。
+    文件修改后调用 reload()（/admin/static/reload）重新加载；
+    响应带 ETag 与 Cache-Control，客户端携带 If-None-Match 命中时返回 304。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self._assets: Dict[str, _Asset] = {}
+        self.reload()
+
+    def _load(self) -> Dict[str, _Asset]:
+        """读取目录下全部文件，键为以 / 分隔的相对路径"""
+        assets: Dict[str, _Asset] = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                with open(full_path, "rb") as f:
+                    body = f.read()
+                media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+                    media_type += "; charset=utf-8"
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                assets[path] = _Asset(body, media_type)
+        return assets
+
+    def get(self, path: str) -> Optional[_Asset]:
+        # 只命中启动时读入的文件，目录外的路径和不存在的文件都查不到
+        return self._assets.get(path)
+
+    def reload(self) -> int:
+        """重新读取全部文件，读完后整体替换旧缓存；返回加载的文件数"""
+        self._assets = self._load()
+        return len(self._assets)
+
+    def response(self, request: Request, path: str, cache_control: str) -> Response:
+        asset = self.get(path)
+        if asset is None:
+            return Response(status_code=404)
+
+        encoding = _choose_encoding(request.headers.get("accept-encoding", ""), asset.variants)
+        headers = {
+            "ETag": asset.tag(encoding),
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), asset):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+
+def _choose_encoding(accept_encoding: str, variants: Dict[str, bytes]) -> str:
+    """按 brotli > gzip > 原文的顺序选择客户端接受的编码，忽略 q=0 的项"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    for encoding in ("br", "gzip"):
+        if encoding in variants and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def _etag_matches(if_none_match: Optional[str], asset: _Asset) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 内容相同即视为命中，不区分客户端缓存的是哪种编码的版本
+    tags = {asset.tag(encoding) for encoding in asset.variants}
+    return any(tag.strip().removeprefix("W/") in tags for tag in if_none_match.split(","))
@@ -0,0 +1,162 @@
+# wire.py
+"""
+WebSocket 下行消息的编码协商。客户端通过 Sec-WebSocket-Protocol 子协议（或 ?format= 查询参数）选择：
+- ai-wolf.json     默认，与原来的 JSON 完全相同（现有 index.html 使用）
+- ai-wolf.compact  JSON 文本，字典键替换为 "~" 加序号的短码
+- ai-wolf.msgpack  MessagePack 二进制帧，键同样使用短码（需要安装 msgpack）
+使用短码的格式在连接建立后先收到 {"type": "hello", "format": ..., "keys": [...]}（以该格式编码，但不使用短码），
+keys[i] 即短码 "~<i 的 36 进制>" 对应的原始键名。上行消息（操作、聊天）格式不变。
+
+permessage-deflate 压缩由 uvicorn 的 WebSocket 实现与浏览器自动协商，对三种格式都生效。
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from server.serialization import dumps_text, loads, splice_game_state
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可选依赖，缺失时不提供二进制格式
+    msgpack = None
+
+# 可短码化的键。只能在末尾追加，已有键的顺序即协议的一部分
+KEYS = (
+    "type", "seq", "game_state", "players", "player_id", "role", "alive", "dead",
+    "current_phase", "current_round", "game_log", "previous_phase", "reason", "deadline",
+    "game_ended", "winner", "message", "messages", "replayed", "retry_after", "ts", "interval",
+    "error", "player_roles", "wolf_sayings", "wolf_vote", "seer_analysis", "seer_predict",
+    "guard_analysis", "guard_protect", "death_log", "heard_sayings", "final_vote",
+    "format", "keys",
+)
+
+
+def _code(index: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        index, rem = divmod(index, 36)
+        text = digits[rem] + text
+        if index == 0:
+            return "~" + text
+
+
+KEY_CODES: Dict[str, str] = {key: _code(i) for i, key in enumerate(KEYS)}
+
+
+def intern_keys(obj: Any) -> Any:
+    """递归地把字典中的已知键替换为短码，其他键与所有值保持不变"""
+    if isinstance(obj, dict):
+        return {KEY_CODES.get(k, k) if isinstance(k, str) else k: intern_keys(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [intern_keys(v) for v in obj]
+    return obj
+
+
+Frame = Union[str, bytes]
+
+
+class WireFormat:
+    """
+    一种下行编码。encode 编码完整消息；splice 把分别编码好的消息头（不含 game_state）、
+    玩家列表和其余状态（不含 players）拼成完整消息，使体积最大的 game_log 每个版本只编码一次。
+    """
+    name = "json"
+    subprotocol = "ai-wolf.json"
+
+    def encode(self, obj: Any) -> Frame:
+        return dumps_text(obj)
+
+    def splice(self, head: Frame, players: Frame, rest: Frame) -> Frame:
+        return splice_game_state(head, players, rest)
+
+    def hello(self) -> Optional[Frame]:
+        return None
+
+
+class CompactJSON(WireFormat):
+    name = "compact"
+    subprotocol = "ai-wolf.compact"
+
+    def encode(self, obj: Any) -> Frame:
+        return dumps_text(intern_keys(obj))
+
+    def splice(self, head: Frame, players: Frame, rest: Frame) -> Frame:
+        game_state, players_key = KEY_CODES["game_state"], KEY_CODES["players"]
+        rest_body = rest[1:-1]
+        state = '{"' + players_key + '":' + players + ("," + rest_body if rest_body else "") + "}"
+        if head == "{}":
+            return '{"' + game_state + '":' + state + "}"
+        return head[:-1] + ',"' + game_state + '":' + state + "}"
+
+    def encode_plain(self, obj: Any) -> Frame:
+        return dumps_text(obj)
+
+    def hello(self) -> Optional[Frame]:
+        # 键表本身不使用短码，客户端无需预先知道任何约定即可解析
+        return self.encode_plain({"type": "hello", "format": self.name, "keys": list(KEYS)})
+
+
+class MessagePack(CompactJSON):
+    name = "msgpack"
+    subprotocol = "ai-wolf.msgpack"
+
+    def encode(self, obj: Any) -> Frame:
+        return msgpack.packb(intern_keys(obj), use_bin_type=True)
+
+    def encode_plain(self, obj: Any) -> Frame:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def splice(self, head: Frame, players: Frame, rest: Frame) -> Frame:
+        head_count, head_body = _map_body(head)
+        rest_count, rest_body = _map_body(rest)
+        state = _map_header(rest_count + 1) + msgpack.packb(KEY_CODES["players"]) + players + rest_body
+        return _map_header(head_count + 1) + head_body + msgpack.packb(KEY_CODES["game_state"]) + state
+
+
+def _map_header(count: int) -> bytes:
+    if count < 16:
+        return bytes([0x80 | count])
+    if count < 1 << 16:
+        return b"\xde" + count.to_bytes(2, "big")
+    return b"\xdf" + count.to_bytes(4, "big")
+
+
+def _map_body(packed: bytes) -> Tuple[int, bytes]:
+    """拆出 MessagePack 映射的元素个数和元素部分"""
+    first = packed[0]
+    if 0x80 <= first <= 0x8f:
+        return first & 0x0f, packed[1:]
+    if first == 0xde:
+        return int.from_bytes(packed[1:3], "big"), packed[3:]
+    if first == 0xdf:
+        return int.from_bytes(packed[1:5], "big"), packed[5:]
+    raise ValueError("不是 MessagePack 映射")
+
+
+JSON = WireFormat()
+COMPACT = CompactJSON()
+FORMATS: Dict[str, WireFormat] = {JSON.name: JSON, COMPACT.name: COMPACT}
+if msgpack is not None:
+    MSGPACK = MessagePack()
+    FORMATS[MSGPACK.name] = MSGPACK
+
+
+def negotiate(offered: Iterable[str], requested: Optional[str] = None) -> Tuple[WireFormat, Optional[str]]:
+    """
+    按客户端子协议的先后顺序选第一个支持的格式，返回 (格式, 需要在握手中确认的子协议)；
+    没有可用子协议时使用 ?format= 指定的格式，都没有时为 JSON。
+    """
+    by_subprotocol = {fmt.subprotocol: fmt for fmt in FORMATS.values()}
+    for subprotocol in offered:
+        if subprotocol in by_subprotocol:
+            return by_subprotocol[subprotocol], subprotocol
+    return FORMATS.get(requested or "", JSON), None
+
+
+def reencode_rest(rest_json: str, wire: WireFormat) -> Frame:
+    """
+    把 JSON 状态文本转成另一种格式（每条消息每种格式只需一次）。经过 JSON 中转后 game_log 的整数键
+    统一变为字符串，各格式解码后的内容与 JSON 客户端看到的完全一致。
+    """
+    if wire is JSON:
+        return rest_json
+    return wire.encode(loads(rest_json))
@@ -0,0 +1,127 @@
+# ws_sessions.py
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from server.wire import Frame, JSON, WireFormat, reencode_rest
+
+# 服务端发送应用层 {"type": "ping"} 的间隔（秒）。它只用于让浏览器等看不到协议层 ping 的客户端发现连接失效，
+# 不要求客户端应答；写不进去的连接在发送时被移除
+HEARTBEAT_INTERVAL = 15.0
+
+# 协议层 ping 的间隔与等待 pong 的超时（秒），传给 uvicorn 的 ws_ping_interval / ws_ping_timeout。
+# 客户端的 WebSocket 实现会自动应答，不需要任何应用层配合，只收不发的观战连接也不会被误判为断开
+WS_PING_INTERVAL = 15.0
+WS_PING_TIMEOUT = 30.0
+
+# 单次发送的超时：写不进去的半开连接不应拖慢对其他连接的广播
+SEND_TIMEOUT = 5.0
+
+# 每局保留的最近消息条数，断线重连时从中补发
+REPLAY_BUFFER_SIZE = 128
+
+
+class Connection:
+    """一个 WebSocket 连接及其协商好的下行编码"""
+    __slots__ = ("websocket", "wire")
+
+    def __init__(self, websocket: WebSocket, wire: WireFormat = JSON):
+        self.websocket = websocket
+        self.wire = wire
+
+    async def send(self, frame: Frame, timeout: float = SEND_TIMEOUT) -> bool:
+        """发送已按本连接格式编码的帧；失败或超时返回 False，由调用方移除该连接"""
+        try:
+            if isinstance(frame, bytes):
+                await asyncio.wait_for(self.websocket.send_bytes(frame), timeout)
+            else:
+                await asyncio.wait_for(self.websocket.send_text(frame), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def send_message(self, message: dict) -> bool:
+        return await self.send(self.wire.encode(message))
+
+    async def close(self, code: int = 1001, timeout: float = SEND_TIMEOUT):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout)
+        except Exception:
+            pass
+
+
+class BufferedMessage:
+    """
+    已广播的一条消息。含游戏状态的消息在广播时就把状态冻结为 JSON 文本（rest，不含 players），
+    补发或以其他格式发送时只需重新编码很小的消息头和玩家列表，不会读到之后才变化的 game_log。
+    各格式的编码结果按需生成并缓存。
+    """
+    __slots__ = ("seq", "head", "rest", "players", "_encoded")
+
+    def __init__(self, seq: int, head: dict, rest: Optional[str] = None, players: Optional[List[dict]] = None):
+        self.seq = seq
+        self.head = head
+        self.rest = rest
+        self.players = players
+        self._encoded: Dict[Tuple[str, str], Frame] = {}
+
+    def encoded_head(self, wire: WireFormat) -> Frame:
+        key = ("head", wire.name)
+        if key not in self._encoded:
+            self._encoded[key] = wire.encode(self.head)
+        return self._encoded[key]
+
+    def encoded_rest(self, wire: WireFormat) -> Frame:
+        key = ("rest", wire.name)
+        if key not in self._encoded:
+            self._encoded[key] = reencode_rest(self.rest, wire)
+        return self._encoded[key]
+
+
+class ReplayBuffer:
+    """单局的消息序号计数与最近消息环形缓冲，只保存断线后需要补发的消息（阶段变化等，不含聊天）"""
+
+    def __init__(self, max_messages: int = REPLAY_BUFFER_SIZE):
+        self._messages: Deque[BufferedMessage] = deque(maxlen=max_messages)
+        self.last_seq = 0
+
+    def next_seq(self) -> int:
+        self.last_seq += 1
+        return self.last_seq
+
+    def append(self, message: BufferedMessage):
+        self._messages.append(message)
+
+    def since(self, last_seq: int) -> Optional[List[BufferedMessage]]:
+        """序号大于 last_seq 的消息；缺口已被挤出缓冲（或序号不属于本次运行）时返回 None"""
+        if last_seq > self.last_seq or last_seq < 0:
+            return None
+        if last_seq == self.last_seq:
+            return []
+        oldest = self._messages[0].seq if self._messages else self.last_seq + 1
+        if last_seq + 1 < oldest:
+            return None
+        return [m for m in self._messages if m.seq > last_seq]
+
+
+class HeartbeatMonitor:
+    """单个后台任务按固定间隔调用 tick（发送应用层 ping），首次有连接时启动"""
+
+    def __init__(self, tick: Callable[[], Awaitable[None]], interval: float = HEARTBEAT_INTERVAL):
+        self._tick = tick
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except Exception as e:
+                print(f"心跳检查失败: {e}")
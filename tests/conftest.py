@@ -0,0 +1,5 @@
+# conftest.py
+import os
+
+# 测试只使用离线后端，不需要 API Key
+os.environ["LLM_BACKEND"] = "offline"
@@ -0,0 +1,104 @@
+# test_actions.py
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from logic.game_utils import Role, format_memory
+from logic.gamemanager import GameManager
+from logic.rules import IllegalAction
+
+
+def seat(game: GameManager, role: Role) -> int:
+    return next(p.player_id for p in game.players if p.role == role)
+
+
+@pytest.fixture
+def game():
+    return GameManager(verbose=False, seed=1)
+
+
+def test_rejected_action_leaves_no_record(game):
+    wolf = seat(game, Role.WOLF)
+    game.apply_action(wolf, "wolf", seat(game, Role.SEER), "刀预言家")
+    with pytest.raises(IllegalAction, match="今晚已经投过刀"):
+        game.apply_action(wolf, "wolf", seat(game, Role.GUARD), "改刀守卫")
+    night = game.night_log()
+    assert night["wolf_ballots"] == {seat(game, Role.SEER): [wolf]}
+    assert night["wolf_sayings"] == {wolf: "刀预言家"}
+
+
+def test_night_resolution_and_guard(game):
+    seer, guard = seat(game, Role.SEER), seat(game, Role.GUARD)
+    for wolf in (p.player_id for p in game.players if p.role == Role.WOLF):
+        game.apply_action(wolf, "wolf", seer)
+    game.apply_action(guard, "guard", seer)
+    assert game.resolve_night() == -1
+    assert game.players[guard].last_guarded == seer
+
+
+def test_seer_check_records_identity(game):
+    seer, wolf = seat(game, Role.SEER), seat(game, Role.WOLF)
+    assert game.apply_action(seer, "seer", wolf).endswith("坏人")
+    assert game.players[seer].checked_players == {wolf: "坏人"}
+    with pytest.raises(IllegalAction, match="今晚已经查验过"):
+        game.apply_action(seer, "seer", seat(game, Role.VILLAGER))
+
+
+def test_http_action_requires_target():
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    game = main.games[game_id]
+    wolf = seat(game, Role.WOLF)
+    url = f"/games/{game_id}/player/{wolf}/action"
+
+    response = client.post(url, json={"action_type": "wolf"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "缺少目标玩家"
+    assert client.post(url, json={"action_type": "wolf", "target_id": -1}).status_code == 400
+    assert game.night_log()["wolf_ballots"] == {}
+
+    teammate = next(p.player_id for p in game.players if p.role == Role.WOLF and p.player_id != wolf)
+    assert client.post(url, json={"action_type": "wolf", "target_id": teammate}).status_code == 200
+    assert game.night_log()["wolf_ballots"] == {teammate: [wolf]}
+
+
+def test_ws_action_error_replies_500_and_keeps_connection(monkeypatch):
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    game = main.games[game_id]
+    wolf = seat(game, Role.WOLF)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    with client.websocket_connect(f"/ws/{game_id}/{wolf}") as ws:
+        assert ws.receive_json()["type"] == "init"
+        monkeypatch.setattr(game, "apply_action", broken)
+        ws.send_json({"type": "action", "action_type": "wolf", "target_id": seat(game, Role.SEER), "id": 1})
+        assert ws.receive_json() == {"type": "action_result", "id": 1, "ok": False, "status": 500,
+                                     "detail": "服务器内部错误"}
+
+        monkeypatch.undo()
+        ws.send_json({"type": "action", "action_type": "wolf", "target_id": seat(game, Role.SEER), "id": 2})
+        reply = ws.receive_json()
+        assert reply["id"] == 2 and reply["ok"] is True
+
+
+def test_wolf_vote_keeps_final_target_shape(game):
+    wolves = [p.player_id for p in game.players if p.role == Role.WOLF]
+    seer, villager = seat(game, Role.SEER), seat(game, Role.VILLAGER)
+    game.apply_action(wolves[0], "wolf", seer)
+    game.apply_action(wolves[1], "wolf", villager)
+    night = game.night_log()
+    assert night["wolf_ballots"] == {seer: [wolves[0]], villager: [wolves[1]]}
+    assert night["wolf_vote"] == {}
+
+    victim = game.resolve_night()
+    # 与最初的日志格式一致：wolf_vote 只有最终目标及投给它的狼人
+    assert night["wolf_vote"] == {victim: [wolves[0] if victim == seer else wolves[1]]}
+    assert format_memory({"night-0": night}).count("狼人投票") == 1
+
+    # 各自的刀人目标只有狼人能看到
+    wolf_view = game.players[wolves[0]].filter_receive_info(game.game_log)["night-0"]
+    assert wolf_view["wolf_ballots"] == night["wolf_ballots"]
+    assert "wolf_ballots" not in game.players[villager].filter_receive_info(game.game_log)["night-0"]
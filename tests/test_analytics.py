@@ -0,0 +1,44 @@
+# test_analytics.py
+import pytest
+
+from logic.analytics import flatten_game
+from logic.events import HIDDEN, EventLog
+from logic.gamemanager import GameManager
+
+ROLES = {0: "WOLF", 1: "WOLF", 2: "SEER", 3: "GUARD", 4: "VILLAGER", 5: "VILLAGER"}
+
+
+def night_events(guarded: int, wolf_target: int) -> EventLog:
+    events = EventLog()
+    events.append("roles", visibility=HIDDEN, roles=ROLES)
+    events.append("phase", phase="NIGHT", round=1)
+    events.append("wolf_vote", visibility="WOLF", target_id=2, voters=[0])
+    events.append("wolf_vote", visibility="WOLF", target_id=4, voters=[1])
+    events.append("guard_protect", visibility="GUARD", target_id=guarded)
+    events.append("wolf_target", visibility="WOLF", target_id=wolf_target)
+    return events
+
+
+@pytest.mark.parametrize("guarded, saved", [(2, True), (4, False)])
+def test_guard_save_compares_resolved_target(guarded, saved):
+    # 狼人分票 2 和 4，结算目标为 2；只有守中结算目标才算救人，守中落选的一票不算
+    tables = flatten_game("g", night_events(guarded, wolf_target=2))
+    guard_rows = [row for row in tables["actions"] if row["action"] == "guard_protect"]
+    assert [row["hit"] for row in guard_rows] == [saved]
+    wolf_rows = [row for row in tables["actions"] if row["action"] == "wolf_vote"]
+    assert {row["player_id"]: row["target_id"] for row in wolf_rows} == {0: 2, 1: 4}
+
+
+def test_game_records_resolved_wolf_target():
+    game = GameManager(verbose=False, seed=5)
+    wolves = [p.player_id for p in game.players if p.role.name == "WOLF"]
+    target = next(p.player_id for p in game.players if p.role.name == "SEER")
+    for wolf in wolves:
+        game.apply_action(wolf, "wolf", target)
+    game.apply_action(next(p.player_id for p in game.players if p.role.name == "GUARD"), "guard", target)
+    assert game.resolve_night() == -1
+    events, _ = game.events.read(0, limit=100)
+    assert [e["data"]["target_id"] for e in events if e["kind"] == "wolf_target"] == [target]
+    guard_rows = [row for row in flatten_game(game.game_id, game.events)["actions"]
+                  if row["action"] == "guard_protect"]
+    assert [row["hit"] for row in guard_rows] == [True]
@@ -0,0 +1,51 @@
+# test_analytics_export.py
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+from logic.game_utils import Role
+
+
+class RecordingWriter:
+    """记录导出与关闭发生在哪个线程"""
+
+    def __init__(self):
+        self.exported = []
+        self.closed = False
+
+    def export_game(self, game_id, events, seat_labels=None):
+        self.exported.append((game_id, threading.get_ident()))
+
+    def close(self):
+        self.closed = True
+
+
+def test_finished_game_exported_off_loop_and_flushed_on_shutdown(monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(main, "analytics", writer)
+    loop_threads = []
+
+    @main.app.get("/_test/loop-thread")
+    async def loop_thread():
+        loop_threads.append(threading.get_ident())
+        return {}
+
+    try:
+        with TestClient(main.app) as client:
+            client.get("/_test/loop-thread")
+            game_id = client.post("/games", json={}).json()["game_id"]
+            for player in main.games[game_id].players:
+                if player.role == Role.WOLF:
+                    player.alive = False
+            response = client.post(f"/games/{game_id}/next-phase")
+            assert response.status_code == 200
+            assert response.json()["game_ended"] is True
+            assert writer.closed is False
+    finally:
+        main.app.router.routes.pop()
+
+    assert [g for g, _ in writer.exported] == [game_id]
+    assert writer.exported[0][1] != loop_threads[0]
+    # lifespan 结束时写出缓冲
+    assert writer.closed is True
@@ -0,0 +1,85 @@
+# test_batch_inference.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from logic.batch_inference import BatchCollector, BatchRequestFailed, _parse_result, batch_mode, current_collector
+
+
+def ok_row(custom_id: str, content: str):
+    return {"custom_id": custom_id, "error": None, "response": {
+        "status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}}
+
+
+class FakeClient:
+    """每个任务在第一次轮询时完成；fail_first 中的请求内容第一次提交时失败"""
+
+    def __init__(self, fail_first=()):
+        self.fail_first = set(fail_first)
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, lines):
+        with self.lock:
+            batch_id = f"batch-{len(self.jobs)}"
+            self.jobs[batch_id] = lines
+        return batch_id
+
+    def poll(self, batch_id):
+        results = {}
+        for line in self.jobs[batch_id]:
+            text = line["body"]["messages"][0]["content"]
+            if text in self.fail_first:
+                self.fail_first.discard(text)
+                results[line["custom_id"]] = {"custom_id": line["custom_id"], "error": {"message": "失败"}}
+            else:
+                results[line["custom_id"]] = ok_row(line["custom_id"], text.upper())
+        return results
+
+
+def chat(collector, text):
+    return collector.chat([{"role": "user", "content": text}], "qwen-plus")
+
+
+def test_requests_are_batched_and_retried():
+    client = FakeClient(fail_first={"b"})
+    collector = BatchCollector(client, max_batch=10, linger=0.2, poll_interval=0.01)
+    try:
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            replies = list(executor.map(lambda t: chat(collector, t)[0], "abcde"))
+    finally:
+        collector.close()
+    assert replies == ["A", "B", "C", "D", "E"]
+    stats = collector.stats()
+    assert stats["requests"] == 5 and stats["retried"] == 1 and stats["failed"] == 0
+    # 5 个并发请求合并为一个任务，失败的那条单独重新提交
+    assert stats["batches"] == 2
+
+
+def test_request_fails_after_retries():
+    client = FakeClient()
+    client.poll = lambda batch_id: {}
+    collector = BatchCollector(client, linger=0.01, poll_interval=0.01, max_retries=1)
+    try:
+        with pytest.raises(BatchRequestFailed):
+            chat(collector, "x")
+    finally:
+        collector.close()
+    assert collector.stats()["failed"] == 1
+
+
+def test_parse_result():
+    assert _parse_result(ok_row("r", " 好 ")) == ("好", None)
+    with pytest.raises(BatchRequestFailed):
+        _parse_result(None)
+    with pytest.raises(BatchRequestFailed):
+        _parse_result({"custom_id": "r", "response": {"status_code": 500, "body": {}}})
+
+
+def test_batch_mode_context():
+    collector = BatchCollector(FakeClient())
+    assert current_collector() is None
+    with batch_mode(collector):
+        assert current_collector() is collector
+    assert current_collector() is None
@@ -0,0 +1,75 @@
+# test_chat_relay.py
+import asyncio
+
+from server.chat_relay import CHAT_BURST, MAX_MESSAGE_CHARS, ChatRelay, TokenBucket
+
+
+class Recorder:
+    def __init__(self):
+        self.frames = []
+
+    async def __call__(self, game_id, message):
+        self.frames.append((game_id, message))
+
+
+def test_token_bucket_burst_and_refill():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert 0 < bucket.retry_after() <= 0.1
+    bucket.updated -= 0.1  # 过去 0.1 秒，补充一个令牌
+    assert bucket.take()
+    assert not bucket.take()
+
+
+def test_rate_limit_per_player():
+    async def main():
+        relay = ChatRelay(Recorder(), tick=0.01)
+        results = [relay.submit("g", 0, f"m{i}") for i in range(CHAT_BURST + 2)]
+        assert results[:CHAT_BURST] == [None] * CHAT_BURST
+        assert all(r is not None and r > 0 for r in results[CHAT_BURST:])
+        # 其他玩家、其他对局各有自己的令牌桶
+        assert relay.submit("g", 1, "hi") is None
+        assert relay.submit("h", 0, "hi") is None
+        stats = relay.stats()
+        assert stats["accepted"] == CHAT_BURST + 2
+        assert stats["rate_limited"] == 2
+
+    asyncio.run(main())
+
+
+def test_messages_coalesced_into_one_frame_per_game():
+    async def main():
+        recorder = Recorder()
+        relay = ChatRelay(recorder, tick=0.05)
+        relay.submit("g", 0, "a")
+        relay.submit("g", 1, "b")
+        relay.submit("h", 2, "x" * (MAX_MESSAGE_CHARS + 10))
+        await asyncio.sleep(0.15)
+        return recorder.frames, relay.stats()
+
+    frames, stats = asyncio.run(main())
+    assert sorted(game_id for game_id, _ in frames) == ["g", "h"]
+    by_game = dict(frames)
+    assert by_game["g"] == {"type": "messages", "messages": [
+        {"player_id": 0, "message": "a"}, {"player_id": 1, "message": "b"}]}
+    assert len(by_game["h"]["messages"][0]["message"]) == MAX_MESSAGE_CHARS
+    assert stats["frames"] == 2 and stats["pending"] == 0
+
+
+def test_pending_buffer_bounded_and_forget():
+    async def main():
+        recorder = Recorder()
+        relay = ChatRelay(recorder, tick=10, max_pending=3)
+        for player_id in range(5):
+            relay.submit("g", player_id, str(player_id))
+        assert relay.stats()["dropped"] == 2
+        await relay.flush()
+        assert [m["message"] for m in recorder.frames[0][1]["messages"]] == ["2", "3", "4"]
+
+        relay.submit("g", 0, "again")
+        relay.forget("g")
+        assert relay.stats()["pending"] == 0
+        await relay.flush()
+        assert len(recorder.frames) == 1
+
+    asyncio.run(main())
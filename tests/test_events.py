@@ -0,0 +1,81 @@
+# test_events.py
+import pytest
+
+from logic.events import PUBLIC, EventLog
+from logic.game_utils import Role
+from logic.gamemanager import GameManager
+
+
+def kinds(log: EventLog):
+    events, _ = log.read(0, limit=1000)
+    return [event["kind"] for event in events]
+
+
+def test_fork_shares_history_and_diverges():
+    parent = EventLog()
+    for kind in ("a", "b", "c"):
+        parent.append(kind)
+    child = parent.fork(2)
+    assert len(child) == 2
+    assert child.started_at == parent.started_at
+
+    child.append("x")
+    parent.append("d")
+    assert kinds(parent) == ["a", "b", "c", "d"]
+    assert kinds(child) == ["a", "b", "x"]
+    assert child.read(0)[0][2]["seq"] == 3
+
+    grandchild = child.fork(3)
+    grandchild.append("y")
+    assert kinds(grandchild) == ["a", "b", "x", "y"]
+    assert kinds(child) == ["a", "b", "x"]
+
+
+def test_read_pages_through_parent_and_filters():
+    parent = EventLog()
+    parent.append("a")
+    parent.append("secret", visibility="wolf")
+    child = parent.fork(2)
+    child.append("b")
+
+    events, cursor = child.read(0, limit=2)
+    assert [e["kind"] for e in events] == ["a", "secret"] and cursor == 2
+    events, cursor = child.read(cursor)
+    assert [e["kind"] for e in events] == ["b"] and cursor == 3
+
+    public, _ = child.read(0, visible=lambda e: e["visibility"] == PUBLIC)
+    assert [e["kind"] for e in public] == ["a", "b"]
+
+
+@pytest.mark.parametrize("upto", [-1, 2])
+def test_fork_rejects_out_of_range(upto):
+    log = EventLog()
+    log.append("a")
+    with pytest.raises(ValueError, match="无效的分叉位置"):
+        log.fork(upto)
+
+
+def test_game_fork_is_independent():
+    game = GameManager(verbose=False, seed=3)
+    wolves = [p.player_id for p in game.players if p.role == Role.WOLF]
+    victim = next(p.player_id for p in game.players if p.role == Role.VILLAGER)
+    for wolf in wolves:
+        game.apply_action(wolf, "wolf", victim)
+    game.resolve_night()
+    game.next_phase()
+    assert not game.players[victim].alive
+
+    fork = game.fork(0, game_id="fork")
+    assert fork.current_phase == "NIGHT" and fork.current_round == game.snapshots[0].round
+    assert fork.players[victim].alive
+    assert [p.role for p in fork.players] == [p.role for p in game.players]
+    assert fork.events.last_seq == game.snapshots[0].event_seq
+
+    # 分叉后的夜晚重新开始，原对局的刀人记录和死亡都不会带过来
+    assert fork.night_log()["wolf_ballots"] == {}
+    fork.apply_action(wolves[0], "wolf", victim)
+    assert fork.night_log()["wolf_ballots"] == {victim: [wolves[0]]}
+    assert game.night_log() is not fork.night_log()
+    shared = game.snapshots[0].event_seq
+    assert kinds(fork.events)[:shared] == kinds(game.events)[:shared]
+    assert kinds(fork.events)[shared:] != kinds(game.events)[shared:]
@@ -0,0 +1,104 @@
+# test_game_commands.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from logic.game_utils import Role
+from server.game_commands import GameCommandGuard
+
+
+def test_lookup_and_remember():
+    guard = GameCommandGuard(max_keys_per_game=2)
+    payload = {"action_type": "vote", "target_id": 1}
+    assert guard.lookup("g", "k1", payload) is None
+    guard.remember("g", "k1", payload, {"message": "ok"})
+    assert guard.lookup("g", "k1", payload) == {"message": "ok"}
+    assert guard.lookup("g", None, payload) is None
+    with pytest.raises(HTTPException) as info:
+        guard.lookup("g", "k1", {**payload, "target_id": 2})
+    assert info.value.status_code == 409
+
+    guard.remember("g", "k2", payload, {})
+    guard.remember("g", "k3", payload, {})
+    assert guard.lookup("g", "k1", payload) is None
+
+
+def test_commands_are_serialized_per_game():
+    guard = GameCommandGuard()
+    order = []
+
+    async def command(game_id: str, name: str, delay: float):
+        async with guard.command(game_id):
+            order.append(f"{name}+")
+            await asyncio.sleep(delay)
+            order.append(f"{name}-")
+
+    async def run():
+        await asyncio.gather(command("a", "a1", 0.02), command("a", "a2", 0), command("b", "b1", 0))
+
+    asyncio.run(run())
+    assert order.index("a1-") < order.index("a2+")
+    assert order.index("b1-") < order.index("a1-")
+
+
+def test_retire_waits_for_queued_commands():
+    guard = GameCommandGuard()
+
+    async def run():
+        async def first():
+            async with guard.command("g"):
+                guard.remember("g", "k", {}, {"n": 1})
+                guard.retire("g")
+                await asyncio.sleep(0.01)
+
+        async def second():
+            async with guard.command("g"):
+                # 排队中的命令仍然与第一条串行，幂等记录尚未释放
+                assert guard.lookup("g", "k", {}) == {"n": 1}
+
+        await asyncio.gather(first(), second())
+
+    asyncio.run(run())
+    assert guard.stats() == {"locks": 0, "idempotency_games": 0}
+    guard.retire("idle")
+    assert guard.stats() == {"locks": 0, "idempotency_games": 0}
+
+
+def test_idempotent_submit_action():
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    game = main.games[game_id]
+    wolf = next(p.player_id for p in game.players if p.role == Role.WOLF)
+    url = f"/games/{game_id}/player/{wolf}/action"
+    action = {"action_type": "wolf", "target_id": next(p.player_id for p in game.players if p.role != Role.WOLF)}
+
+    first = client.post(url, json=action, headers={"Idempotency-Key": "kill-1"})
+    retry = client.post(url, json=action, headers={"Idempotency-Key": "kill-1"})
+    assert first.status_code == retry.status_code == 200
+    assert first.json() == retry.json()
+    assert sum(len(v) for v in game.night_log()["wolf_ballots"].values()) == 1
+
+    conflict = client.post(url, json={**action, "content": "改主意"}, headers={"Idempotency-Key": "kill-1"})
+    assert conflict.status_code == 409
+
+
+def test_finished_game_releases_commands_and_rejects_new_ones():
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    game = main.games[game_id]
+    for player in game.players:
+        if player.role == Role.WOLF:
+            player.alive = False
+
+    response = client.post(f"/games/{game_id}/next-phase", headers={"Idempotency-Key": "end"})
+    assert response.json()["game_ended"]
+    assert game_id not in main.game_commands._locks
+    assert game_id not in main.game_commands._results
+
+    retry = client.post(f"/games/{game_id}/next-phase", headers={"Idempotency-Key": "end"})
+    assert retry.status_code == 409
+    action = client.post(f"/games/{game_id}/player/0/action", json={"action_type": "speech", "content": "hi"})
+    assert action.status_code == 409
@@ -0,0 +1,92 @@
+# test_llm_scheduler.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from logic.llm_scheduler import LLMScheduler, Priority, request_context
+
+LIMITS = {"m": {"qps": 1000, "tpm": 10_000_000, "max_concurrency": 1}}
+
+
+def _wait_queued(scheduler, depth):
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["queue_depth"] < depth:
+        assert time.monotonic() < deadline, "请求没有进入队列"
+        time.sleep(0.01)
+
+
+def _run_queued(scheduler, requests):
+    """先占住唯一并发名额，按顺序排入 requests=[(game_id, priority)]，释放后返回放行顺序"""
+    order = []
+
+    def worker(game_id, priority):
+        with request_context(game_id, priority):
+            with scheduler.slot("m", 10):
+                order.append((game_id, priority))
+
+    holder = scheduler.acquire("m", 10)
+    threads = []
+    for i, (game_id, priority) in enumerate(requests):
+        thread = threading.Thread(target=worker, args=(game_id, priority))
+        thread.start()
+        threads.append(thread)
+        _wait_queued(scheduler, i + 1)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+def test_higher_priority_granted_first():
+    scheduler = LLMScheduler(LIMITS)
+    # 模拟请求先排队，后到的纯 AI 对局请求仍先放行
+    order = _run_queued(scheduler, [
+        ("sim", Priority.SIMULATION),
+        ("sim", Priority.SIMULATION),
+        ("ai", Priority.AI_ONLY),
+    ])
+    assert [priority for _, priority in order] == [Priority.AI_ONLY, Priority.SIMULATION, Priority.SIMULATION]
+    stats = scheduler.stats()["by_priority"]
+    assert stats["AI_ONLY"]["granted"] == 2  # 含占住名额的请求
+    assert stats["SIMULATION"]["granted"] == 2
+
+
+def test_round_robin_between_games_of_same_priority():
+    scheduler = LLMScheduler(LIMITS)
+    order = _run_queued(scheduler, [
+        ("a", Priority.AI_ONLY),
+        ("a", Priority.AI_ONLY),
+        ("a", Priority.AI_ONLY),
+        ("b", Priority.AI_ONLY),
+    ])
+    # b 排在 a 的三个请求之后，但在 a 放行一次后就轮到 b
+    assert [game_id for game_id, _ in order] == ["a", "b", "a", "a"]
+
+
+def test_qps_bucket_delays_requests():
+    scheduler = LLMScheduler({"m": {"qps": 20, "burst": 1, "tpm": 10_000_000}})
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.release(scheduler.acquire("m", 10), 10)
+    # 突发量为 1，后两次各需等待约 0.05 秒
+    assert time.monotonic() - start >= 0.08
+    assert scheduler.stats()["by_model"]["m"]["tokens_used"] == 30
+
+
+def test_acquire_refuses_to_block_event_loop():
+    scheduler = LLMScheduler(LIMITS)
+
+    async def call_from_loop():
+        scheduler.acquire("m", 10)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(call_from_loop())
+    assert scheduler.stats()["queue_depth"] == 0
+
+    async def call_via_thread():
+        ticket = await asyncio.to_thread(scheduler.acquire, "m", 10)
+        scheduler.release(ticket)
+
+    asyncio.run(call_via_thread())
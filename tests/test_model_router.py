@@ -0,0 +1,38 @@
+# test_model_router.py
+import random
+import time
+
+from logic import model_router
+from logic.model_router import RULE_BASED, ModelRouter, vote_is_decided
+
+CONTENT = {"role": "SEER", "type": "thinking and target", "legal_targets": [0, 1, 2, 3, 4, 5]}
+
+
+def test_route():
+    router = ModelRouter()
+    assert router.route(dict(CONTENT, legal_targets=[3]), {}) == RULE_BASED
+    assert router.route(CONTENT, {"round": 0}) == router.fast_model
+    assert router.route(CONTENT, {"round": 2}) == router.slow_model
+    assert vote_is_decided({1: [0, 2, 3], 2: [4]}, 1)
+    assert not vote_is_decided({1: [0, 2], 2: [4]}, 1)
+
+
+def test_speculative_offline_reproducible(monkeypatch):
+    real_call = model_router.call_dashscope
+    jitter = random.Random()
+
+    def slow_start(*args, **kwargs):
+        # 打乱两路请求的先后，结果仍应只由种子决定
+        time.sleep(jitter.random() * 0.002)
+        return real_call(*args, **kwargs)
+
+    monkeypatch.setattr(model_router, "call_dashscope", slow_start)
+    router = ModelRouter(speculative=True)
+
+    def run(seed):
+        rng = random.Random(seed)
+        targets = [router.call(dict(CONTENT), {"round": 2}, rng=rng)["response"]["target"] for _ in range(20)]
+        return targets, rng.getstate()
+
+    first = run(7)
+    assert all(run(7) == first for _ in range(10))
@@ -0,0 +1,73 @@
+# test_phase_scheduler.py
+import asyncio
+
+from server.phase_scheduler import PhaseScheduler
+
+
+def run_with_scheduler(body):
+    """在新的事件循环中运行 body(scheduler, fired)，返回按触发顺序记录的对局"""
+    fired = []
+
+    async def on_deadline(game_id):
+        fired.append(game_id)
+
+    async def main():
+        await body(PhaseScheduler(on_deadline), fired)
+
+    asyncio.run(main())
+    return fired
+
+
+def test_deadlines_fire_in_order():
+    async def body(scheduler, fired):
+        scheduler.schedule("slow", 0.15)
+        scheduler.schedule("fast", 0.05)
+        assert len(scheduler) == 2
+        await asyncio.sleep(0.25)
+        assert len(scheduler) == 0
+        assert scheduler.deadline("fast") is None
+
+    assert run_with_scheduler(body) == ["fast", "slow"]
+
+
+def test_reschedule_replaces_old_deadline():
+    async def body(scheduler, fired):
+        scheduler.schedule("g", 0.05)
+        scheduler.schedule("g", 0.2)
+        await asyncio.sleep(0.1)
+        assert fired == []
+        await asyncio.sleep(0.2)
+
+    assert run_with_scheduler(body) == ["g"]
+
+
+def test_cancel_then_schedule_does_not_revive_old_entry():
+    async def body(scheduler, fired):
+        scheduler.schedule("g", 0.05)
+        scheduler.cancel("g")
+        scheduler.schedule("g", 0.3)
+        await asyncio.sleep(0.15)
+        assert fired == []
+        assert scheduler.deadline("g") is not None
+        scheduler.cancel("g")
+        await asyncio.sleep(0.25)
+
+    assert run_with_scheduler(body) == []
+
+
+def test_failing_callback_does_not_stop_scheduler():
+    fired = []
+
+    async def on_deadline(game_id):
+        fired.append(game_id)
+        if game_id == "bad":
+            raise RuntimeError("boom")
+
+    async def main():
+        scheduler = PhaseScheduler(on_deadline)
+        scheduler.schedule("bad", 0.01)
+        scheduler.schedule("good", 0.05)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert fired == ["bad", "good"]
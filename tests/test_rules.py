@@ -0,0 +1,93 @@
+# test_rules.py
+import random
+
+import pytest
+
+from logic.game_utils import Role
+from logic.rules import DAY, NIGHT, VOTING, IllegalAction, Rules, mask_of, members, tally
+
+ROLES = [Role.WOLF, Role.VILLAGER, Role.WOLF, Role.GUARD, Role.VILLAGER, Role.SEER]
+ALL_ALIVE = mask_of(range(6))
+
+
+@pytest.fixture
+def rules():
+    return Rules(ROLES)
+
+
+def test_masks(rules):
+    assert members(rules.wolves) == (0, 2)
+    assert members(rules.gods) == (3, 5)
+    assert rules.action_for(NIGHT, 1) is None
+    assert rules.action_for(NIGHT, 5) == "seer"
+    assert rules.action_for(DAY, 1) == "speech"
+    assert rules.action_for(VOTING, 0) == "vote"
+
+
+def test_from_log():
+    log = {"player_roles": {pid: {"role": role} for pid, role in enumerate(ROLES)}}
+    assert Rules.from_log(log).roles == tuple(ROLES)
+
+
+def test_wrong_player_count():
+    with pytest.raises(ValueError):
+        Rules(ROLES[:5])
+
+
+def test_check_keeps_original_api_semantics(rules):
+    # 狼人可以刀队友，玩家可以投给自己，预言家可以查验自己
+    rules.check(NIGHT, 0, "wolf", 2, ALL_ALIVE)
+    rules.check(VOTING, 1, "vote", 1, ALL_ALIVE)
+    rules.check(NIGHT, 5, "seer", 5, ALL_ALIVE)
+    rules.check(VOTING, 1, "vote", -1, ALL_ALIVE)
+
+
+@pytest.mark.parametrize("phase, player_id, action, target_id, alive, last_guarded, message", [
+    (NIGHT, 0, "wolf", -1, ALL_ALIVE, -1, "目标玩家不存在"),
+    (NIGHT, 3, "guard", -1, ALL_ALIVE, -1, "目标玩家不存在"),
+    (NIGHT, 5, "seer", 6, ALL_ALIVE, -1, "目标玩家不存在"),
+    (NIGHT, 3, "guard", 4, ALL_ALIVE, 4, "不能连续两晚守护同一玩家"),
+    (VOTING, 1, "vote", 4, ALL_ALIVE & ~mask_of([4]), -1, "不能投票给已死亡的玩家"),
+    (NIGHT, 1, "wolf", 3, ALL_ALIVE, -1, "当前阶段或角色不允许此操作"),
+    (DAY, 0, "wolf", 3, ALL_ALIVE, -1, "当前阶段或角色不允许此操作"),
+    (VOTING, 4, "vote", 1, ALL_ALIVE & ~mask_of([4]), -1, "玩家已死亡，无法执行操作"),
+])
+def test_check_rejects(rules, phase, player_id, action, target_id, alive, last_guarded, message):
+    with pytest.raises(IllegalAction, match=message):
+        rules.check(phase, player_id, action, target_id, alive, last_guarded)
+
+
+def test_candidates_exclude_pointless_targets(rules):
+    alive = ALL_ALIVE & ~mask_of([4])
+    assert rules.candidates("wolf", 0, alive) == (1, 3, 5)
+    assert rules.candidates("seer", 5, alive, checked=mask_of([0])) == (1, 2, 3)
+    assert rules.candidates("guard", 3, alive, last_guarded=3) == (0, 1, 2, 5)
+    assert rules.candidates("vote", 1, alive) == (0, 2, 3, 5)
+
+
+def test_tally():
+    rng = random.Random(0)
+    assert tally({}, rng) == -1
+    assert tally({-1: [0, 1]}, rng) == -1
+    assert tally({2: [0], 3: [1, 4], -1: [5]}, rng) == 3
+    assert {tally({2: [0], 3: [1]}, random.Random(seed)) for seed in range(20)} == {2, 3}
+
+
+def test_resolve_night(rules):
+    assert rules.resolve_night(ALL_ALIVE, {1: [0, 2]}, guard_target=-1) == (1, ALL_ALIVE & ~mask_of([1]))
+    assert rules.resolve_night(ALL_ALIVE, {1: [0, 2]}, guard_target=1) == (-1, ALL_ALIVE)
+    dead = ALL_ALIVE & ~mask_of([1])
+    assert rules.resolve_night(dead, {1: [0, 2]}, guard_target=-1) == (-1, dead)
+
+
+def test_resolve_vote(rules):
+    assert rules.resolve_vote(ALL_ALIVE, {0: [1, 3, 4], 5: [0]}) == (0, ALL_ALIVE & ~mask_of([0]))
+    assert rules.resolve_vote(ALL_ALIVE, {-1: [0, 1]}) == (-1, ALL_ALIVE)
+
+
+def test_winner(rules):
+    assert rules.winner(ALL_ALIVE) is None
+    assert rules.winner(ALL_ALIVE & ~rules.wolves) == Role.VILLAGER.name
+    assert rules.winner(rules.wolves | mask_of([1])) == Role.WOLF.name
+    assert rules.winner(rules.wolves | mask_of([3])) is None
+    assert rules.winner(mask_of([0, 3])) is None
@@ -0,0 +1,58 @@
+# test_static_cache.py
+import shutil
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from server.static_cache import StaticAssetCache
+
+
+def _client(cache):
+    app = FastAPI()
+
+    @app.get("/static/{path:path}")
+    async def static(path: str, request: Request):
+        return cache.response(request, path, "public, max-age=60")
+
+    return TestClient(app)
+
+
+def test_files_loaded_at_startup_and_served_from_memory(tmp_path):
+    root = tmp_path / "static"
+    (root / "css").mkdir(parents=True)
+    (root / "index.html").write_text("<p>hello</p>" * 100, encoding="utf-8")
+    (root / "css" / "site.css").write_text("body{}", encoding="utf-8")
+    (tmp_path / "secret.txt").write_text("secret", encoding="utf-8")
+    cache = StaticAssetCache(str(root))
+    assert cache.get("index.html") is not None
+    assert cache.get("css/site.css") is not None
+
+    # 删除目录后仍能提供：请求只查内存
+    shutil.rmtree(root)
+
+    client = _client(cache)
+    response = client.get("/static/index.html", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    assert response.text == "<p>hello</p>" * 100
+
+    etag = response.headers["etag"]
+    assert client.get("/static/index.html", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/../secret.txt").status_code == 404
+
+
+def test_changes_picked_up_only_on_reload(tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("v1", encoding="utf-8")
+    cache = StaticAssetCache(str(tmp_path))
+
+    page.write_text("v2", encoding="utf-8")
+    (tmp_path / "new.js").write_text("x", encoding="utf-8")
+    assert cache.get("index.html").variants["identity"] == b"v1"
+    assert cache.get("new.js") is None
+
+    assert cache.reload() == 2
+    assert cache.get("index.html").variants["identity"] == b"v2"
+    assert cache.get("new.js") is not None
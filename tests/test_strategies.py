@@ -0,0 +1,26 @@
+# test_strategies.py
+import random
+
+import pytest
+
+from logic.game_utils import Role
+from logic.player import Player
+from logic.strategies import HeuristicStrategy, LLMStrategy, Strategy
+
+
+def test_strategy_without_decide_cannot_be_instantiated():
+    class Incomplete(Strategy):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        Strategy()
+    LLMStrategy()
+
+
+def test_heuristic_vote_picks_legal_target():
+    player = Player(0, Role.VILLAGER, strategy=HeuristicStrategy(random.Random(1)))
+    content = {"type": "decision", "memory": {}, "legal_targets": [2, 3, -1]}
+    decision = player.strategy.decide(player, content, {})
+    assert decision["response"]["target"] in (2, 3)
@@ -0,0 +1,81 @@
+# test_structured_output.py
+from types import SimpleNamespace
+
+import pytest
+
+from logic import game_utils
+from logic.structured_output import (IncrementalJSONParser, StructuredOutputError, parse_json_object,
+                                     validate_faction_plan, validate_target_action)
+
+
+def test_incremental_parser_stops_at_first_object():
+    parser = IncrementalJSONParser()
+    assert parser.feed("好的，我的回答是：```json\n{\"thinking\": \"他说{不对}\", ") is None
+    assert parser.feed('"target": 3}') == {"thinking": "他说{不对}", "target": 3}
+    # 完整对象之后的内容不再解析
+    assert parser.feed('{"target": 4}') == {"thinking": "他说{不对}", "target": 3}
+
+
+def test_incremental_parser_skips_invalid_candidates():
+    assert parse_json_object('先看{这一段} 再看 {"target": 1}') == {"target": 1}
+    with pytest.raises(StructuredOutputError):
+        parse_json_object('{"target": 1')
+
+
+def test_parser_reset():
+    parser = IncrementalJSONParser()
+    parser.feed('{"target": ')
+    parser.reset()
+    assert parser.text == ""
+    assert parser.feed('{"target": 2}') == {"target": 2}
+
+
+def test_validate_target_action():
+    assert validate_target_action({"thinking": "x", "target": "玩家3"}, [1, 3]) == {"thinking": "x", "target": 3}
+    assert validate_target_action({"target": 1.0, "thinking": {"a": 1}}, [1])["thinking"] == '{"a": 1}'
+    for obj in ({"thinking": "x"}, {"target": 2}, {"target": True}, {"target": "谁都行"}):
+        with pytest.raises(StructuredOutputError):
+            validate_target_action(obj, [1, 3])
+
+
+def test_validate_faction_plan():
+    plan = validate_faction_plan({"target": 4, "statements": {"0": "刀4", "2": "同意"}}, [4, 5],
+                                 {"wolf_ids": [0, 2]})
+    assert plan == {"thinking": "", "target": 4, "statements": {0: "刀4", 2: "同意"}}
+    with pytest.raises(StructuredOutputError, match="缺少玩家"):
+        validate_faction_plan({"target": 4, "statements": {"0": "刀4"}}, [4], {"wolf_ids": [0, 2]})
+
+
+def chunk(content: str = "", status_code: int = 200):
+    return SimpleNamespace(status_code=status_code, code="Error", message="boom", usage=None,
+                           output=SimpleNamespace(choices=[{"message": {"content": content}}]))
+
+
+class FakeGeneration:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.calls = 0
+
+    def call(self, messages, stream=False, incremental_output=False, **params):
+        self.calls += 1
+        return iter(self.streams.pop(0))
+
+
+def test_stream_failure_after_partial_content_is_retried(monkeypatch):
+    generation = FakeGeneration([
+        [chunk('{"thinking": "截断'), chunk(status_code=500)],
+        [chunk('{"thinking": "完整", '), chunk('"target": 2}')],
+    ])
+    monkeypatch.setattr(game_utils, "_dashscope", SimpleNamespace(Generation=generation))
+    parser = IncrementalJSONParser()
+    raw, _ = game_utils._chat([{"role": "user", "content": "hi"}], "deepseek-v3", parser)
+    assert generation.calls == 2
+    assert raw == '{"thinking": "完整", "target": 2}'
+    assert parser.result == {"thinking": "完整", "target": 2}
+
+
+def test_stream_failure_on_every_attempt_raises(monkeypatch):
+    generation = FakeGeneration([[chunk('{"thinking": '), chunk(status_code=500)]] * 3)
+    monkeypatch.setattr(game_utils, "_dashscope", SimpleNamespace(Generation=generation))
+    with pytest.raises(Exception, match="重试次数达到上限"):
+        game_utils._chat([{"role": "user", "content": "hi"}], "deepseek-v3", IncrementalJSONParser())
@@ -0,0 +1,44 @@
+# test_tournament.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logic.batch_inference import BatchCollector
+from logic.tournament import play_game, play_game_batched, seat_assignment
+
+CONFIGS = {"off": "offline", "h": "heuristic"}
+
+
+def task(game_index: int, seed: int):
+    return (game_index, seed, seat_assignment(game_index, list(CONFIGS)), CONFIGS, 20, False, False, False)
+
+
+def outcome(result):
+    return result["winner"], result["rounds"], result["seats"]
+
+
+def test_same_seed_same_game():
+    assert outcome(play_game(task(0, 7))) == outcome(play_game(task(0, 7)))
+
+
+def test_concurrent_games_are_reproducible():
+    expected = [outcome(play_game(task(i, 100 + i))) for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # 反复并发运行，线程交错不应影响任何一局的结果
+        for _ in range(3):
+            results = list(executor.map(lambda i: outcome(play_game(task(i, 100 + i))), range(8)))
+            assert results == expected
+
+
+class IdleClient:
+    """离线/规则座位不会发出模型请求，收集器不应提交任何任务"""
+    def submit(self, lines):
+        raise AssertionError("不应提交批量任务")
+
+
+def test_batched_offline_games_do_not_submit():
+    collector = BatchCollector(IdleClient(), linger=0.01, poll_interval=0.01)
+    try:
+        assert outcome(play_game_batched(collector, task(3, 42))) == outcome(play_game(task(3, 42)))
+    finally:
+        collector.close()
+    assert collector.stats()["batches"] == 0
@@ -0,0 +1,72 @@
+# test_wire.py
+import json
+
+import pytest
+
+from server.serialization import dumps_text
+from server.wire import COMPACT, FORMATS, JSON, KEY_CODES, KEYS, intern_keys, negotiate, reencode_rest
+
+# msgpack 是可选依赖，未安装时只测试 JSON 格式
+MSGPACK = FORMATS.get("msgpack")
+needs_msgpack = pytest.mark.skipif(MSGPACK is None, reason="未安装 msgpack")
+
+STATE = {
+    "players": [{"player_id": i, "alive": i != 3} for i in range(6)],
+    "current_phase": "DAY",
+    "current_round": 2,
+    "game_log": {"day-1": {"heard_sayings": {"1": "我是好人"}}},
+}
+
+
+def decode(wire, frame):
+    if wire is MSGPACK:
+        import msgpack
+        return msgpack.unpackb(frame, raw=False, strict_map_key=False)
+    return json.loads(frame)
+
+
+def split(message):
+    """按服务端的方式分别编码消息头、玩家列表和其余状态"""
+    head = {k: v for k, v in message.items() if k != "game_state"}
+    state = message["game_state"]
+    rest = dumps_text({k: v for k, v in state.items() if k != "players"})
+    return head, state["players"], rest
+
+
+@pytest.mark.parametrize("wire", [JSON, COMPACT, pytest.param(MSGPACK, marks=needs_msgpack, id="msgpack")],
+                         ids=lambda w: w.name)
+@pytest.mark.parametrize("message", [
+    {"type": "phase_change", "seq": 7, "game_ended": False, "game_state": STATE},
+    {"game_state": STATE},
+    {"game_state": {"players": []}},
+    # 16 个以上的键时 MessagePack 映射头改用 map16
+    {**{f"extra{i}": i for i in range(20)}, "game_state": {**STATE, **{f"s{i}": i for i in range(20)}}},
+])
+def test_splice_matches_full_encoding(wire, message):
+    head, players, rest = split(message)
+    frame = wire.splice(wire.encode(head), wire.encode(players), reencode_rest(rest, wire))
+    assert decode(wire, frame) == decode(wire, wire.encode(message))
+
+
+def test_compact_keys_and_hello():
+    encoded = json.loads(COMPACT.encode({"type": "x", "unknown": {"player_id": 1}}))
+    assert encoded == {KEY_CODES["type"]: "x", "unknown": {KEY_CODES["player_id"]: 1}}
+    assert KEY_CODES[KEYS[0]] == "~0" and KEY_CODES[KEYS[10]] == "~a"
+
+    hello = json.loads(COMPACT.hello())
+    assert hello == {"type": "hello", "format": "compact", "keys": list(KEYS)}
+    assert JSON.hello() is None
+    assert intern_keys([{"seq": 1}]) == [{KEY_CODES["seq"]: 1}]
+
+
+def test_negotiate():
+    assert negotiate(["foo", "ai-wolf.compact", "ai-wolf.json"]) == (COMPACT, "ai-wolf.compact")
+    assert negotiate(["foo"], "compact") == (COMPACT, None)
+    assert negotiate([], "bogus") == (JSON, None)
+    assert negotiate([]) == (JSON, None)
+
+
+@needs_msgpack
+def test_msgpack_negotiated_and_hello():
+    assert negotiate(["foo", "ai-wolf.msgpack", "ai-wolf.compact"]) == (MSGPACK, "ai-wolf.msgpack")
+    assert decode(MSGPACK, MSGPACK.hello()) == {"type": "hello", "format": "msgpack", "keys": list(KEYS)}
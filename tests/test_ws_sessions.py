@@ -0,0 +1,57 @@
+# test_ws_sessions.py
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from server.ws_sessions import BufferedMessage, ReplayBuffer
+
+
+def test_replay_buffer_since():
+    buffer = ReplayBuffer(max_messages=3)
+    for _ in range(5):
+        seq = buffer.next_seq()
+        buffer.append(BufferedMessage(seq, {"seq": seq}))
+    assert [m.seq for m in buffer.since(3)] == [4, 5]
+    assert buffer.since(5) == []
+    # 缺失部分已被挤出缓冲，或序号来自其他运行
+    assert buffer.since(1) is None
+    assert buffer.since(6) is None
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_chat_is_not_buffered_and_buffer_is_released():
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    with client.websocket_connect(f"/ws/{game_id}/0") as ws:
+        assert ws.receive_json()["type"] == "init"
+        client.post(f"/games/{game_id}/next-phase")
+        phase_change = ws.receive_json()
+        assert phase_change["type"] == "phase_change" and phase_change["seq"] == 1
+
+        ws.send_text("大家好")
+        chat = ws.receive_json()
+        assert chat["type"] == "messages" and "seq" not in chat
+        assert main.manager.buffer(game_id).last_seq == 1
+    wait_until(lambda: game_id not in main.manager.buffers)
+    assert game_id not in main.manager.active_connections
+
+
+def test_resume_replays_missed_messages():
+    client = TestClient(main.app)
+    game_id = client.post("/games", json={}).json()["game_id"]
+    with client.websocket_connect(f"/ws/{game_id}/1") as listener:
+        listener.receive_json()
+        with client.websocket_connect(f"/ws/{game_id}/0") as ws:
+            ws.receive_json()
+        client.post(f"/games/{game_id}/next-phase")
+        client.post(f"/games/{game_id}/next-phase")
+        with client.websocket_connect(f"/ws/{game_id}/0?last_seq=0") as ws:
+            assert [ws.receive_json()["seq"] for _ in range(2)] == [1, 2]
+            assert ws.receive_json() == {"type": "resumed", "seq": 2, "replayed": 2}